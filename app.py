@@ -1,13 +1,28 @@
 import streamlit as st
 import pandas as pd
-from tabulate import tabulate
 import openai
 import os
-import io
+import uuid
 from utils.helper_functions import *
 from utils.metadata import *
+from utils.streaming_metadata import generate_metadata_streaming
+from utils.cache import content_hash, dataset_cache
+from utils.llm_pipeline import DEFAULT_BATCH_TOKENS, DEFAULT_CONCURRENCY
+from utils.code_transform import DEFAULT_TIMEOUT_SECONDS
+from utils.prompt_cache import prompt_cache
+from utils.prompt_encoding import CompactEncoder, estimate_token_savings
+from utils.session_store import SessionQuotaExceeded, session_store
+from utils.preview import render_preview
+from utils.dtypes import optimize_dtypes
+from utils.jobs import CANCELLED, FAILED, JobLimitExceeded, job_manager
+from utils.tasks import hyper_export_task, sql_fetch_task, sql_push_task, transformation_task
+from utils.instrumentation import load_stage_records, set_context, stage, summarize_stages
+
+# Users who see the stage timing dashboard (comma-separated user names)
+ADMIN_USERS = {user.strip() for user in os.environ.get("STREAMLINER_ADMIN_USERS", "").split(",") if user.strip()}
 
 # Define paths
+SQL_CHECKPOINT_DIR = os.path.join(".cache", "sql_loads")
 BACKGROUND_CSS_FILE_PATH = os.path.join("styles", "background.css")
 BACKGROUND_IMAGE_PATH = os.path.join("utils", "images", "background.jpg")
 OPENAI_LOGO_PATH = os.path.join("utils", "images", "openai-lockup.png")
@@ -24,8 +39,18 @@ base64_image_apache_spark = get_base64_image(APACHE_SPARK_LOGO_PATH)
 st.session_state.setdefault('authentication_status', None)
 st.session_state.setdefault('authenticated', False)
 st.session_state.setdefault('metadata', None)
-st.session_state.setdefault('df', None)
-st.session_state.setdefault('processed_df', None)
+st.session_state.setdefault('session_id', uuid.uuid4().hex)
+# Datasets live in the session store; session state only holds their handles
+st.session_state.setdefault('dataset', None)
+st.session_state.setdefault('processed_dataset', None)
+st.session_state.setdefault('dataset_key', None)
+# Content hash of the current upload, computed once per upload as (file ID, size, hash)
+st.session_state.setdefault('upload_hash', None)
+st.session_state.setdefault('generated_code', None)
+# Set when batches of the transformation failed or had malformed lines, so the processed dataset lacks rows
+st.session_state.setdefault('processed_partial', False)
+# Background jobs started by this session, by job ID
+st.session_state.setdefault('jobs', {})
 
 # Load CSS files
 css_files = ["styles/header_texts.css", "styles/buttons.css", "styles/logo.css", "styles/sidebar_sections.css"]
@@ -117,18 +142,61 @@ elif menu == "Register":
 # Main application
 if st.session_state.authenticated:
     openai.api_key = st.session_state.openai_api_key
+    current_user = st.session_state.current_user
+    session_id = st.session_state.session_id
+    session_store.touch(current_user, session_id)
+    set_context(session=session_id)  # Stage records of this rerun carry the session ID
+
+    # Datasets of a session that was idle for too long have been evicted from the store
+    expired = [key for key in ('dataset', 'processed_dataset') if st.session_state[key] is not None and not st.session_state[key].exists]
+    if expired:
+        st.session_state.update({key: None for key in expired})
+        st.info("Your session was idle for a while and its data was released. Please load the dataset again.")
 
     data_source = st.radio("**Select data source**", ["Upload CSV", "Fetch from SQL Server"])
 
     if data_source == "Upload CSV":
         uploaded_file = st.file_uploader("**Upload your dataset (CSV file)**", type=["csv"])
+        profile_only = st.checkbox("**Profile in chunks without loading the full dataset** (for files larger than memory)", key="profile_only_upload")
 
         if uploaded_file:
-            # Generate and display metadata for the uploaded file
-            metadata = generate_metadata(uploaded_file)
+            # Key every cached artifact by the content of the upload so reruns and
+            # other sessions opening the same file skip parsing and profiling. The
+            # upload is hashed once; reruns recognize it by its file ID and size.
+            upload_hash = st.session_state.upload_hash
+            if upload_hash is None or upload_hash[:2] != (uploaded_file.file_id, uploaded_file.size):
+                upload_hash = (uploaded_file.file_id, uploaded_file.size, content_hash(uploaded_file.getvalue()))
+                st.session_state.upload_hash = upload_hash
+            dataset_key = upload_hash[2]
+            name_key = content_hash(uploaded_file.name)[:12]
+            st.session_state.dataset_key = dataset_key
+
+        if uploaded_file and profile_only:
+            # Profile the file in fixed-size row blocks with bounded memory
+            metadata = dataset_cache.get_or_compute(
+                dataset_key, f"streaming-metadata-{name_key}", lambda: generate_metadata_streaming(uploaded_file)
+            )
             st.session_state['metadata'] = metadata  # Store metadata in session state
-            uploaded_file.seek(0)  # Rewind the file pointer to the beginning
-            st.session_state.df = pd.read_csv(uploaded_file)  # Store the DataFrame in session state
+            st.session_state.dataset = None
+
+        elif uploaded_file and (st.session_state.dataset is None or st.session_state.dataset.key != dataset_key):
+            # Parse the uploaded file once into compact dtypes and profile the loaded DataFrame
+            def parse_upload():
+                with stage("csv_parse", bytes=uploaded_file.size) as record:
+                    parsed = optimize_dtypes(pd.read_csv(uploaded_file))
+                    record["rows"] = len(parsed)
+                return parsed
+
+            df = dataset_cache.get_or_compute(dataset_key, "df-compact", parse_upload)
+            metadata = dataset_cache.get_or_compute(
+                dataset_key, f"metadata-{name_key}",
+                lambda: generate_metadata(df, file_name=uploaded_file.name, file_size=uploaded_file.size / 1024)
+            )
+            try:
+                st.session_state.dataset = session_store.put(current_user, session_id, "dataset", df, key=dataset_key)
+                st.session_state['metadata'] = metadata  # Store metadata in session state
+            except SessionQuotaExceeded as e:
+                st.error(str(e))
 
     elif data_source == "Fetch from SQL Server":
         # Input fields for SQL Server credentials
@@ -138,67 +206,149 @@ if st.session_state.authenticated:
         password = st.text_input("**Password** (Please enter your system password)", type="password", key="password")
 
         query = st.text_area("**Enter SQL query to retrieve data**")
+        profile_only = st.checkbox("**Profile in chunks without loading the full result**", key="profile_only_sql")
 
-        if st.button("Fetch Data"):
+        if profile_only and st.button("Profile Data"):
             try:
-                # Pass the credentials and query to the fetch function
-                df = fetch_data_from_sql(query, server, database, user_id, password)
-                st.success("Data fetched successfully.")
-
-                # Convert the DataFrame to a CSV string for further processing
-                csv_string = df.to_csv(index=False)
-
-                # Since this is SQL data, we create an in-memory buffer
-                csv_buffer = io.StringIO(csv_string)
-                csv_buffer.seek(0)  # Rewind the buffer
-
-                # Generate and display metadata for the fetched data
-                metadata = generate_metadata(csv_buffer)
+                metadata = profile_data_from_sql(query, server, database, user_id, password)
                 st.session_state['metadata'] = metadata  # Store metadata in session state
-                st.session_state.df = df  # Store the DataFrame in session state
-
+                st.session_state.dataset = None
             except Exception as e:
-                st.error(f"Error fetching data: {e}")
+                st.error(f"Error profiling data: {e}")
+
+        max_rows = st.number_input("**Maximum rows to fetch** (0 for no limit)", min_value=0, value=0, step=10000)
+
+        if not profile_only and st.button("Fetch Data"):
+            # The query runs as a background job: its first rows are previewed while
+            # the rest keep loading, and it can be cancelled like any other job
+            try:
+                job = job_manager.submit(
+                    current_user, "sql_fetch", sql_fetch_task,
+                    query, server, database, user_id, password, current_user, session_id,
+                    max_rows=max_rows or None,
+                    description="Fetching data from SQL Server"
+                )
+                st.session_state.jobs[job.id] = {"failure": "Error fetching data"}
+                st.rerun()
+            except JobLimitExceeded as e:
+                st.error(str(e))
+
+    # Background jobs of this session: collect the results of finished ones here,
+    # before the page shows the dataset, and show the progress of the rest below
+    for job_id, job_messages in list(st.session_state.jobs.items()):
+        job = job_manager.get(job_id)
+        if job is not None and not job.done:
+            continue
+        del st.session_state.jobs[job_id]
+        if job is None:
+            continue
+        if job.status == CANCELLED:
+            st.info(f"{job.description} was cancelled.")
+        elif job.status == FAILED:
+            st.error(job_messages.get("failure", f"{job.description} failed") + f": {job.error}" + job_messages.get("failure_hint", ""))
+        elif job.kind == "sql_fetch":
+            for level, text in job.result["messages"]:
+                getattr(st, level)(text)
+            if job.result["dataset"] is not None:
+                st.session_state.dataset = job.result["dataset"]
+                st.session_state.dataset_key = job.result["dataset"].key
+                st.session_state['metadata'] = job.result["metadata"]  # Store metadata in session state
+        elif job.kind == "transformation":
+            for level, text in job.result["messages"]:
+                getattr(st, level)(text)
+            if job.result["dataset"] is not None:
+                st.session_state.processed_dataset = job.result["dataset"]
+                st.session_state.generated_code = job.result["code"]
+                st.session_state.processed_partial = job.result["partial"]
+        else:
+            st.success(job_messages["success"])
 
     # Retrieve and display metadata if it exists in session state
     if st.session_state.metadata:
         display_metadata(st.session_state['metadata'])  # Display metadata
 
-    # If df is not None (i.e., data has been loaded either via upload or SQL fetch)
-    if st.session_state.df is not None:
+    # If a dataset has been loaded either via upload or SQL fetch
+    if st.session_state.dataset is not None:
         st.markdown("#### Dataset Preview:")
-        styled_df = st.session_state.df.style.apply(
-            lambda x: ['background-color: #efefef' if i % 2 == 0 else 'background-color: #ffffff' for i in range(len(x))], axis=0
-        )
-        st.dataframe(styled_df)
+        render_preview(st.session_state.dataset, key="dataset_preview")
 
-        csv_string = st.session_state.df.to_csv(index=False)
         prompt = st.text_area("**Enter your data cleaning prompt**")
+        transformation_mode = st.radio(
+            "**Transformation mode**",
+            ["Send data to the model", "Generate code, execute locally"],
+            help="Generating code sends only the schema, column statistics and a small sample to the model, then runs the returned pandas code on the full dataset locally."
+        )
 
-        if st.button("Submit Prompt"):
-            client = openai.OpenAI(api_key=openai.api_key)
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert data analyst specialized in cleaning, transforming, and preparing datasets for analysis. Your task is to understand user prompts and directly apply the necessary operations to clean and format datasets, ensuring data quality, consistency, and readiness for further analysis. You should return the cleaned or processed data strictly in CSV format, without any additional text, descriptions, or formatting."},
-                    {"role": "user", "content": f"Here is the dataset in CSV format:\n{csv_string}\n\n{prompt}\n\nPlease return the cleaned dataset in CSV format only, without any text or explanations."}
-                ]
-            )
-
-            # Assuming the API now returns the processed dataset as a CSV string
-            processed_csv_string = response.choices[0].message.content.strip()
-
-            # Convert the processed CSV string back to a DataFrame using io.StringIO
-            processed_df = pd.read_csv(io.StringIO(processed_csv_string))
-
-            print(tabulate(processed_df.head(), headers='keys', tablefmt='psql'))
+        with st.expander("Advanced settings"):
+            if transformation_mode == "Send data to the model":
+                concurrency = st.number_input("**Concurrent requests**", min_value=1, max_value=32, value=DEFAULT_CONCURRENCY)
+                max_batch_tokens = st.number_input("**Token budget per batch**", min_value=200, max_value=100000, value=DEFAULT_BATCH_TOKENS, step=100)
+                compact_encoding = st.checkbox("**Compact encoding** (dictionary-encode repeated values and omit constant columns)", value=True)
+                select_columns = st.checkbox("**Send only the columns mentioned in the prompt**")
+
+                if compact_encoding:
+                    # The encoder itself is built by the job; the estimate is computed once per dataset and prompt
+                    def estimate_tokens():
+                        df = st.session_state.dataset.to_pandas()
+                        return estimate_token_savings(df, CompactEncoder(df, prompt, select_columns=select_columns))
+
+                    tokens_before, tokens_after = dataset_cache.get_or_compute(
+                        st.session_state.dataset.key,
+                        f"token-estimate-{content_hash(prompt)[:16]}-{int(select_columns)}",
+                        estimate_tokens
+                    )
+                    st.caption(f"Estimated prompt tokens: {tokens_before:,} as CSV, {tokens_after:,} compact")
+            else:
+                timeout = st.number_input("**Execution timeout (seconds)**", min_value=5, max_value=3600, value=DEFAULT_TIMEOUT_SECONDS)
 
-            st.session_state['processed_df'] = processed_df  # Store the processed DataFrame in session state
+        if st.button("Submit Prompt"):
+            # The transformation runs as a background job; its result is picked up below once it finishes
+            generate_code = transformation_mode == "Generate code, execute locally"
+            job_options = {"timeout": timeout} if generate_code else \
+                {"max_batch_tokens": max_batch_tokens, "concurrency": concurrency,
+                 "compact_encoding": compact_encoding, "select_columns": select_columns}
+            try:
+                job = job_manager.submit(
+                    current_user, "transformation", transformation_task,
+                    st.session_state.dataset, prompt, current_user, session_id, st.session_state.dataset_key, openai.api_key,
+                    generate_code=generate_code, metadata=st.session_state.metadata,
+                    description="Transforming the dataset", **job_options
+                )
+                st.session_state.jobs[job.id] = {"failure": "Failed to transform the dataset"}
+            except JobLimitExceeded as e:
+                st.error(str(e))
+
+        cache_stats = prompt_cache.stats()
+        st.caption(f"Prompt cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
+        if st.session_state.generated_code:
+            with st.expander("Generated transformation code"):
+                st.code(st.session_state.generated_code, language="python")
+
+    active_jobs = [job_manager.get(job_id) for job_id in st.session_state.jobs]
+    if active_jobs:
+        @st.fragment(run_every=1.0)
+        def show_active_jobs():
+            jobs = [job for job in active_jobs if job is not None]
+            if any(job.done for job in jobs):
+                st.rerun()  # Rerun the whole script to pick up the results
+            for job in jobs:
+                st.progress(job.progress or 0.0, text=f"{job.description} · {job.message or job.status}")
+                if job.preview is not None:
+                    st.dataframe(job.preview)
+                if st.button("Cancel", key=f"cancel_{job.id}"):
+                    job_manager.cancel(job.id)
+
+        show_active_jobs()
 
     # Display the processed DataFrame if it exists in session state
-    if st.session_state.processed_df is not None:
+    if st.session_state.processed_dataset is not None:
         st.markdown("#### Processed Dataset:")
-        st.dataframe(st.session_state['processed_df'])
+        render_preview(st.session_state.processed_dataset, key="processed_preview")
+        # Like the batch runner, never export a result that is missing rows
+        partial = st.session_state.processed_partial
+        if partial:
+            st.warning("This result is partial because rows are missing from some batches. Submit the prompt again before exporting it.")
 
         # Prompt user to specify the hyper file name
         hyper_file_name = st.text_input("**Enter the .hyper file name** (default set as 'output_file.hyper')", value="output_file.hyper")
@@ -207,21 +357,58 @@ if st.session_state.authenticated:
         # Construct the full file path within the 'hyper_exports' directory
         hyper_file_path = os.path.join("hyper_exports", hyper_file_name)
 
+        append_to_hyper = st.checkbox("**Append to the table if the .hyper file already exists**")
+
         # Button to export data as .hyper file
-        if st.button("Export as hyper file"):
+        if st.button("Export as hyper file", disabled=partial):
             try:
-                write_hyper_file(st.session_state.processed_df, hyper_file_path, table_name)
-                st.success(f"Data has been successfully written to {hyper_file_path}")
-            except Exception as e:
-                st.error(f"Failed to write data to .hyper file: {e}")
+                job = job_manager.submit(
+                    current_user, "hyper_export", hyper_export_task,
+                    st.session_state.processed_dataset, hyper_file_path, table_name,
+                    mode="append" if append_to_hyper else "replace",
+                    description=f"Exporting to {hyper_file_path}"
+                )
+                st.session_state.jobs[job.id] = {
+                    "success": f"Data has been successfully written to {hyper_file_path}",
+                    "failure": "Failed to write data to .hyper file",
+                }
+                st.rerun()
+            except JobLimitExceeded as e:
+                st.error(str(e))
 
         table_name = st.text_input(
             "**Enter the table name to push the data**\n\n*The table name is expected to be in the following format, schema_name.table_name.*"
         )
 
-        if st.button("Push to SQL Server"):
-            success = push_data_to_sql(st.session_state.processed_df, table_name, server, database, user_id, password)
-            if success:
-                st.success(f"Data successfully pushed to table `{table_name}`.")
+        parallel_connections = st.number_input("**Parallel connections**", min_value=1, max_value=8, value=1)
+
+        if st.button("Push to SQL Server", disabled=partial):
+            # Committed batches are checkpointed, so pushing again after a failure resumes the load
+            checkpoint_path = os.path.join(SQL_CHECKPOINT_DIR, f"{st.session_state.processed_dataset.key}-{content_hash(table_name)[:12]}.json")
+            os.makedirs(SQL_CHECKPOINT_DIR, exist_ok=True)
+
+            try:
+                job = job_manager.submit(
+                    current_user, "sql_push", sql_push_task,
+                    st.session_state.processed_dataset, table_name, server, database, user_id, password,
+                    parallel_connections=parallel_connections,
+                    checkpoint_path=checkpoint_path,
+                    description=f"Pushing to `{table_name}`"
+                )
+                st.session_state.jobs[job.id] = {
+                    "success": f"Data successfully pushed to table `{table_name}`.",
+                    "failure": f"Failed to push data to table `{table_name}`",
+                    "failure_hint": ". Pushing again resumes from the last committed batch.",
+                }
+                st.rerun()
+            except JobLimitExceeded as e:
+                st.error(str(e))
+
+    if current_user in ADMIN_USERS:
+        with st.expander("Performance"):
+            # p50/p95 of every pipeline stage across all sessions, from the metrics log
+            stage_summary = summarize_stages(load_stage_records())
+            if stage_summary.empty:
+                st.caption("No stage timings have been recorded yet.")
             else:
-                st.error(f"Failed to push data to table `{table_name}`.")
\ No newline at end of file
+                st.dataframe(stage_summary)
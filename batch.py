@@ -0,0 +1,6 @@
+import sys
+from utils.batch_runner import main
+
+# Headless batch mode: python batch.py "extracts/*.csv" --prompt "..." --hyper-dir exports
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import json
+import time
+
+# Marker the pipeline puts in front of the CSV in the user message (see utils.llm_pipeline.build_messages)
+CSV_MARKER = "Here is the dataset in CSV format:\n"
+
+
+def _echo_csv(messages):
+    # Answer with the CSV that was sent, like a model asked to change nothing
+    content = messages[-1]["content"]
+    if CSV_MARKER not in content:
+        return ""
+    return content.split(CSV_MARKER, 1)[1].split("\n\n", 1)[0]
+
+
+def _usage(messages, completion):
+    # Rough token counts (4 characters per token) so usage fields are populated
+    prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+    completion_tokens = len(completion) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def _send_error(self, status, message):
+        payload = json.dumps({"error": {"message": message, "type": "fake_error", "code": status}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        messages = body["messages"]
+        csv_string = _echo_csv(messages)
+        completion = "```csv\n" + csv_string + "\n```"
+        latency = self.server.latency
+        time.sleep(latency(csv_string) if callable(latency) else latency)
+
+        with self.server.lock:
+            self.server.requests += 1
+            rate_limited = self.server.requests <= self.server.rate_limited_requests
+        if rate_limited:
+            self._send_error(429, "Rate limit reached")
+            return
+        if self.server.fail_when is not None and self.server.fail_when(csv_string):
+            self._send_error(400, "Request rejected")
+            return
+
+        if not body.get("stream"):
+            payload = json.dumps({
+                "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": completion}, "finish_reason": "stop"}],
+                "usage": _usage(messages, completion),
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        # Stream the completion in small deltas like the real endpoint
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk_chars = self.server.chunk_chars
+        for start in range(0, len(completion), chunk_chars):
+            delta = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": completion[start:start + chunk_chars]}, "finish_reason": None}]}
+            self._send_chunk(f"data: {json.dumps(delta)}\n\n".encode())
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                     "choices": [], "usage": _usage(messages, completion)}
+            self._send_chunk(f"data: {json.dumps(usage)}\n\n".encode())
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer:
+    # Local stand-in for the chat completions endpoint that echoes the CSV it
+    # receives, so the prompt round trip (serialization, HTTP, streaming and
+    # parsing) can be measured offline. `latency` adds a delay per request
+    # (seconds, or a function of the CSV sent) and `chunk_chars` sets the size
+    # of the streamed deltas. For failure tests, the first
+    # `rate_limited_requests` requests are answered with 429, and requests whose
+    # CSV makes `fail_when` return True are rejected with 400.
+
+    def __init__(self, latency=0.0, chunk_chars=32, rate_limited_requests=0, fail_when=None):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.latency = latency
+        self._server.chunk_chars = chunk_chars
+        self._server.rate_limited_requests = rate_limited_requests
+        self._server.fail_when = fail_when
+        self._server.requests = 0
+        self._server.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,250 @@
+import os
+
+# Keep benchmark runs out of the app's stage timing log unless asked otherwise
+os.environ.setdefault("STREAMLINER_METRICS_LOG", "")
+
+from datetime import datetime
+import pandas as pd
+import statistics
+import tracemalloc
+import platform
+import argparse
+import tempfile
+import sqlite3
+import json
+import time
+import sys
+import gc
+from benchmarks.synthetic_data import DEFAULT_COLUMNS, generate_dataset, parse_column_spec
+from benchmarks.fake_openai import FakeOpenAIServer
+from utils.dtypes import optimize_dtypes
+from utils.metadata import generate_metadata, operational_metadata_table
+from utils.sql_bulk import bulk_load_dataframe
+from utils.llm_pipeline import DEFAULT_CONCURRENCY, transform_dataframe
+
+try:
+    from utils.helper_functions import write_hyper_file
+except ImportError:
+    write_hyper_file = None  # tableauhyperapi or pyodbc is not installed
+
+BENCHMARKS = ["generate_metadata", "display_metadata", "write_hyper_file", "push_data_to_sql", "prompt_round_trip"]
+RESULTS_DIR = os.path.join(".cache", "benchmarks")
+DEFAULT_BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+# A benchmark regresses when it gets slower (or needs more memory) than the baseline by more than these ratios
+DEFAULT_TIME_THRESHOLD = 0.20
+DEFAULT_MEMORY_THRESHOLD = 0.20
+# Differences below this many seconds are treated as noise
+NOISE_FLOOR_SECONDS = 0.01
+
+# pyodbc binds timestamps natively; the SQLite stand-in needs them as text
+sqlite3.register_adapter(pd.Timestamp, lambda value: value.isoformat(sep=" "))
+
+
+# Function to time `run` over `repeat` runs and measure its peak Python heap
+# in one extra run with tracemalloc on, so tracing does not skew the timings.
+# `setup` prepares fresh arguments for every run outside of the timed part.
+# Memory allocated outside the Python heap (Arrow buffers, the Hyper and
+# SQLite engines) is not included.
+def measure(run, setup=None, repeat=3, rows=None):
+    seconds = []
+    cpu_seconds = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        gc.collect()
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        run(*args)
+        seconds.append(time.perf_counter() - started)
+        cpu_seconds.append(time.process_time() - cpu_started)
+
+    args = setup() if setup is not None else ()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(*args)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(seconds)
+    return {
+        "seconds": median,
+        "seconds_min": min(seconds),
+        "seconds_all": seconds,
+        "cpu_seconds": statistics.median(cpu_seconds),
+        "peak_memory_bytes": peak_memory,
+        "rows": rows,
+        "rows_per_second": rows / median if rows and median > 0 else None,
+    }
+
+
+def _sqlite_database(work_dir, columns):
+    # Fresh SQLite file with an untyped table for every run; "main" takes the place of the schema
+    path = os.path.join(work_dir, f"push-{time.time_ns()}.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(f"CREATE TABLE bench ({', '.join(f'[{col}]' for col in columns)})")
+    return (path,)
+
+
+# Function to run the selected benchmarks on `df` and return their results by name
+def run_benchmarks(df, selected=BENCHMARKS, repeat=3, llm_rows=5000, concurrency=DEFAULT_CONCURRENCY, latency=0.0, work_dir=None):
+    work_dir = work_dir or tempfile.mkdtemp(prefix="streamliner-bench-")
+    file_size = df.memory_usage(deep=True).sum() / 1024
+    results = {}
+
+    if "generate_metadata" in selected:
+        results["generate_metadata"] = measure(
+            lambda: generate_metadata(df, file_name="synthetic.csv", file_size=file_size), repeat=repeat, rows=len(df)
+        )
+
+    if "display_metadata" in selected:
+        metadata = generate_metadata(df, file_name="synthetic.csv", file_size=file_size)
+        results["display_metadata"] = measure(lambda: operational_metadata_table(metadata), repeat=repeat, rows=len(df.columns))
+
+    if "write_hyper_file" in selected:
+        if write_hyper_file is None:
+            print("Skipping write_hyper_file: tableauhyperapi or pyodbc is not installed", file=sys.stderr)
+        else:
+            results["write_hyper_file"] = measure(
+                lambda path: write_hyper_file(df, path, "Extract"),
+                setup=lambda: (os.path.join(work_dir, f"extract-{time.time_ns()}.hyper"),),
+                repeat=repeat, rows=len(df)
+            )
+
+    if "push_data_to_sql" in selected:
+        # The bulk loader behind push_data_to_sql, pointed at a local SQLite file instead of SQL Server
+        results["push_data_to_sql"] = measure(
+            lambda path: bulk_load_dataframe(df, "main", "bench", connection_factory=lambda: sqlite3.connect(path, timeout=30),
+                                             create_table=False),
+            setup=lambda: _sqlite_database(work_dir, df.columns),
+            repeat=repeat, rows=len(df)
+        )
+
+    if "prompt_round_trip" in selected:
+        llm_df = df.head(llm_rows)
+
+        def round_trip(base_url):
+            result = transform_dataframe(llm_df, "Return the dataset unchanged.", api_key="benchmark", base_url=base_url,
+                                         concurrency=concurrency, stream=True)
+            if result.failures:
+                raise RuntimeError(f"{len(result.failures)} batch(es) failed: {result.failures[0].error}")
+
+        with FakeOpenAIServer(latency=latency) as server:
+            results["prompt_round_trip"] = measure(lambda: round_trip(server.base_url), repeat=repeat, rows=len(llm_df))
+
+    return results
+
+
+# Function to compare results with a baseline. Returns one row per benchmark
+# present in both and the names of the benchmarks that regressed.
+def compare_results(results, baseline, time_threshold=DEFAULT_TIME_THRESHOLD, memory_threshold=DEFAULT_MEMORY_THRESHOLD):
+    rows = []
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+        time_ratio = result["seconds"] / base["seconds"] if base["seconds"] > 0 else None
+        memory_ratio = result["peak_memory_bytes"] / base["peak_memory_bytes"] if base["peak_memory_bytes"] > 0 else None
+        slower = (time_ratio is not None and time_ratio > 1 + time_threshold
+                  and result["seconds"] - base["seconds"] > NOISE_FLOOR_SECONDS)
+        larger = memory_ratio is not None and memory_ratio > 1 + memory_threshold
+        if slower or larger:
+            regressions.append(name)
+        rows.append({
+            "Benchmark": name,
+            "Baseline (s)": round(base["seconds"], 4),
+            "Current (s)": round(result["seconds"], 4),
+            "Time ratio": round(time_ratio, 3) if time_ratio is not None else None,
+            "Baseline peak (MB)": round(base["peak_memory_bytes"] / 1024 ** 2, 2),
+            "Current peak (MB)": round(result["peak_memory_bytes"] / 1024 ** 2, 2),
+            "Memory ratio": round(memory_ratio, 3) if memory_ratio is not None else None,
+            "Status": "REGRESSION" if slower or larger else "ok",
+        })
+    return rows, regressions
+
+
+def _environment():
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _write_json(data, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Streamliner hot paths on synthetic data.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows of the synthetic dataset")
+    parser.add_argument("--columns", default=",".join(f"{kind}={count}" for kind, count in DEFAULT_COLUMNS.items()),
+                        help="Columns per kind, e.g. int=2,float=2,text=3,date=1,bool=1")
+    parser.add_argument("--null-rate", type=float, default=0.05, help="Share of missing values per column")
+    parser.add_argument("--cardinality", type=int, default=1000, help="Distinct values of the int, text and date columns")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--raw-dtypes", action="store_true", help="Skip the compact dtypes the app loads datasets with")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="Benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (the median is reported)")
+    parser.add_argument("--llm-rows", type=int, default=5000, help="Rows sent through the prompt round trip")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Concurrent requests in the prompt round trip")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fake OpenAI server waits per request")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"), help="Where to write the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Results to compare against, if the file exists")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store these results as the baseline")
+    parser.add_argument("--time-threshold", type=float, default=DEFAULT_TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    config = {
+        "rows": args.rows, "columns": parse_column_spec(args.columns), "null_rate": args.null_rate,
+        "cardinality": args.cardinality, "seed": args.seed, "compact_dtypes": not args.raw_dtypes,
+        "llm_rows": args.llm_rows, "concurrency": args.concurrency, "latency": args.latency,
+    }
+    df = generate_dataset(args.rows, config["columns"], args.null_rate, args.cardinality, args.seed)
+    if config["compact_dtypes"]:
+        df = optimize_dtypes(df)
+
+    with tempfile.TemporaryDirectory(prefix="streamliner-bench-") as work_dir:
+        benchmarks = run_benchmarks(df, args.only, args.repeat, args.llm_rows, args.concurrency, args.latency, work_dir)
+
+    results = {"created": datetime.now().isoformat(), "environment": _environment(), "config": config, "benchmarks": benchmarks}
+    _write_json(results, args.output)
+    print(pd.DataFrame([
+        {"Benchmark": name, "Median (s)": round(result["seconds"], 4), "CPU (s)": round(result["cpu_seconds"], 4),
+         "Peak (MB)": round(result["peak_memory_bytes"] / 1024 ** 2, 2),
+         "Rows/s": round(result["rows_per_second"]) if result["rows_per_second"] else None}
+        for name, result in benchmarks.items()
+    ]).to_string(index=False))
+    print(f"\nResults written to {args.output}")
+
+    exit_code = 0
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("Warning: the baseline was recorded with a different configuration", file=sys.stderr)
+        if baseline.get("environment") != results["environment"]:
+            print("Warning: the baseline was recorded in a different environment", file=sys.stderr)
+        rows, regressions = compare_results(results, baseline, args.time_threshold, args.memory_threshold)
+        print(f"\nCompared with {args.baseline}:")
+        print(pd.DataFrame(rows).to_string(index=False))
+        if regressions:
+            print(f"\nRegressions beyond the thresholds: {', '.join(regressions)}")
+            exit_code = 1
+
+    if args.save_baseline:
+        _write_json(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
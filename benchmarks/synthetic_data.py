@@ -0,0 +1,60 @@
+import pandas as pd
+import numpy as np
+
+# Column kinds the generator knows, with the default number of columns of each
+COLUMN_KINDS = ["int", "float", "text", "date", "bool"]
+DEFAULT_COLUMNS = {"int": 2, "float": 2, "text": 3, "date": 1, "bool": 1}
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet",
+         "kilo", "lima", "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango"]
+
+
+# Function to parse a column specification like "int=2,float=1,text=3"
+def parse_column_spec(spec):
+    columns = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        kind, _, count = part.partition("=")
+        kind = kind.strip()
+        if kind not in COLUMN_KINDS:
+            raise ValueError(f"Unknown column kind '{kind}'; expected one of {', '.join(COLUMN_KINDS)}")
+        columns[kind] = int(count or 1)
+    return columns
+
+
+def _text_values(rng, rows, cardinality):
+    # `cardinality` distinct values of varying length, drawn with a skew like real categorical data
+    vocabulary = np.array([f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]}-{i}" for i in range(cardinality)], dtype=object)
+    weights = 1.0 / np.arange(1, cardinality + 1)
+    return vocabulary[rng.choice(cardinality, size=rows, p=weights / weights.sum())]
+
+
+def _column_values(rng, kind, rows, cardinality):
+    if kind == "int":
+        return rng.integers(0, cardinality, size=rows)
+    if kind == "float":
+        return np.round(rng.normal(1000, 250, size=rows), 2)
+    if kind == "text":
+        return _text_values(rng, rows, cardinality)
+    if kind == "date":
+        days = rng.integers(0, min(cardinality, 3650), size=rows)
+        return pd.Timestamp("2020-01-01") + pd.to_timedelta(days, unit="D")
+    return rng.random(rows) < 0.5
+
+
+# Function to generate a reproducible synthetic dataset. Columns are named
+# after their kind ("int_0", "text_1", ...); `null_rate` is the share of
+# missing values in every column and `cardinality` the number of distinct
+# values of the int, text and date columns. The frame has the dtypes
+# pd.read_csv would give it, so it can be written out and parsed again.
+def generate_dataset(rows, columns=None, null_rate=0.05, cardinality=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {}
+    for kind, count in (columns or DEFAULT_COLUMNS).items():
+        for i in range(count):
+            series = pd.Series(_column_values(rng, kind, rows, max(cardinality, 1)))
+            if null_rate > 0:
+                series = series.where(rng.random(rows) >= null_rate)
+            data[f"{kind}_{i}"] = series
+    return pd.DataFrame(data)
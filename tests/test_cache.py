@@ -0,0 +1,37 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from utils.cache import DiskCache
+from utils.dtypes import optimize_dtypes
+from utils.prompt_cache import PromptCache
+
+
+class Exploit:
+    def __reduce__(self):
+        return (os.system, ("touch /tmp/streamliner_cache_exploit",))
+
+
+def test_disk_cache_round_trips_frames_and_metadata(tmp_path):
+    cache = DiskCache(str(tmp_path), 10 * 1024 * 1024)
+    df = optimize_dtypes(pd.DataFrame({"a": [1, 2, None], "s": ["x", "x", "y"], "t": ["a", "b", "c"]}))
+    cache.set("frame", df)
+    pd.testing.assert_frame_equal(cache.get("frame"), df)
+
+    metadata = {"Null Count": {"a": np.int64(1)}, "Mean": {"a": np.float32(1.5)}, "Column Data Types": {"a": df["a"].dtype}}
+    cache.set("metadata", metadata)
+    assert cache.get("metadata") == {"Null Count": {"a": 1}, "Mean": {"a": 1.5}, "Column Data Types": {"a": "float32"}}
+
+
+def test_disk_cache_does_not_unpickle_entries(tmp_path):
+    cache = DiskCache(str(tmp_path), 10 * 1024 * 1024)
+    cache.set_bytes("entry", pickle.dumps(Exploit()))
+    assert cache.get("entry") is None
+    assert not os.path.exists("/tmp/streamliner_cache_exploit")
+
+
+def test_prompt_cache_key_depends_on_encoding_options():
+    full = PromptCache.make_key("data", "Trim  names", "system", "model", compact_encoding=True, select_columns=False)
+    subset = PromptCache.make_key("data", "Trim names", "system", "model", compact_encoding=True, select_columns=True)
+    assert full != subset
+    assert full == PromptCache.make_key("data", "Trim names", "system", "model", select_columns=False, compact_encoding=True)
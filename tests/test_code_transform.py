@@ -0,0 +1,67 @@
+import sys
+import pandas as pd
+import pytest
+from utils.code_transform import CodeExecutionError, execute_transformation, validate_code
+from utils.sandbox import SYSCALLS
+import platform
+
+sandbox_supported = sys.platform.startswith("linux") and platform.machine().lower() in SYSCALLS
+
+
+@pytest.mark.parametrize("body", [
+    'return np.f2py.subprocess.check_output(["id"])',
+    'return pd.compat.os.listdir("/")',
+    'return pd.io.common.os.getcwd()',
+    "m = np\n    return m",
+    "return df.pipe(lambda d: np)",
+    "return __builtins__",
+    "return df.__class__",
+    "return open('/etc/passwd').read()",
+    "return getattr(df, 'to_csv')('/tmp/out.csv')",
+    "import os\n    return df",
+    'return df.query("a > 0")',
+])
+def test_validate_code_rejects_escapes(body):
+    with pytest.raises(CodeExecutionError):
+        validate_code(f"def transform(df):\n    {body}\n")
+
+
+def test_validate_code_accepts_dataframe_code():
+    validate_code(
+        "def transform(df):\n"
+        "    df = df.copy()\n"
+        "    df['b'] = np.where(df['a'] > 1, pd.NA, df['a'])\n"
+        "    df['c'] = df['s'].str.strip().map(lambda value: re.sub(r'\\s+', ' ', value))\n"
+        "    return df\n"
+    )
+
+
+@pytest.mark.skipif(not sandbox_supported, reason="The seccomp sandbox needs Linux on x86_64 or aarch64")
+@pytest.mark.parametrize("body", [
+    'np.f2py.subprocess.check_output(["id"])',
+    'pd.compat.os.open("/tmp/streamliner_sandbox_escape", 0o101)',
+    'pd.compat.os.sys.modules["socket"].socket()',
+])
+def test_sandbox_blocks_escapes_that_bypass_validation(monkeypatch, body):
+    # Even code the static check misses cannot run programs, write files or open sockets
+    monkeypatch.setattr("utils.code_transform.validate_code", lambda code: None)
+    code = f"def transform(df):\n    {body}\n    return df\n"
+    with pytest.raises(CodeExecutionError, match="PermissionError"):
+        execute_transformation(code, pd.DataFrame({"a": [1]}), timeout=30)
+
+
+@pytest.mark.skipif(not sandbox_supported, reason="The seccomp sandbox needs Linux on x86_64 or aarch64")
+def test_sandbox_blocks_shell_commands(monkeypatch, tmp_path):
+    monkeypatch.setattr("utils.code_transform.validate_code", lambda code: None)
+    marker = tmp_path / "escape"
+    code = f"def transform(df):\n    return df.assign(status=pd.compat.os.system('touch {marker}'))\n"
+    result = execute_transformation(code, pd.DataFrame({"a": [1]}), timeout=30)
+    assert result["status"].iloc[0] != 0
+    assert not marker.exists()
+
+
+@pytest.mark.skipif(not sandbox_supported, reason="The seccomp sandbox needs Linux on x86_64 or aarch64")
+def test_sandbox_runs_valid_code():
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    result = execute_transformation("def transform(df):\n    return df.assign(b=df['a'] * 2)\n", df, timeout=30)
+    assert result["b"].tolist() == [2, 4, 6]
@@ -0,0 +1,24 @@
+import io
+import pandas as pd
+from utils.dtypes import apply_schema, dtype_schema, optimize_dtypes
+
+
+def test_whole_number_floats_stay_floats():
+    df = pd.DataFrame({"price": [1.0, 2.0, None], "amount": [1.0, 2.0, 3.0], "count": [1, 2, 3]})
+    optimized = optimize_dtypes(df)
+    assert pd.api.types.is_float_dtype(optimized["price"].dtype)
+    assert pd.api.types.is_float_dtype(optimized["amount"].dtype)
+    assert optimized["count"].dtype == "uint8"
+    assert optimized["price"].isna().iloc[2]
+
+
+def test_dates_are_restored_only_from_their_original_format():
+    df = pd.DataFrame({"d": pd.to_datetime(["2020-02-01", "2020-03-05"])})
+    schema = dtype_schema(df)
+
+    unchanged = apply_schema(pd.read_csv(io.StringIO(df.to_csv(index=False))), schema)
+    assert pd.api.types.is_datetime64_any_dtype(unchanged["d"].dtype)
+    assert unchanged["d"].tolist() == df["d"].tolist()
+
+    reformatted = apply_schema(pd.DataFrame({"d": ["01/02/2020", "05/03/2020"]}), schema)
+    assert reformatted["d"].tolist() == ["01/02/2020", "05/03/2020"]
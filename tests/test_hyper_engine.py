@@ -0,0 +1,32 @@
+import os
+import signal
+import subprocess
+import time
+import pytest
+
+pytest.importorskip("tableauhyperapi")
+
+from utils.hyper_engine import HyperEngine
+
+
+def _kill_child_hyperd():
+    pids = subprocess.run(["pgrep", "-P", str(os.getpid()), "hyperd"], capture_output=True, text=True).stdout.split()
+    for pid in pids:
+        os.kill(int(pid), signal.SIGKILL)
+    return pids
+
+
+@pytest.mark.skipif(not os.path.exists("/usr/bin/pgrep"), reason="Needs pgrep to find hyperd")
+def test_engine_restarts_after_hyperd_dies():
+    engine = HyperEngine(pool_size=1)
+    try:
+        with engine.connection() as connection:
+            assert connection.execute_scalar_query("SELECT 1") == 1
+        assert _kill_child_hyperd()
+        time.sleep(0.5)
+
+        with engine.connection() as connection:
+            assert connection.execute_scalar_query("SELECT 2") == 2
+        assert engine.restarts == 1
+    finally:
+        engine.shutdown()
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("tableauhyperapi")
+
+from utils.hyper_engine import hyper_engine
+from utils.dtypes import optimize_dtypes
+from utils.hyper_export import write_hyper_tables
+
+
+def _read_table(path, table_name):
+    with hyper_engine.connection() as connection:
+        connection.catalog.attach_database(str(path), alias="check")
+        try:
+            return connection.execute_list_query(f'SELECT * FROM "check"."public"."{table_name}" ORDER BY 1')
+        finally:
+            connection.catalog.detach_database("check")
+
+
+@pytest.mark.parametrize("staging", ["parquet", "csv"])
+def test_append_with_nulls_after_replace_without_nulls(tmp_path, staging):
+    path = tmp_path / "export.hyper"
+    write_hyper_tables({"t": pd.DataFrame({"a": [1, 2]})}, path, staging=staging)
+    write_hyper_tables({"t": pd.DataFrame({"a": [3, None]})}, path, mode="append", staging=staging)
+    assert _read_table(path, "t") == [[1], [2], [3], [None]]
+
+
+@pytest.mark.parametrize("staging", ["parquet", "csv"])
+def test_append_casts_to_the_existing_column_types(tmp_path, staging):
+    path = tmp_path / "export.hyper"
+    write_hyper_tables({"t": pd.DataFrame({"a": [1000], "s": ["x"]})}, path, staging=staging)
+    appended = pd.DataFrame({"a": pd.Series([5], dtype="uint8"), "s": pd.Categorical(["y"])})
+    write_hyper_tables({"t": appended}, path, mode="append", staging=staging)
+    assert _read_table(path, "t") == [[5, "y"], [1000, "x"]]
+
+    with pytest.raises(ValueError, match="missing"):
+        write_hyper_tables({"t": pd.DataFrame({"a": [1]})}, path, mode="append", staging=staging)
+
+
+@pytest.mark.parametrize("staging", ["parquet", "csv"])
+def test_append_larger_integers_to_a_table_created_from_compact_dtypes(tmp_path, staging):
+    path = tmp_path / "export.hyper"
+    write_hyper_tables({"t": optimize_dtypes(pd.DataFrame({"a": [1, 2]}))}, path, staging=staging)
+    write_hyper_tables({"t": optimize_dtypes(pd.DataFrame({"a": [70000, 2 ** 40]}))}, path, mode="append", staging=staging)
+    assert _read_table(path, "t") == [[1], [2], [70000], [2 ** 40]]
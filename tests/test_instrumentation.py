@@ -0,0 +1,53 @@
+import json
+import tracemalloc
+import pytest
+import utils.instrumentation as instrumentation
+from utils.instrumentation import load_stage_records, stage, summarize_stages
+
+
+@pytest.fixture
+def metrics_log(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.log"
+    monkeypatch.setattr(instrumentation, "METRICS_LOG_PATH", str(path))
+    return path
+
+
+def _records(path):
+    return {entry["v"]["stage"]: entry["v"] for entry in map(json.loads, path.read_text().splitlines())}
+
+
+@pytest.mark.skipif(instrumentation.resource is None, reason="RSS needs the resource module")
+def test_stage_records_rss_growth_and_the_process_peak(metrics_log):
+    with stage("small"):
+        pass
+    with stage("large"):
+        block = bytearray(256 * 1024 * 1024)
+        block[::4096] = b"x" * len(block[::4096])
+        del block
+
+    records = _records(metrics_log)
+    assert records["small"]["rss-growth"] < 64 * 1024 ** 2
+    assert records["large"]["rss-growth"] >= 128 * 1024 ** 2
+    assert records["large"]["process-max-rss"] >= records["small"]["process-max-rss"]
+
+    summary = summarize_stages(load_stage_records(str(metrics_log)))
+    assert {"RSS growth p95 (MB)", "Process peak RSS (MB)"} <= set(summary.columns)
+
+
+def test_nested_traced_stages_keep_their_peak(metrics_log, monkeypatch):
+    monkeypatch.setattr(instrumentation, "METRICS_TRACE_MEMORY", True)
+    tracing = tracemalloc.is_tracing()
+    tracemalloc.start()
+    try:
+        with stage("outer"):
+            block = bytearray(32 * 1024 * 1024)
+            del block
+            with stage("inner"):
+                pass
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    records = _records(metrics_log)
+    assert records["outer"]["peak-memory"] >= 30 * 1024 ** 2
+    assert records["inner"]["peak-memory"] < 1024 ** 2
@@ -0,0 +1,75 @@
+import asyncio
+import openai
+import pandas as pd
+import pytest
+import utils.llm_pipeline as llm_pipeline
+from benchmarks.fake_openai import FakeOpenAIServer
+from utils.llm_pipeline import transform_dataframe
+
+
+def _frame(rows=40):
+    return pd.DataFrame({"id": range(rows), "name": [f"name {i}" for i in range(rows)], "score": [i * 0.5 for i in range(rows)]})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Record the backoff delays instead of waiting for them
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(llm_pipeline.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_rows_are_reassembled_in_input_order(stream):
+    df = _frame()
+    completed = []
+    # The first batch is answered last
+    with FakeOpenAIServer(latency=lambda csv: 0.3 if "\n0," in csv else 0.0) as server:
+        result = transform_dataframe(
+            df, "Change nothing.", api_key="test", base_url=server.base_url, stream=stream,
+            max_batch_tokens=60, concurrency=8, on_batch_complete=lambda batch: completed.append(batch.index)
+        )
+    assert len(result.batches) > 2
+    assert completed[-1] == 0
+    assert result.failures == []
+    pd.testing.assert_frame_equal(result.processed_df, df)
+
+
+def test_rate_limited_requests_are_retried_with_backoff(sleeps):
+    df = _frame(5)
+    with FakeOpenAIServer(rate_limited_requests=2) as server:
+        result = transform_dataframe(df, "Change nothing.", api_key="test", base_url=server.base_url)
+    [batch] = result.batches
+    assert batch.ok and batch.attempts == 3
+    assert server.requests == 3
+    # Exponential backoff with jitter: 1-2s, then 2-4s
+    assert len(sleeps) == 2 and 1.0 <= sleeps[0] <= 2.0 and 2.0 <= sleeps[1] <= 4.0
+    pd.testing.assert_frame_equal(result.processed_df, df)
+
+
+def test_batch_fails_once_retries_are_exhausted(sleeps):
+    with FakeOpenAIServer(rate_limited_requests=10) as server:
+        result = transform_dataframe(_frame(5), "Change nothing.", api_key="test", base_url=server.base_url, max_retries=2)
+    [batch] = result.failures
+    assert isinstance(batch.error, openai.RateLimitError)
+    assert batch.attempts == 3 and len(sleeps) == 2
+    assert result.processed_df is None
+
+
+def test_a_failed_batch_does_not_affect_the_others(sleeps):
+    df = _frame()
+    with FakeOpenAIServer(fail_when=lambda csv: "\n7," in csv) as server:
+        result = transform_dataframe(df, "Change nothing.", api_key="test", base_url=server.base_url, max_batch_tokens=60)
+    [failed] = result.failures
+    assert isinstance(failed.error, openai.BadRequestError)
+    assert failed.attempts == 1 and sleeps == []  # Not retryable
+    assert failed.start <= 7 < failed.stop
+    assert len(result.batches) > 2
+    expected = pd.concat([df.iloc[:failed.start], df.iloc[failed.stop:]], ignore_index=True)
+    pd.testing.assert_frame_equal(result.processed_df, expected)
@@ -0,0 +1,36 @@
+import pandas as pd
+from utils.metadata import profile_dataframe
+from utils.streaming_metadata import StreamingProfiler
+
+
+def test_streaming_profiler_counts_empty_cells_of_every_text_dtype():
+    chunk = pd.DataFrame({
+        "string": pd.array(["a", " ", None], dtype="string"),
+        "category": pd.Categorical(["", "x", "x"]),
+        "object": pd.Series(["", "y", None], dtype=object),
+    })
+    profiler = StreamingProfiler()
+    profiler.update(chunk)
+    empty_cells = profiler.to_metadata("chunk")["Operational Metadata"]["Empty Cells Count"]
+    assert empty_cells == {"string": 1, "category": 1, "object": 1}
+
+
+def test_profile_keeps_integer_extremes_exact():
+    big = 2 ** 62 + 1
+    df = pd.DataFrame({"id": pd.Series([1, big], dtype="int64"), "small": pd.Series([3, 4], dtype="uint8"), "price": [0.5, 1.5]})
+    stats = profile_dataframe(df)
+    assert stats["Maximum Value"]["id"] == big
+    assert isinstance(stats["Minimum Value"]["small"], int)
+    assert stats["Maximum Value"]["price"] == 1.5
+    assert stats["Minimum Value"]["small"] == 3
+
+
+def test_streaming_profiler_keeps_integer_extremes_exact():
+    big = 2 ** 62 + 1
+    profiler = StreamingProfiler()
+    profiler.update(pd.DataFrame({"id": pd.Series([1, big], dtype="int64"), "price": [0.5, 1.5]}))
+    profiler.update(pd.DataFrame({"id": pd.Series([big + 2], dtype="int64"), "price": [2.5]}))
+    stats = profiler.to_metadata("chunks")["Operational Metadata"]
+    assert stats["Maximum Value"]["id"] == big + 2
+    assert stats["Minimum Value"]["id"] == 1
+    assert stats["Maximum Value"]["price"] == 2.5
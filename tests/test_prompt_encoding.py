@@ -0,0 +1,45 @@
+import io
+import pandas as pd
+from utils.llm_pipeline import parse_csv_response
+from utils.prompt_encoding import CompactEncoder
+
+GRADES = {"Alpha": "1", "Bravo": "2", "Charlie": "3"}
+
+
+def _fake_model(encoded, encoder, transform):
+    # Reply the way the instructions ask: keep unchanged codes, write changed values in full
+    csv_text = encoded.split("CSV:\n", 1)[1]
+    frame = pd.read_csv(io.StringIO(csv_text), dtype=str, keep_default_na=False)
+    legend = dict(enumerate(encoder.dictionaries["grade"]))
+    frame["grade"] = [transform(legend[int(value[1:])]) for value in frame["grade"]]
+    return frame.to_csv(index=False)
+
+
+def _round_trip(df, prompt, transform):
+    encoder = CompactEncoder(df, prompt)
+    assert "grade" in encoder.dictionaries
+    reply = _fake_model(encoder.encode(df), encoder, transform)
+    return encoder.decode(parse_csv_response(reply), df)
+
+
+def test_numeric_remap_of_a_dictionary_column_is_kept():
+    df = pd.DataFrame({"grade": ["Alpha", "Bravo", "Charlie", "Bravo"] * 3, "n": range(12)})
+    decoded = _round_trip(df, "Map grade to a number: Alpha=1, Bravo=2, Charlie=3", GRADES.get)
+    assert decoded["grade"].astype(str).tolist() == ["1", "2", "3", "2"] * 3
+    assert decoded["n"].tolist() == list(range(12))
+
+
+def test_unchanged_codes_are_expanded():
+    df = pd.DataFrame({"grade": ["Alpha", "Bravo", "Charlie", "Bravo"] * 3, "n": range(12)})
+    reply_values = {"Alpha": None, "Bravo": None, "Charlie": "Delta"}
+
+    def transform(value):
+        return reply_values[value] or f"#{CompactEncoder(df).dictionaries['grade'].index(value)}"
+
+    decoded = _round_trip(df, "Rename Charlie to Delta", transform)
+    assert decoded["grade"].tolist() == ["Alpha", "Bravo", "Delta", "Bravo"] * 3
+
+
+def test_values_that_look_like_codes_are_not_dictionary_encoded():
+    df = pd.DataFrame({"tag": ["#1", "#2"] * 5})
+    assert "tag" not in CompactEncoder(df).dictionaries
@@ -0,0 +1,18 @@
+import pandas as pd
+import pytest
+from utils.session_store import SessionDatasetStore, SessionQuotaExceeded
+
+
+def test_rejected_dataset_keeps_the_previous_one(tmp_path):
+    store = SessionDatasetStore(str(tmp_path), 200 * 1024, 10 * 1024 ** 2, 10 * 1024 ** 2, 3600)
+    small = pd.DataFrame({"a": range(100)})
+    handle = store.put("user", "session", "dataset", small)
+
+    with pytest.raises(SessionQuotaExceeded):
+        store.put("user", "session", "dataset", pd.DataFrame({"a": range(100_000)}))
+    assert handle.exists
+    assert handle.to_pandas()["a"].tolist() == list(range(100))
+
+    replaced = store.put("user", "session", "dataset", pd.DataFrame({"a": range(5)}))
+    assert replaced.to_pandas()["a"].tolist() == list(range(5))
+    assert sorted(p.name for p in (tmp_path.glob("*/session/dataset*"))) == ["dataset.arrow"]
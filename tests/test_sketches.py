@@ -0,0 +1,64 @@
+import pickle
+import numpy as np
+import pandas as pd
+from utils.sketches import HyperLogLog, QuantileSketch
+
+
+def test_hyperloglog_is_exact_below_the_limit():
+    sketch = HyperLogLog(exact_limit=4096)
+    sketch.update(pd.Series([1, 1.0, 2, None, 3]))
+    sketch.update(pd.Series(["a", "a", "b"]))
+    assert sketch.count() == 5
+
+
+def test_hyperloglog_estimate_is_within_the_error():
+    sketch = HyperLogLog(error=0.01)
+    sketch.update(pd.Series(np.arange(200_000)))
+    assert sketch.registers is not None
+    assert abs(sketch.count() - 200_000) / 200_000 < 0.03
+
+
+def test_hyperloglog_merge_matches_a_single_sketch():
+    values = pd.Series(np.arange(100_000))
+    whole = HyperLogLog()
+    whole.update(values)
+    # Overlapping chunks, one of them still exact, merged after a pickle round trip
+    parts = [HyperLogLog() for _ in range(3)]
+    parts[0].update(values.iloc[:60_000])
+    parts[1].update(values.iloc[40_000:])
+    parts[2].update(values.iloc[:100])
+    merged = pickle.loads(pickle.dumps(parts[2]))
+    for part in parts[:2]:
+        merged.merge(pickle.loads(pickle.dumps(part)))
+    assert merged.count() == whole.count()
+
+
+def test_quantile_sketch_is_exact_for_small_inputs():
+    sketch = QuantileSketch()
+    sketch.update([3.0, 1.0, np.nan, 2.0])
+    assert sketch.quantile(0.5) == 2.0
+
+
+def test_quantile_sketch_ranks_are_within_the_error():
+    values = np.random.default_rng(0).permutation(100_000).astype(float)
+    sketch = QuantileSketch(error=0.01, seed=0)
+    for chunk in np.array_split(values, 10):
+        sketch.update(chunk)
+    assert sketch.compacted
+    for q in (0.1, 0.5, 0.9):
+        assert abs(sketch.quantile(q) / len(values) - q) < 0.02
+
+
+def test_quantile_sketch_merge_keeps_the_rank_error():
+    values = np.random.default_rng(1).normal(size=200_000)
+    sketches = []
+    for seed, chunk in enumerate(np.array_split(values, 4)):
+        sketch = QuantileSketch(error=0.01, seed=seed)
+        sketch.update(chunk)
+        sketches.append(pickle.loads(pickle.dumps(sketch)))
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    for q in (0.1, 0.5, 0.9):
+        rank = np.mean(values <= merged.quantile(q))
+        assert abs(rank - q) < 0.02
@@ -0,0 +1,92 @@
+from decimal import Decimal
+import pandas as pd
+import pytest
+from utils.sql_bulk import bulk_load_dataframe, check_table_fits, sql_server_column_type
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+
+    def execute(self, sql, params=None):
+        self.database.statements.append(sql)
+
+    def fetchall(self):
+        return self.database.columns
+
+    def executemany(self, sql, rows):
+        self.database.rows.extend(rows)
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, columns=()):
+        self.columns = list(columns)
+        self.statements = []
+        self.rows = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+def test_column_types_do_not_depend_on_the_current_values():
+    small = pd.DataFrame({"i": pd.Series([1], dtype="uint8"), "f": pd.Series([0.5], dtype="float32"), "s": ["ab"]})
+    large = pd.DataFrame({"i": [2 ** 40], "f": [1e300], "s": ["x" * 3000]})
+    for col in small.columns:
+        assert sql_server_column_type(small[col]) == sql_server_column_type(large[col])
+    assert sql_server_column_type(small["i"]) == "BIGINT"
+    assert sql_server_column_type(small["s"]) == "NVARCHAR(4000)"
+    assert sql_server_column_type(pd.Series(["x" * 5000])) == "NVARCHAR(MAX)"
+    assert sql_server_column_type(pd.Series([Decimal("1.25")], dtype=object)) == "DECIMAL(38, 2)"
+
+
+def test_check_table_fits_lists_every_overflow():
+    columns = {
+        "i": ("tinyint", None, 3, 0),
+        "s": ("nvarchar", 4, None, None),
+        "d": ("decimal", None, 5, 2),
+        "m": ("nvarchar", -1, None, None),
+    }
+    df = pd.DataFrame({
+        "i": [1, 300],
+        "s": ["abc", "abcdef"],
+        "d": [Decimal("1.5"), Decimal("12345.5")],
+        "m": ["x" * 10000, None],
+        "extra": [1, 2],
+    })
+    with pytest.raises(ValueError) as error:
+        check_table_fits(df, columns, "dbo.t")
+    message = str(error.value)
+    for col in ["[i]", "[s]", "[d]", "[extra]"]:
+        assert col in message
+    assert "[m]" not in message
+
+    check_table_fits(df[["m"]].assign(I=[0, 255]), columns, "dbo.t")
+
+
+def test_load_into_existing_table_fails_before_inserting():
+    database = FakeDatabase(columns=[("a", "int", None, 10, 0)])
+    with pytest.raises(ValueError, match="outside the range of INT"):
+        bulk_load_dataframe(pd.DataFrame({"a": [2 ** 40]}), "dbo", "t", database.connect)
+    assert database.rows == []
+    assert not any("CREATE TABLE" in sql for sql in database.statements)
+
+
+def test_load_creates_missing_table():
+    database = FakeDatabase()
+    assert bulk_load_dataframe(pd.DataFrame({"a": [1, 2]}), "dbo", "t", database.connect) == 2
+    assert any("CREATE TABLE [dbo].[t] ([a] BIGINT NULL)" in sql for sql in database.statements)
+    assert len(database.rows) == 2
@@ -0,0 +1,61 @@
+from decimal import Decimal
+import threading
+from utils.sql_fetch import fetch_query_in_chunks
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.description = [("id",), ("amount",), ("name",)]
+        self.cancelled = False
+
+    def execute(self, query):
+        pass
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursor_ = FakeCursor(rows)
+
+    def cursor(self):
+        return self.cursor_
+
+
+ROWS = [(i, Decimal(f"{i}.25"), f"name {i}" if i % 3 else "") for i in range(10)]
+
+
+def test_fetch_joins_the_chunks_and_profiles_the_final_frame():
+    chunks = []
+    result = fetch_query_in_chunks(FakeConnection(ROWS), "SELECT", chunk_rows=4, on_chunk=lambda df, rows: chunks.append(rows))
+    assert chunks == [4, 8, 10]
+    assert result.df["id"].tolist() == list(range(10))
+    assert result.df["amount"].iloc[3] == Decimal("3.25")
+
+    metadata = result.metadata()
+    assert metadata["Descriptive Metadata"]["Number of Rows"] == 10
+    assert metadata["Operational Metadata"]["Empty Cells Count"]["name"] == 4
+
+
+def test_fetch_stops_at_max_rows_and_when_cancelled():
+    connection = FakeConnection(ROWS)
+    result = fetch_query_in_chunks(connection, "SELECT", chunk_rows=4, max_rows=6)
+    assert len(result.df) == 6 and result.truncated and connection.cursor_.cancelled
+
+    cancel_event = threading.Event()
+    connection = FakeConnection(ROWS)
+    result = fetch_query_in_chunks(connection, "SELECT", chunk_rows=4, cancel_event=cancel_event,
+                                   on_chunk=lambda df, rows: cancel_event.set())
+    assert result.cancelled and result.rows == 4 and connection.cursor_.cancelled
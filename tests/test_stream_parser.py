@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+from utils.llm_pipeline import MalformedResponse, check_response
+from utils.stream_parser import IncrementalCSVParser
+
+
+def _parse(text, fragment=7):
+    parser = IncrementalCSVParser(block_rows=2)
+    for start in range(0, len(text), fragment):
+        parser.feed(text[start:start + fragment])
+    parser.close()
+    return parser
+
+
+def test_quoted_newlines_span_fragments():
+    parser = _parse('id,note\n1,"first\nline"\n2,"say ""hi"""\n3,plain\n')
+    df = parser.to_frame()
+    assert df["note"].tolist() == ["first\nline", 'say "hi"', "plain"]
+    assert parser.bad_lines == []
+
+
+def test_truncated_last_line_is_set_aside():
+    parser = _parse('id,note\n1,a\n2,"unterminated')
+    assert parser.to_frame()["id"].tolist() == [1]
+    assert parser.bad_lines == ['2,"unterminated']
+
+
+def test_preamble_line_fails_the_batch():
+    parser = _parse("```csv\nHere is the cleaned data:\nid,name,score\n1,a,2\n2,b,3\n```")
+    df = parser.to_frame()
+    assert len(df) == 0 and len(parser.bad_lines) == 3
+    with pytest.raises(MalformedResponse):
+        check_response(df, parser.bad_lines, ["id", "name", "score"])
+
+
+def test_header_without_any_sent_column_fails_the_batch():
+    with pytest.raises(MalformedResponse):
+        check_response(pd.DataFrame({"Sure! Here you go": ["x"]}), [], ["id", "name"])
+    # Added or renamed columns are fine while some sent columns come back
+    check_response(pd.DataFrame({"id": [1], "first_name": ["a"]}), [], ["id", "name"])
@@ -0,0 +1,401 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import multiprocessing
+import pandas as pd
+import argparse
+import shutil
+import glob
+import json
+import time
+import io
+import os
+import re
+from utils.cache import content_hash
+from utils.dtypes import optimize_dtypes
+from utils.metadata import generate_metadata
+from utils.llm_pipeline import DATA_CLEANING_SYSTEM_MESSAGE, DEFAULT_BATCH_TOKENS, DEFAULT_CONCURRENCY, DEFAULT_MODEL, transform_dataframe
+from utils.code_transform import CODE_GENERATION_SYSTEM_MESSAGE, DEFAULT_TIMEOUT_SECONDS, execute_transformation, generate_transformation_code
+from utils.helper_functions import fetch_data_from_sql_in_chunks, push_data_to_sql, write_hyper_file
+from utils.prompt_cache import prompt_cache
+from utils.instrumentation import set_context, stage
+
+# Checkpoints of unfinished runs and the reports of every run are kept here
+BATCH_DIR = os.environ.get("STREAMLINER_BATCH_DIR", os.path.join(".cache", "batch"))
+# Model requests in flight across all worker processes
+BATCH_LLM_CONCURRENCY = int(os.environ.get("STREAMLINER_BATCH_LLM_CONCURRENCY", "8"))
+# The SQL Server password is read from the environment so it stays out of shell history
+SQL_PASSWORD_ENV = "STREAMLINER_SQL_PASSWORD"
+
+SOURCE_EXTENSIONS = (".csv", ".sql")
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# Shared by the worker processes to cap the model requests in flight (set by _init_worker)
+_llm_slots = None
+
+
+# Function to expand directories and glob patterns into the CSV files and SQL
+# query files to process. Every source gets a name that is unique within the
+# run and safe to use in file and table names.
+def expand_sources(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern) or ([pattern] if os.path.exists(pattern) else [])
+        paths.extend(sorted(path for path in matches if path.lower().endswith(SOURCE_EXTENSIONS) and os.path.isfile(path)))
+
+    sources = []
+    seen_paths = set()
+    names = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if path in seen_paths:
+            continue
+        seen_paths.add(path)
+        stem, extension = os.path.splitext(os.path.basename(path))
+        name = re.sub(r"\W", "_", stem)
+        if name in names:
+            name = f"{name}_{content_hash(path)[:8]}"
+        names.add(name)
+        stat = os.stat(path)
+        sources.append({
+            "name": name,
+            "path": path,
+            "kind": extension.lower().lstrip("."),
+            # A changed file is a different source, so its checkpoint no longer applies
+            "key": content_hash(f"{path}|{stat.st_size}|{stat.st_mtime_ns}")[:20],
+        })
+    return sources
+
+
+class BatchCheckpoint:
+    # One JSON record per source with its status and the exports already done,
+    # so a resumed run skips finished sources and never pushes the same rows
+    # to SQL twice. The directory is removed once every source succeeded.
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, source_key, suffix="json"):
+        return os.path.join(self.directory, f"{source_key}.{suffix}")
+
+    def load(self, source_key):
+        try:
+            with open(self.path(source_key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"status": None, "exported": []}
+
+    def save(self, source_key, record):
+        temp_path = f"{self.path(source_key)}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(record, f)
+        os.replace(temp_path, self.path(source_key))
+
+    def finish(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _init_worker(llm_slots):
+    global _llm_slots
+    _llm_slots = llm_slots
+
+
+def _acquire_llm_slots(wanted):
+    # Wait for one slot, then take as many more as are free (up to `wanted`)
+    if _llm_slots is None:
+        return wanted
+    _llm_slots.acquire()
+    acquired = 1
+    while acquired < wanted and _llm_slots.acquire(block=False):
+        acquired += 1
+    return acquired
+
+
+def _release_llm_slots(count):
+    if _llm_slots is not None:
+        for _ in range(count):
+            _llm_slots.release()
+
+
+def _load_source(source, options):
+    if source["kind"] == "csv":
+        with open(source["path"], "rb") as f:
+            data = f.read()
+        with stage("csv_parse", bytes=len(data)) as record:
+            df = optimize_dtypes(pd.read_csv(io.BytesIO(data)))
+            record["rows"] = len(df)
+        return df, content_hash(data), len(data)
+
+    with open(source["path"], "r") as f:
+        query = f.read()
+    result = fetch_data_from_sql_in_chunks(query, options["server"], options["database"], options["user_id"], options["password"])
+    df = optimize_dtypes(result.df)
+    return df, content_hash(df), int(df.memory_usage(deep=True).sum())
+
+
+def _transform(df, dataset_key, metadata, options, summary):
+    # Identical requests on identical data are served from the prompt cache, so
+    # a resumed run does not pay for the transformations that already finished
+    system_message = CODE_GENERATION_SYSTEM_MESSAGE if options["generate_code"] else DATA_CLEANING_SYSTEM_MESSAGE
+    # Batch runs send the full dataset without compact encoding
+    key_options = {} if options["generate_code"] else {"compact_encoding": False, "select_columns": False}
+    cache_key = prompt_cache.make_key(dataset_key, options["prompt"], system_message, DEFAULT_MODEL, **key_options)
+    processed_df = prompt_cache.get(cache_key)
+    if processed_df is not None:
+        summary["cached"] = True
+        return processed_df
+
+    if options["generate_code"]:
+        # The LLM slot is held while the model writes the code, not while the code runs
+        slots = _acquire_llm_slots(1)
+        try:
+            with stage("llm_call", model=DEFAULT_MODEL, mode="code"):
+                code = generate_transformation_code(df, metadata, options["prompt"])
+        finally:
+            _release_llm_slots(slots)
+        with stage("code_execution", rows=len(df), measure_cpu=False) as record:
+            processed_df = execute_transformation(code, df, timeout=options["timeout"])
+            record["output_rows"] = len(processed_df)
+    else:
+        slots = _acquire_llm_slots(options["concurrency"])
+        try:
+            result = transform_dataframe(df, options["prompt"], max_batch_tokens=options["max_batch_tokens"], concurrency=slots)
+        finally:
+            _release_llm_slots(slots)
+        summary["tokens"] = sum(batch.usage.prompt_tokens + batch.usage.completion_tokens
+                                for batch in result.batches if batch.usage is not None)
+        if result.failures:
+            # Unattended runs never export partial results
+            raise RuntimeError(f"{len(result.failures)} of {len(result.batches)} batches failed: {result.failures[0].error}")
+        summary["malformed_lines"] = sum(len(batch.bad_lines) for batch in result.batches)
+        processed_df = result.processed_df
+
+    if not summary.get("malformed_lines"):
+        prompt_cache.set(cache_key, processed_df)
+    return processed_df
+
+
+# Function to run the whole pipeline for one source in a worker process:
+# load, profile, transform and export. Returns a summary for the report.
+def process_source(source, options):
+    checkpoint = BatchCheckpoint(options["checkpoint_dir"])
+    record = checkpoint.load(source["key"])
+    summary = {"name": source["name"], "source": source["path"], "status": FAILED, "rows_in": None, "rows_out": None,
+               "bytes": None, "seconds": None, "cached": False, "tokens": None, "malformed_lines": 0, "error": None}
+    set_context(session=f"batch-{options['run_key'][:12]}", request=source["name"])
+    started = time.perf_counter()
+
+    try:
+        df, dataset_key, size = _load_source(source, options)
+        summary["rows_in"] = len(df)
+        summary["bytes"] = size
+
+        metadata = generate_metadata(df, file_name=os.path.basename(source["path"]), file_size=size / 1024)
+        if options["metadata_dir"]:
+            with open(os.path.join(options["metadata_dir"], f"{source['name']}.metadata.json"), "w") as f:
+                json.dump(metadata, f, indent=2, default=str)
+
+        processed_df = _transform(df, dataset_key, metadata, options, summary)
+        summary["rows_out"] = len(processed_df)
+
+        if options["hyper_dir"] and "hyper" not in record["exported"]:
+            write_hyper_file(processed_df, os.path.join(options["hyper_dir"], f"{source['name']}.hyper"), options["hyper_table"])
+            record["exported"].append("hyper")
+            checkpoint.save(source["key"], record)
+
+        if options["sql_table"] and "sql" not in record["exported"]:
+            # Committed batches are checkpointed too, so an interrupted push resumes where it
+            # stopped. The checkpoint belongs to the exact rows being pushed: a resumed run whose
+            # transformation came out differently (e.g. it was not cached) must not add its rows
+            # to the batches committed from the earlier result.
+            table_name = options["sql_table"].format(name=source["name"])
+            data_hash = content_hash(processed_df)
+            pushed_hash = record.get("sql_data")
+            stale_path = pushed_hash and checkpoint.path(source["key"], f"sql-{pushed_hash[:16]}.json")
+            if pushed_hash not in (None, data_hash) and os.path.exists(stale_path):
+                raise RuntimeError(
+                    f"{table_name} already holds batches of an earlier, different result for this source; "
+                    f"remove those rows and {stale_path}, then run again"
+                )
+            record["sql_data"] = data_hash
+            checkpoint.save(source["key"], record)
+            push_data_to_sql(
+                processed_df, table_name,
+                options["server"], options["database"], options["user_id"], options["password"],
+                parallel_connections=options["sql_connections"],
+                checkpoint_path=checkpoint.path(source["key"], f"sql-{data_hash[:16]}.json")
+            )
+            record["exported"].append("sql")
+            checkpoint.save(source["key"], record)
+
+        summary["status"] = SUCCEEDED
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+
+    summary["seconds"] = time.perf_counter() - started
+    record.update({"status": summary["status"], "summary": summary})
+    checkpoint.save(source["key"], record)
+    return summary
+
+
+# Function to process `sources` on a pool of `workers` processes. Sources that
+# succeeded in an earlier, interrupted run with the same checkpoint directory
+# are skipped; the directory is removed once all sources succeeded.
+def run_batch(sources, options, workers=None, llm_concurrency=BATCH_LLM_CONCURRENCY, on_result=None):
+    checkpoint = BatchCheckpoint(options["checkpoint_dir"])
+    results = []
+    pending = []
+    for source in sources:
+        record = checkpoint.load(source["key"])
+        if record["status"] == SUCCEEDED:
+            results.append({**record["summary"], "status": SKIPPED})
+        else:
+            pending.append(source)
+
+    if pending:
+        context = multiprocessing.get_context()
+        llm_slots = context.Semaphore(llm_concurrency)
+        workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(llm_slots,)) as executor:
+            futures = [executor.submit(process_source, source, options) for source in pending]
+            try:
+                for future in as_completed(futures):
+                    summary = future.result()
+                    results.append(summary)
+                    if on_result is not None:
+                        on_result(summary, len(results), len(sources))
+            except KeyboardInterrupt:
+                # Finished sources are checkpointed; running the same command again resumes
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    if all(summary["status"] in (SUCCEEDED, SKIPPED) for summary in results):
+        checkpoint.finish()
+    order = {source["name"]: index for index, source in enumerate(sources)}
+    return sorted(results, key=lambda summary: order.get(summary["name"], len(order)))
+
+
+# Function to summarize a run: counts, throughput and the failures
+def build_report(results, elapsed, workers, options):
+    processed = [summary for summary in results if summary["status"] != SKIPPED]
+    rows_in = sum(summary["rows_in"] or 0 for summary in processed)
+    return {
+        "finished": datetime.now().isoformat(),
+        "prompt": options["prompt"],
+        "elapsed_seconds": round(elapsed, 3),
+        "workers": workers,
+        "sources": len(results),
+        "succeeded": sum(summary["status"] == SUCCEEDED for summary in results),
+        "skipped": sum(summary["status"] == SKIPPED for summary in results),
+        "failed": sum(summary["status"] == FAILED for summary in results),
+        "cached": sum(summary["cached"] for summary in processed),
+        "rows_in": rows_in,
+        "rows_out": sum(summary["rows_out"] or 0 for summary in processed),
+        "tokens": sum(summary["tokens"] or 0 for summary in processed),
+        "rows_per_second": round(rows_in / elapsed, 1) if elapsed > 0 else None,
+        "sources_per_minute": round(len(processed) / elapsed * 60, 2) if elapsed > 0 else None,
+        "failures": [{"name": summary["name"], "source": summary["source"], "error": summary["error"]}
+                     for summary in results if summary["status"] == FAILED],
+        "results": results,
+    }
+
+
+def _print_progress(summary, done, total):
+    status = summary["status"] if summary["status"] != SUCCEEDED else f"{summary['rows_out']:,} rows in {summary['seconds']:.1f}s"
+    if summary["status"] == FAILED:
+        status = f"failed: {summary['error']}"
+    print(f"[{done}/{total}] {summary['name']}: {status}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply one cleaning prompt to many CSV files or SQL queries without the UI.")
+    parser.add_argument("inputs", nargs="+", help="CSV files, .sql query files, directories or glob patterns")
+    prompt_group = parser.add_mutually_exclusive_group(required=True)
+    prompt_group.add_argument("--prompt", help="Cleaning prompt applied to every source")
+    prompt_group.add_argument("--prompt-file", help="File containing the cleaning prompt")
+    parser.add_argument("--generate-code", action="store_true", help="Generate pandas code once per source and run it locally")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT_SECONDS, help="Time limit for generated code (seconds)")
+    parser.add_argument("--max-batch-tokens", type=int, default=DEFAULT_BATCH_TOKENS, help="Input tokens per model request")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Model requests in flight per source")
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY, help="Model requests in flight across all workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--hyper-dir", help="Write <name>.hyper for every source into this directory")
+    parser.add_argument("--hyper-table", default="Extract", help="Table name inside the .hyper files")
+    parser.add_argument("--sql-table", help="Push every source to this table; {name} is replaced by the source name, e.g. dbo.{name}")
+    parser.add_argument("--sql-connections", type=int, default=1, help="Parallel connections per SQL push")
+    parser.add_argument("--server", help="SQL Server for .sql sources and --sql-table")
+    parser.add_argument("--database", help="SQL Server database")
+    parser.add_argument("--user", help=f"SQL Server user ID (the password is read from {SQL_PASSWORD_ENV})")
+    parser.add_argument("--metadata-dir", help="Write <name>.metadata.json for every source into this directory")
+    parser.add_argument("--checkpoint-dir", help="Checkpoints for resuming (default: derived from the inputs and options)")
+    parser.add_argument("--report", help="Where to write the JSON report (default: under .cache/batch/reports)")
+    args = parser.parse_args(argv)
+
+    if not args.hyper_dir and not args.sql_table:
+        parser.error("nothing to export: pass --hyper-dir and/or --sql-table")
+    sources = expand_sources(args.inputs)
+    if not sources:
+        parser.error("no .csv or .sql files matched the inputs")
+    needs_sql = args.sql_table or any(source["kind"] == "sql" for source in sources)
+    if needs_sql and not (args.server and args.database and args.user and os.environ.get(SQL_PASSWORD_ENV)):
+        parser.error(f"SQL sources and --sql-table need --server, --database, --user and the {SQL_PASSWORD_ENV} environment variable")
+
+    prompt = args.prompt
+    if args.prompt_file:
+        with open(args.prompt_file, "r") as f:
+            prompt = f.read().strip()
+
+    # The same inputs and options map to the same checkpoint directory, so rerunning an interrupted command resumes it
+    run_key = content_hash(json.dumps({
+        "sources": [source["path"] for source in sources], "prompt": prompt, "generate_code": args.generate_code,
+        "hyper_dir": args.hyper_dir, "hyper_table": args.hyper_table, "sql_table": args.sql_table,
+        "server": args.server, "database": args.database,
+    }, sort_keys=True))
+    options = {
+        "run_key": run_key,
+        "checkpoint_dir": args.checkpoint_dir or os.path.join(BATCH_DIR, run_key[:16]),
+        "prompt": prompt,
+        "generate_code": args.generate_code,
+        "timeout": args.timeout,
+        "max_batch_tokens": args.max_batch_tokens,
+        "concurrency": min(args.concurrency, args.llm_concurrency),
+        "hyper_dir": args.hyper_dir,
+        "hyper_table": args.hyper_table,
+        "sql_table": args.sql_table,
+        "sql_connections": args.sql_connections,
+        "server": args.server,
+        "database": args.database,
+        "user_id": args.user,
+        "password": os.environ.get(SQL_PASSWORD_ENV),
+        "metadata_dir": args.metadata_dir,
+    }
+    for directory in (args.hyper_dir, args.metadata_dir):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    workers = max(1, min(args.workers or 1, len(sources)))
+    print(f"Processing {len(sources)} source(s) with {workers} worker(s); checkpoints in {options['checkpoint_dir']}", flush=True)
+    started = time.perf_counter()
+    results = run_batch(sources, options, workers=workers, llm_concurrency=args.llm_concurrency, on_result=_print_progress)
+    report = build_report(results, time.perf_counter() - started, workers, options)
+
+    report_path = args.report or os.path.join(BATCH_DIR, "reports", f"{datetime.now():%Y%m%d-%H%M%S}-{run_key[:8]}.json")
+    if os.path.dirname(report_path):
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print(f"\n{report['succeeded']} succeeded, {report['skipped']} skipped (done earlier), {report['failed']} failed "
+          f"in {report['elapsed_seconds']:.1f}s")
+    print(f"{report['rows_in']:,} rows in, {report['rows_out']:,} rows out, {report['rows_per_second'] or 0:,.0f} rows/s, "
+          f"{report['sources_per_minute'] or 0:,.1f} sources/min, {report['cached']} served from the prompt cache, "
+          f"{report['tokens']:,} tokens")
+    for failure in report["failures"]:
+        print(f"  FAILED {failure['name']}: {failure['error']}")
+    print(f"Report written to {report_path}")
+    return 1 if report["failed"] else 0
@@ -0,0 +1,260 @@
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+import hashlib
+import pickle
+import json
+import io
+import threading
+import time
+import os
+
+# Size limits for the process-wide dataset cache (override via environment variables)
+DATASET_CACHE_MEMORY_MB = int(os.environ.get("STREAMLINER_CACHE_MEMORY_MB", "1024"))
+DATASET_CACHE_DISK_MB = int(os.environ.get("STREAMLINER_CACHE_DISK_MB", "10240"))
+DATASET_CACHE_DIR = os.environ.get("STREAMLINER_CACHE_DIR", os.path.join(".cache", "datasets"))
+
+PARQUET_MAGIC = b"PAR1"
+
+
+# Function to compute a content hash of raw bytes, text or a DataFrame
+def content_hash(data):
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr(list(data.columns)).encode())
+        digest.update(repr([str(dtype) for dtype in data.dtypes]).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    elif isinstance(data, str):
+        digest.update(data.encode())
+    else:
+        digest.update(bytes(data))
+    return digest.hexdigest()
+
+
+# Function to estimate the in-memory footprint of a cached value in bytes
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class LRUCache:
+    # In-memory cache bounded by the total estimated size of its values.
+    # Cached values are shared between callers and must be treated as read-only.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def set(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+# Function to serialize a cache value without pickle, since cache directories
+# are shared: DataFrames as parquet, everything else as JSON. Returns None for
+# values that cannot be stored that way (e.g. mixed-type columns).
+def serialize_value(value):
+    if isinstance(value, pd.DataFrame):
+        try:
+            buffer = io.BytesIO()
+            value.to_parquet(buffer, index=False)
+            return buffer.getvalue()
+        except Exception:
+            return None
+
+    def plain(item):
+        # numpy scalars become Python numbers; timestamps, dtypes and the like become text
+        return item.item() if isinstance(item, np.generic) else str(item)
+
+    return json.dumps(value, default=plain).encode()
+
+
+def deserialize_value(data):
+    if data[:4] == PARQUET_MAGIC:
+        return pd.read_parquet(io.BytesIO(data))
+    return json.loads(data)
+
+
+class DiskCache:
+    # On-disk cache shared between sessions and processes. Each entry is one
+    # file; its mtime records when it was written and its atime when it was
+    # last read. The least recently used files are removed once the directory
+    # exceeds `max_bytes`, and entries older than `ttl_seconds` are expired.
+    # Entries are never unpickled (see serialize_value).
+
+    def __init__(self, directory, max_bytes, suffix=".entry", ttl_seconds=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get_bytes(self, key):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl_seconds is not None and time.time() - stat.st_mtime > self.ttl_seconds:
+                self.delete(key)
+                self.misses += 1
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, (time.time(), stat.st_mtime))  # Mark as recently used, keep the write time
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set_bytes(self, key, data):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)  # Atomic, so concurrent readers never see partial files
+        self.evict()
+
+    def get(self, key, default=None):
+        data = self.get_bytes(key)
+        if data is None:
+            return default
+        try:
+            return deserialize_value(data)
+        except Exception:
+            self.delete(key)
+            return default
+
+    def set(self, key, value):
+        data = serialize_value(value)
+        if data is not None:
+            self.set_bytes(key, data)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, _, size, _ in entries)
+            now = time.time()
+            for _, written, size, name in entries:
+                expired = self.ttl_seconds is not None and now - written > self.ttl_seconds
+                if total <= self.max_bytes and not expired:
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    total -= size
+                except OSError:
+                    pass
+
+
+class DatasetCache:
+    # Two-tier cache for parsed datasets and their derived artifacts (metadata,
+    # serialized CSV, ...), keyed by the content hash of the source data.
+
+    def __init__(self, memory_bytes, disk_directory=None, disk_bytes=0):
+        self.memory = LRUCache(memory_bytes)
+        self.disk = DiskCache(disk_directory, disk_bytes) if disk_directory and disk_bytes else None
+
+    def get(self, dataset_key, artifact):
+        key = f"{dataset_key}-{artifact}"
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, dataset_key, artifact, value):
+        key = f"{dataset_key}-{artifact}"
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def get_or_compute(self, dataset_key, artifact, compute):
+        value = self.get(dataset_key, artifact)
+        if value is None:
+            value = compute()
+            self.set(dataset_key, artifact, value)
+        return value
+
+    def stats(self):
+        stats = {
+            "memory_hits": self.memory.hits,
+            "memory_misses": self.memory.misses,
+            "memory_bytes": self.memory.current_bytes,
+        }
+        if self.disk is not None:
+            stats.update({"disk_hits": self.disk.hits, "disk_misses": self.disk.misses})
+        return stats
+
+
+# Process-wide cache shared by every Streamlit session on this server
+dataset_cache = DatasetCache(
+    DATASET_CACHE_MEMORY_MB * 1024 * 1024,
+    DATASET_CACHE_DIR if DATASET_CACHE_DISK_MB > 0 else None,
+    DATASET_CACHE_DISK_MB * 1024 * 1024,
+)
@@ -0,0 +1,224 @@
+import multiprocessing
+import time
+import pandas as pd
+import numpy as np
+import traceback
+import builtins
+import openai
+import types
+import ast
+import re
+from utils.llm_pipeline import DEFAULT_MODEL, strip_code_fences
+from utils.sandbox import enter_sandbox
+from utils.instrumentation import stage
+
+# System message for the "generate code, execute locally" transformation mode
+CODE_GENERATION_SYSTEM_MESSAGE = "You are an expert data analyst who writes pandas code. Given a dataset schema, column statistics, a small sample of rows and a data cleaning request, write a Python function named `transform` that takes the full pandas DataFrame `df` and returns the cleaned DataFrame. Use only the pre-imported modules `pd` (pandas), `np` (numpy) and `re`, and only their functions, classes and constants (no submodules such as `np.random` or `pd.api`). Do not import anything, use names starting with an underscore, read or write files, or access the network. Columns may use compact dtypes (small integer widths, category, string, nullable Int/boolean): cast them before arithmetic that could overflow or before assigning values that are not existing categories. Prefer vectorized pandas operations. Return only the Python code, without any text or explanations."
+
+DEFAULT_SAMPLE_ROWS = 20
+DEFAULT_TIMEOUT_SECONDS = 120
+
+# Builtins available to generated code
+SAFE_BUILTINS = {
+    name: getattr(builtins, name) for name in [
+        "abs", "all", "any", "bool", "dict", "enumerate", "filter", "float", "int", "isinstance", "len", "list",
+        "map", "max", "min", "range", "reversed", "round", "set", "slice", "sorted", "str", "sum", "tuple", "zip",
+        "Exception", "ValueError", "TypeError", "KeyError",
+    ]
+}
+
+# Modules generated code receives; they may only be used as `pd.<attribute>`
+SANDBOX_MODULES = {"pd": pd, "np": np, "re": re}
+
+# Syntax generated code may use; everything else (imports, classes, global
+# statements, async code, with blocks, ...) is rejected
+ALLOWED_NODES = (
+    ast.Module, ast.FunctionDef, ast.arguments, ast.arg, ast.Return, ast.Assign, ast.AugAssign, ast.AnnAssign,
+    ast.For, ast.While, ast.If, ast.Try, ast.ExceptHandler, ast.Raise, ast.Assert, ast.Delete, ast.Pass, ast.Break,
+    ast.Continue, ast.Expr, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Lambda, ast.IfExp, ast.Dict, ast.Set, ast.List,
+    ast.Tuple, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.comprehension, ast.Compare, ast.Call,
+    ast.keyword, ast.Constant, ast.JoinedStr, ast.FormattedValue, ast.Attribute, ast.Subscript, ast.Slice,
+    ast.Starred, ast.Name, ast.NamedExpr, ast.expr_context, ast.boolop, ast.operator, ast.unaryop, ast.cmpop,
+)
+
+# Methods that read or write files, or evaluate strings as code, on any object.
+# The sandbox process cannot write files either; this rejects such code early.
+BLOCKED_ATTRIBUTES = {
+    "load", "save", "savez", "savez_compressed", "fromfile", "tofile", "loadtxt", "savetxt", "genfromtxt", "memmap",
+    "to_csv", "to_pickle", "to_sql", "to_parquet", "to_excel", "to_json", "to_hdf", "to_feather", "to_html",
+    "to_clipboard", "to_stata", "to_gbq", "to_xml", "to_latex", "to_markdown", "to_orc", "eval", "query",
+}
+
+
+class CodeExecutionError(Exception):
+    pass
+
+
+# Function to describe the dataset to the model without sending its rows
+def build_code_messages(df, metadata, prompt, sample_rows=DEFAULT_SAMPLE_ROWS):
+    operational = metadata["Operational Metadata"] if metadata else {}
+    schema_lines = []
+    for col in df.columns:
+        stats = [f"dtype={df[col].dtype}"]
+        for label, key in [("nulls", "Null Count"), ("uniques", "Unique Values Count"), ("empties", "Empty Cells Count"),
+                           ("mean", "Mean"), ("min", "Minimum Value"), ("max", "Maximum Value")]:
+            value = operational.get(key, {}).get(col, "NA")
+            if not (isinstance(value, str) and value == "NA"):
+                stats.append(f"{label}={value}")
+        schema_lines.append(f"- {col}: {', '.join(stats)}")
+    schema = "\n".join(schema_lines)
+    sample = df.head(sample_rows).to_csv(index=False)
+
+    return [
+        {"role": "system", "content": CODE_GENERATION_SYSTEM_MESSAGE},
+        {"role": "user", "content": f"The dataset has {len(df)} rows and these columns:\n{schema}\n\nHere are the first {min(sample_rows, len(df))} rows in CSV format:\n{sample}\n\n{prompt}\n\nPlease return only the `transform(df)` function."}
+    ]
+
+
+def _bound_names(tree):
+    # Names the code defines itself: functions, parameters, assignment, loop and exception targets
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+    return names
+
+
+def _check_module_attribute(node, parents):
+    # Resolve the longest chain like `np.f2py.subprocess` against the real
+    # modules; any step that is itself a module would leave the allowlist
+    chain = [node]
+    while isinstance(parents.get(chain[-1]), ast.Attribute) and parents[chain[-1]].value is chain[-1]:
+        chain.append(parents[chain[-1]])
+    value = SANDBOX_MODULES[node.id]
+    path = node.id
+    for attribute_node in chain[1:]:
+        path = f"{path}.{attribute_node.attr}"
+        try:
+            value = getattr(value, attribute_node.attr)
+        except AttributeError:
+            raise CodeExecutionError(f"Generated code uses unknown attribute '{path}' on line {node.lineno}")
+        if isinstance(value, types.ModuleType):
+            raise CodeExecutionError(f"Generated code reaches module '{path}' on line {node.lineno}")
+
+
+# Function to reject generated code that steps outside the allowlist: only
+# the syntax in ALLOWED_NODES, the safe builtins, names the code defines, and
+# attributes of pd/np/re that are not modules themselves. This is a first
+# line of defence; the code then runs confined by utils.sandbox.
+def validate_code(code):
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise CodeExecutionError(f"Generated code is not valid Python: {e}")
+
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    allowed_names = set(SAFE_BUILTINS) | _bound_names(tree)
+    for node in ast.walk(tree):
+        line = getattr(node, "lineno", "?")
+        if not isinstance(node, ALLOWED_NODES):
+            raise CodeExecutionError(f"Generated code uses a forbidden construct ({type(node).__name__}) on line {line}")
+        if isinstance(node, ast.Name):
+            if node.id.startswith("_"):
+                raise CodeExecutionError(f"Generated code uses forbidden name '{node.id}' on line {line}")
+            if node.id in SANDBOX_MODULES:
+                # Modules may not be passed around, rebound or called, only used for attribute access
+                parent = parents.get(node)
+                if not (isinstance(node.ctx, ast.Load) and isinstance(parent, ast.Attribute) and parent.value is node):
+                    raise CodeExecutionError(f"Generated code uses module '{node.id}' other than as {node.id}.<name> on line {line}")
+                _check_module_attribute(node, parents)
+            elif node.id not in allowed_names:
+                raise CodeExecutionError(f"Generated code uses unknown name '{node.id}' on line {line}")
+        if isinstance(node, ast.Attribute) and (node.attr.startswith("_") or node.attr in BLOCKED_ATTRIBUTES
+                                                or node.attr.startswith("read_")):
+            raise CodeExecutionError(f"Generated code uses forbidden attribute '{node.attr}' on line {line}")
+
+    if not any(isinstance(node, ast.FunctionDef) and node.name == "transform" for node in tree.body):
+        raise CodeExecutionError("Generated code does not define a `transform(df)` function")
+    return tree
+
+
+def _run_in_sandbox(code, df, connection, memory_limit_bytes):
+    try:
+        if memory_limit_bytes:
+            try:
+                import resource
+                resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+            except (ImportError, ValueError, OSError):
+                pass
+        # No new processes, network connections or file writes from here on
+        enter_sandbox()
+        namespace = {"__builtins__": SAFE_BUILTINS, **SANDBOX_MODULES}
+        exec(compile(code, "<generated transformation>", "exec"), namespace)
+        result = namespace["transform"](df)
+        if isinstance(result, pd.Series):
+            result = result.to_frame()
+        if not isinstance(result, pd.DataFrame):
+            raise TypeError(f"transform(df) returned {type(result).__name__}, expected a DataFrame")
+        connection.send(("ok", result))
+    except BaseException:
+        connection.send(("error", traceback.format_exc(limit=3)))
+    finally:
+        connection.close()
+
+
+# Function to run validated code against the full DataFrame in a separate process with a timeout
+def execute_transformation(code, df, timeout=DEFAULT_TIMEOUT_SECONDS, memory_limit_bytes=None, cancel_event=None):
+    validate_code(code)
+
+    # fork shares the DataFrame with the child without copying it; spawn pickles it
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    parent_connection, child_connection = context.Pipe(duplex=False)
+    process = context.Process(target=_run_in_sandbox, args=(code, df, child_connection, memory_limit_bytes), daemon=True)
+    process.start()
+    child_connection.close()
+
+    try:
+        deadline = time.monotonic() + timeout
+        while not parent_connection.poll(min(0.2, max(deadline - time.monotonic(), 0))):
+            if cancel_event is not None and cancel_event.is_set():
+                raise CodeExecutionError("Generated code was cancelled")
+            if time.monotonic() >= deadline:
+                raise CodeExecutionError(f"Generated code did not finish within {timeout} seconds")
+        status, payload = parent_connection.recv()
+    except EOFError:
+        raise CodeExecutionError("Generated code terminated unexpectedly (it may have exceeded the memory limit)")
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        parent_connection.close()
+
+    if status != "ok":
+        raise CodeExecutionError(f"Generated code failed:\n{payload}")
+    return payload
+
+
+# Function to ask the model for a pandas transformation of the dataset
+def generate_transformation_code(df, metadata, prompt, api_key=None, model=DEFAULT_MODEL, sample_rows=DEFAULT_SAMPLE_ROWS, base_url=None):
+    client = openai.OpenAI(api_key=api_key, base_url=base_url)
+    response = client.chat.completions.create(
+        model=model,
+        messages=build_code_messages(df, metadata, prompt, sample_rows)
+    )
+    return strip_code_fences(response.choices[0].message.content)
+
+
+def transform_with_generated_code(df, metadata, prompt, api_key=None, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT_SECONDS,
+                                  sample_rows=DEFAULT_SAMPLE_ROWS, base_url=None, memory_limit_bytes=None, cancel_event=None):
+    with stage("llm_call", rows=sample_rows, model=model, mode="code"):
+        code = generate_transformation_code(df, metadata, prompt, api_key=api_key, model=model, sample_rows=sample_rows, base_url=base_url)
+    if cancel_event is not None and cancel_event.is_set():
+        raise CodeExecutionError("Generated code was cancelled")
+    # CPU time of this thread excludes the sandbox process; wall time is what matters here
+    with stage("code_execution", rows=len(df), measure_cpu=False) as record:
+        processed_df = execute_transformation(code, df, timeout=timeout, memory_limit_bytes=memory_limit_bytes, cancel_event=cancel_event)
+        record["output_rows"] = len(processed_df)
+    return processed_df, code
@@ -0,0 +1,183 @@
+import pandas as pd
+import numpy as np
+import re
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_UNIQUE = 10_000
+# Number of values checked before attempting to parse a text column as dates
+DATE_SAMPLE_SIZE = 1_000
+# How datetime columns are written to CSV (and so sent to the model); only text
+# still in this form is parsed back into the original datetime dtype
+ISO_DATETIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:\d{2})?$")
+DATE_PATTERN = re.compile(r"^\s*(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4})([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?\s*$")
+
+# Compact text dtype: Arrow-backed strings when pyarrow is available
+STRING_DTYPE = pd.StringDtype("pyarrow") if pyarrow is not None else pd.StringDtype()
+# Nullable counterparts of the numpy integer dtypes
+NULLABLE_INTEGER_DTYPES = {
+    np.dtype("int8"): "Int8", np.dtype("int16"): "Int16", np.dtype("int32"): "Int32", np.dtype("int64"): "Int64",
+    np.dtype("uint8"): "UInt8", np.dtype("uint16"): "UInt16", np.dtype("uint32"): "UInt32", np.dtype("uint64"): "UInt64",
+}
+
+
+# Function to find the smallest (precision, scale) that holds every Decimal value
+def decimal_precision_scale(values, max_precision=38):
+    integer_digits, scale = 1, 0
+    for value in values:
+        sign, digits, exponent = value.as_tuple()
+        if not isinstance(exponent, int):
+            continue  # NaN / Infinity
+        scale = max(scale, -exponent)
+        integer_digits = max(integer_digits, len(digits) + exponent)
+    precision = min(max_precision, integer_digits + scale)
+    return precision, min(scale, precision)
+
+
+def _smallest_integer_dtype(minimum, maximum):
+    candidates = ["uint8", "uint16", "uint32", "uint64"] if minimum >= 0 else ["int8", "int16", "int32", "int64"]
+    for name in candidates:
+        info = np.iinfo(name)
+        if info.min <= minimum and maximum <= info.max:
+            return np.dtype(name)
+    return np.dtype("int64")
+
+
+def _fits(dtype, minimum, maximum):
+    info = np.iinfo(dtype)
+    return info.min <= minimum and maximum <= info.max
+
+
+def _optimize_numeric(series):
+    values = series.dropna()
+    if pd.api.types.is_integer_dtype(series.dtype):
+        if values.empty:
+            return series
+        dtype = _smallest_integer_dtype(values.min(), values.max())
+        if isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            return series.astype(NULLABLE_INTEGER_DTYPES[dtype])
+        return series.astype(dtype)
+    if values.empty:
+        return series
+    # Floats stay floats, even when every value is whole. Only downcast to float32 when no value changes
+    as_float32 = series.astype("float32")
+    if (as_float32.astype("float64") == series)[series.notna()].all():
+        return as_float32
+    return series
+
+
+def _parse_dates(series):
+    values = series.dropna()
+    sample = values.iloc[:DATE_SAMPLE_SIZE].astype(str)
+    if sample.empty or not sample.str.match(DATE_PATTERN).all():
+        return None
+    try:
+        parsed = pd.to_datetime(series, errors="coerce")
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # Reject the conversion if any value failed to parse
+    return parsed if parsed.notna().sum() == len(values) else None
+
+
+def _optimize_text(series, category_max_ratio):
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred == "boolean":
+        return series.astype("boolean")
+    if inferred != "string":
+        return series  # Mixed Python objects stay as they are
+    parsed = _parse_dates(series)
+    if parsed is not None:
+        return parsed
+    unique_count = series.nunique()
+    if unique_count <= CATEGORY_MAX_UNIQUE and unique_count <= category_max_ratio * series.count():
+        return series.astype("category")
+    return series.astype(STRING_DTYPE)
+
+
+# Function to convert a freshly loaded DataFrame to memory-efficient dtypes:
+# integers are downcast (keeping nullable dtypes nullable), floats go to
+# float32 when lossless, text becomes dates, categoricals or Arrow-backed
+# strings, and true/false columns become nullable booleans.
+def optimize_dtypes(df, category_max_ratio=CATEGORY_MAX_RATIO):
+    optimized = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype):
+            optimized[col] = series
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            optimized[col] = _optimize_numeric(series)
+        elif series.dtype == "object" or pd.api.types.is_string_dtype(series.dtype):
+            optimized[col] = _optimize_text(series, category_max_ratio)
+        else:
+            optimized[col] = series
+    return pd.DataFrame(optimized, index=df.index)
+
+
+# Function to record the dtypes of a frame so they can be restored after a
+# text round trip. Categoricals are recorded without their categories, since
+# a transformation may legitimately introduce new values.
+def dtype_schema(df):
+    return {col: "category" if isinstance(dtype, pd.CategoricalDtype) else dtype for col, dtype in df.dtypes.items()}
+
+
+def _cast(series, dtype):
+    dtype = pd.api.types.pandas_dtype(dtype)
+    if series.dtype == dtype:
+        return series
+    if isinstance(dtype, pd.CategoricalDtype):
+        return series.astype(dtype)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        # Any other representation was asked for by the prompt (or would be
+        # parsed ambiguously, e.g. day and month), so the text is kept as returned
+        if not pd.api.types.is_datetime64_any_dtype(series.dtype):
+            if not series.dropna().astype(str).str.match(ISO_DATETIME_PATTERN.pattern).all():
+                raise ValueError("not in the original date format")
+            try:
+                series = pd.to_datetime(series, format="ISO8601")
+            except ValueError:
+                series = pd.to_datetime(series)  # pandas < 2.0 has no "ISO8601" format
+        converted = series
+        if getattr(dtype, "tz", None) is not None:
+            converted = converted.dt.tz_localize(dtype.tz) if converted.dt.tz is None else converted.dt.tz_convert(dtype.tz)
+    elif pd.api.types.is_bool_dtype(dtype):
+        if pd.api.types.infer_dtype(series, skipna=True) != "boolean":
+            raise ValueError("not boolean")
+        converted = series.astype("boolean" if series.isna().any() else dtype)
+    elif pd.api.types.is_integer_dtype(dtype):
+        converted = pd.to_numeric(series, errors="coerce")
+        values = converted.dropna()
+        if len(values) and not np.all(np.mod(values.to_numpy(dtype="float64"), 1) == 0):
+            raise ValueError("not integral")
+        target = np.dtype(dtype.numpy_dtype if hasattr(dtype, "numpy_dtype") else dtype)
+        if len(values) and not _fits(target, values.min(), values.max()):
+            target = _smallest_integer_dtype(values.min(), values.max())
+        converted = converted.astype(NULLABLE_INTEGER_DTYPES[target] if converted.isna().any() else target)
+    elif pd.api.types.is_float_dtype(dtype):
+        converted = pd.to_numeric(series, errors="coerce").astype(dtype)
+    else:
+        converted = series.astype(dtype)
+    if converted.notna().sum() != series.notna().sum():
+        raise ValueError("values would be lost")
+    return converted
+
+
+# Function to reapply a schema from `dtype_schema` to a frame that went
+# through text (e.g. CSV returned by the model). Columns whose values no
+# longer fit their original type (e.g. because the prompt changed them)
+# keep the type inferred from the text.
+def apply_schema(df, schema):
+    restored = {}
+    for col in df.columns:
+        series = df[col]
+        if col in schema:
+            try:
+                series = _cast(series, schema[col])
+            except (TypeError, ValueError, OverflowError):
+                pass
+        restored[col] = series
+    return pd.DataFrame(restored, index=df.index)
@@ -1,5 +1,9 @@
-from tableauhyperapi import HyperProcess, Connection, TableDefinition, SqlType, Telemetry, Inserter, CreateMode, TableName
+from utils.hyper_export import write_hyper_tables
+from utils.sql_bulk import bulk_load_dataframe
+from utils.sql_fetch import DEFAULT_FETCH_CHUNK_ROWS, fetch_query_in_chunks
 import pandas as pd
+from utils.streaming_metadata import DEFAULT_CHUNK_SIZE, profile_sql_in_chunks
+from utils.instrumentation import stage
 import hashlib
 import pyodbc
 import base64
@@ -52,8 +56,9 @@ def get_base64_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode()
 
-def fetch_data_from_sql(query, server, database, user_id, password):
-    conn_str = (
+# Function to build the ODBC connection string for SQL Server
+def get_sql_connection_string(server, database, user_id, password):
+    return (
         f"DRIVER={{ODBC Driver 17 for SQL Server}};"
         f"SERVER={server};"
         f"DATABASE={database};"
@@ -61,89 +66,64 @@ def fetch_data_from_sql(query, server, database, user_id, password):
         f"UID={user_id};"
         f"PWD={password};"
     )
-    
+
+def fetch_data_from_sql(query, server, database, user_id, password):
+    conn_str = get_sql_connection_string(server, database, user_id, password)
+
     with pyodbc.connect(conn_str) as conn:
         df = pd.read_sql(query, conn)
     
     return df
 
-def push_data_to_sql(df, full_table_name, server, database, user_id, password):
-    conn_str = (
-        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-        f"SERVER={server};"
-        f"DATABASE={database};"
-        "Authentication=ActiveDirectoryPassword;"
-        f"UID={user_id};"
-        f"PWD={password};"
-    )
-    
-    # Split full_table_name into schema_name and table_name
-    schema_name, table_name = full_table_name.split('.')
-    
-    with pyodbc.connect(conn_str) as conn:
-        cursor = conn.cursor()
-
-        # Check if the table exists
-        cursor.execute(f"""
-            IF OBJECT_ID('{schema_name}.{table_name}', 'U') IS NULL
-            BEGIN
-                CREATE TABLE [{schema_name}].[{table_name}] (
-                    {', '.join([f'[{col}] NVARCHAR(MAX)' for col in df.columns])}
-                )
-            END
-        """)
-        
-        # Create an insert statement with proper quoting
-        columns = ', '.join([f"[{col}]" for col in df.columns])
-        placeholders = ', '.join(['?'] * len(df.columns))
-        sql = f"INSERT INTO [{schema_name}].[{table_name}] ({columns}) VALUES ({placeholders})"
-        
-        # Print the SQL statement for debugging purposes
-        print(sql)  # You can comment this out or remove it after debugging
-
-        # Convert DataFrame rows to tuples
-        data = [tuple(row) for row in df.to_numpy()]
-        
-        # Execute the insert statement for each row
-        cursor.executemany(sql, data)
-        conn.commit()
+# Function to fetch a query result in chunks with an optional row cap and cancellation
+def fetch_data_from_sql_in_chunks(query, server, database, user_id, password, chunk_rows=DEFAULT_FETCH_CHUNK_ROWS,
+                                  max_rows=None, cancel_event=None, on_chunk=None):
+    conn_str = get_sql_connection_string(server, database, user_id, password)
 
-    return True
+    with stage("sql_fetch") as record, pyodbc.connect(conn_str) as conn:
+        result = fetch_query_in_chunks(conn, query, chunk_rows=chunk_rows, max_rows=max_rows,
+                                       cancel_event=cancel_event, on_chunk=on_chunk)
+        record["rows"] = result.rows
 
+    return result
 
-def write_hyper_file(df, hyper_file_path, table_name):
-    # Mapping pandas datatypes to Hyper SQL datatypes
-    type_mapping = {
-        "float64": SqlType.double(),
-        "int64": SqlType.int(),
-        "object": SqlType.varchar(255),
-        "datetime64[ns]": SqlType.timestamp(),
-        "bool": SqlType.bool()
-    }
+def push_data_to_sql(df, full_table_name, server, database, user_id, password, batch_size=None,
+                     parallel_connections=1, checkpoint_path=None, on_progress=None, cancel_event=None):
+    conn_str = get_sql_connection_string(server, database, user_id, password)
 
-    # Replace NaN values with an empty string
-    df = df.fillna('')
+    # Split full_table_name into schema_name and table_name
+    schema_name, table_name = full_table_name.split('.')
 
-    # Get the column names and types
-    column_types = {col: type_mapping.get(str(dtype), SqlType.text()) for col, dtype in df.dtypes.items()}
+    # Create the table with typed columns if needed, then stream the rows in
+    # committed batches using pyodbc's fast parameter arrays
+    with stage("push_data_to_sql", rows=len(df), bytes=int(df.memory_usage(index=False).sum()),
+               connections=parallel_connections):
+        bulk_load_dataframe(
+            df, schema_name, table_name,
+            connection_factory=lambda: pyodbc.connect(conn_str),
+            batch_size=batch_size,
+            parallel_connections=parallel_connections,
+            checkpoint_path=checkpoint_path,
+            on_progress=on_progress,
+            cancel_event=cancel_event
+        )
 
-    # Create a HyperProcess instance
-    with HyperProcess(telemetry=Telemetry.SEND_USAGE_DATA_TO_TABLEAU) as hyper:
+    return True
 
-        # Create or overwrite the Hyper file
-        with Connection(endpoint=hyper.endpoint, database=hyper_file_path, create_mode=CreateMode.CREATE_AND_REPLACE) as connection:
+# Function to profile a SQL query result in row blocks without loading it all into memory
+def profile_data_from_sql(query, server, database, user_id, password, chunksize=DEFAULT_CHUNK_SIZE):
+    conn_str = get_sql_connection_string(server, database, user_id, password)
 
-            # Define the table
-            table_definition = TableDefinition(table_name=TableName(table_name))
+    with pyodbc.connect(conn_str) as conn:
+        profiler = profile_sql_in_chunks(query, conn, chunksize=chunksize)
 
-            # Add columns to the table definition
-            for column_name, column_type in column_types.items():
-                table_definition.add_column(column_name, column_type)
+    return profiler.to_metadata("<Sourced from SQL Server>")
 
-            # Create the table in the Hyper file
-            connection.catalog.create_table(table_definition)
 
-            # Insert data into the table
-            with Inserter(connection, table_definition) as inserter:
-                inserter.add_rows(df.itertuples(index=False, name=None))
-                inserter.execute()
\ No newline at end of file
+def write_hyper_file(df, hyper_file_path, table_name, mode="replace"):
+    # Bulk-load the frame through a columnar staging file and Hyper's COPY, with
+    # column types and nullability inferred from the data (see utils/hyper_export.py)
+    with stage("write_hyper_file", rows=len(df), mode=mode) as record:
+        result = write_hyper_tables({table_name: df}, hyper_file_path, mode=mode)[table_name]
+        record["bytes"] = os.path.getsize(hyper_file_path)
+    return result
@@ -0,0 +1,162 @@
+from tableauhyperapi import HyperProcess, Connection, Telemetry, HyperException
+from contextlib import contextmanager
+import threading
+import atexit
+import queue
+import os
+
+# Maximum number of simultaneous connections handed out by the shared engine
+HYPER_POOL_SIZE = int(os.environ.get("STREAMLINER_HYPER_POOL_SIZE", "4"))
+
+
+class HyperEngine:
+    # Process-wide manager for a single long-lived hyperd instance. The server
+    # is started lazily on first use, shared by every export and user session,
+    # health-checked before connections are handed out, restarted when it no
+    # longer answers, and shut down when the Python process exits. Telemetry
+    # is off so the engine also works on hosts without internet access.
+
+    def __init__(self, pool_size=HYPER_POOL_SIZE, telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters=None):
+        self.pool_size = pool_size
+        self.telemetry = telemetry
+        self.parameters = parameters
+        self.restarts = 0
+        self._process = None
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.RLock()
+
+    @property
+    def is_running(self):
+        # Only says whether the handle is open, not whether hyperd is still
+        # alive; a dead server shows up as failed connections (see _acquire)
+        return self._process is not None and self._process.is_open
+
+    def _start(self):
+        self._process = HyperProcess(telemetry=self.telemetry, parameters=self.parameters)
+
+    def _close_idle_connections(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(connection)
+
+    def _ensure_running(self):
+        with self._lock:
+            if self.is_running:
+                return self._process
+            if self._process is not None:
+                # The server has died; drop connections bound to it and start a new one
+                self._close_idle_connections()
+                try:
+                    self._process.close()
+                except HyperException:
+                    pass
+                self.restarts += 1
+            self._start()
+            return self._process
+
+    def restart(self):
+        with self._lock:
+            self._close_idle_connections()
+            if self._process is not None:
+                try:
+                    self._process.shutdown()
+                except HyperException:
+                    pass
+                self._process = None
+                self.restarts += 1
+            self._start()
+
+    @staticmethod
+    def _is_healthy(connection):
+        try:
+            return connection.is_open and connection.execute_scalar_query("SELECT 1") == 1
+        except HyperException:
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except HyperException:
+            pass
+
+    def _connect(self, process):
+        # Open a connection and check that the server answers on it
+        try:
+            connection = Connection(endpoint=process.endpoint)
+        except HyperException:
+            return None
+        if self._is_healthy(connection):
+            return connection
+        self._close(connection)
+        return None
+
+    def _acquire(self):
+        process = self._ensure_running()
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(connection):
+                return connection
+            self._close(connection)
+        connection = self._connect(process)
+        if connection is not None:
+            return connection
+        # The server does not answer (e.g. hyperd was killed): restart it, unless
+        # another thread already did, and retry once
+        with self._lock:
+            if self._process is process:
+                self.restart()
+            process = self._process
+        return Connection(endpoint=process.endpoint)
+
+    @contextmanager
+    def connection(self):
+        # Borrow a connection that is not bound to any database; attach the
+        # .hyper files you need and detach them before returning it
+        self._slots.acquire()
+        connection = None
+        try:
+            connection = self._acquire()
+            yield connection
+        except HyperException:
+            # The connection may be broken; the next borrower opens a fresh one
+            if connection is not None:
+                self._close(connection)
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                if connection.is_open and self.is_running:
+                    self._idle.put(connection)
+                else:
+                    self._close(connection)
+            self._slots.release()
+
+    def health_check(self):
+        try:
+            with self.connection() as connection:
+                return self._is_healthy(connection)
+        except HyperException:
+            return False
+
+    def shutdown(self):
+        with self._lock:
+            self._close_idle_connections()
+            if self._process is not None:
+                try:
+                    self._process.shutdown()
+                except HyperException:
+                    pass
+                self._process = None
+
+
+# Shared engine for the whole Python process
+hyper_engine = HyperEngine()
+atexit.register(hyper_engine.shutdown)
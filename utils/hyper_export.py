@@ -0,0 +1,189 @@
+from tableauhyperapi import TableDefinition, SqlType, TableName, Nullability, TypeTag, escape_string_literal
+from utils.hyper_engine import hyper_engine
+from utils.dtypes import decimal_precision_scale
+from decimal import Decimal
+import pandas as pd
+import tempfile
+import shutil
+import uuid
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Marker written for missing values when staging through CSV
+CSV_NULL_MARKER = "\\N"
+
+
+def _decimal_type(values):
+    precision, scale = decimal_precision_scale(values)
+    return SqlType.numeric(precision, scale)
+
+
+# Function to map a pandas column to a Hyper SQL type. Integer columns are
+# always BIGINT whatever their (optimized) width, so later appends of larger
+# values still fit the table.
+def hyper_column_type(series):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return hyper_column_type(series.astype(dtype.categories.dtype))
+    if pd.api.types.is_bool_dtype(dtype):
+        return SqlType.bool()
+    if pd.api.types.is_integer_dtype(dtype):
+        if dtype.itemsize == 8 and pd.api.types.is_unsigned_integer_dtype(dtype):
+            return SqlType.numeric(20, 0)
+        return SqlType.big_int()
+    if pd.api.types.is_float_dtype(dtype):
+        return SqlType.double()
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return SqlType.timestamp_tz() if getattr(dtype, "tz", None) is not None else SqlType.timestamp()
+    if pd.api.types.is_timedelta64_dtype(dtype):
+        return SqlType.interval()
+
+    # Object columns: look at the Python values they actually hold
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred == "boolean":
+        return SqlType.bool()
+    if inferred == "integer":
+        return SqlType.big_int()
+    if inferred in ("floating", "mixed-integer-float"):
+        return SqlType.double()
+    if inferred == "date":
+        return SqlType.date()
+    if inferred == "datetime":
+        return SqlType.timestamp()
+    if inferred == "decimal":
+        return _decimal_type(value for value in series.dropna() if isinstance(value, Decimal))
+    return SqlType.text()
+
+
+# Function to build a Hyper table definition with accurate types. Columns are
+# always nullable so later appends may contain missing values.
+def hyper_table_definition(df, table_name):
+    table_definition = TableDefinition(table_name=table_name)
+    for column_name in df.columns:
+        table_definition.add_column(str(column_name), hyper_column_type(df[column_name]), Nullability.NULLABLE)
+    return table_definition
+
+
+def _cast_to_column(values, sql_type):
+    tag = sql_type.tag
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(values.dtype.categories.dtype)
+    if tag in (TypeTag.SMALL_INT, TypeTag.INT, TypeTag.BIG_INT):
+        return values.astype({TypeTag.SMALL_INT: "Int16", TypeTag.INT: "Int32", TypeTag.BIG_INT: "Int64"}[tag])
+    if tag in (TypeTag.DOUBLE, TypeTag.FLOAT):
+        return values.astype("float64")
+    if tag == TypeTag.BOOL:
+        return values.astype("boolean")
+    if tag == TypeTag.TIMESTAMP:
+        return pd.to_datetime(values)
+    if tag == TypeTag.TIMESTAMP_TZ:
+        return pd.to_datetime(values, utc=True)
+    if tag == TypeTag.DATE:
+        return pd.to_datetime(values).dt.date
+    if tag == TypeTag.TEXT and not isinstance(values.dtype, pd.StringDtype):
+        return values.where(values.isna(), values.astype(str))  # Numbers or mixed Python objects as text
+    return values
+
+
+def _staging_frame(df, table_definition):
+    # Order columns like the target table and cast them to its column types, so
+    # frames appended to an existing table are staged with the types it declares
+    columns = [column.name.unescaped for column in table_definition.columns]
+    table_name = table_definition.table_name.name.unescaped
+    staged = df.rename(columns=str)
+    missing = [name for name in columns if name not in staged.columns]
+    extra = [name for name in staged.columns if name not in columns]
+    if missing or extra:
+        raise ValueError(f"The data does not match the columns of table '{table_name}': "
+                         f"missing {missing or 'none'}, unexpected {extra or 'none'}")
+    staged = staged[columns].copy()
+    for column in table_definition.columns:
+        name = column.name.unescaped
+        try:
+            staged[name] = _cast_to_column(staged[name], column.type)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Column '{name}' cannot be stored as {column.type} in table '{table_name}': {e}")
+    return staged
+
+
+def _stage_parquet(df, directory, table_definition):
+    # Hyper requires NOT NULL table columns to be declared required in the Parquet schema
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.parquet")
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    required = {column.name.unescaped for column in table_definition.columns if column.nullability == Nullability.NOT_NULLABLE}
+    schema = pyarrow.schema([field.with_nullable(field.name not in required) for field in table.schema])
+    pyarrow.parquet.write_table(table.cast(schema), path)
+    return path, "WITH (FORMAT PARQUET)"
+
+
+def _stage_csv(df, directory):
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.csv")
+    df.to_csv(path, index=False, na_rep=CSV_NULL_MARKER, date_format="%Y-%m-%d %H:%M:%S.%f")
+    return path, f"WITH (FORMAT CSV, HEADER, DELIMITER ',', NULL {escape_string_literal(CSV_NULL_MARKER)})"
+
+
+# Function to load one DataFrame into an existing Hyper table through a staging file and COPY
+def bulk_load_frame(connection, table_definition, df, staging_directory, staging="auto"):
+    staged = _staging_frame(df, table_definition)
+    path = None
+    if staging in ("auto", "parquet") and pyarrow is not None:
+        try:
+            path, options = _stage_parquet(staged, staging_directory, table_definition)
+        except (pyarrow.ArrowException, TypeError, ValueError):
+            if staging == "parquet":
+                raise
+            path = None
+    if path is None:
+        path, options = _stage_csv(staged, staging_directory)
+    try:
+        return connection.execute_command(f"COPY {table_definition.table_name} FROM {escape_string_literal(path)} {options}")
+    finally:
+        os.remove(path)
+
+
+# Function to write one or more tables into a .hyper file with bulk COPY ingestion.
+# `tables` maps table names to a DataFrame or to an iterable of DataFrame chunks.
+# mode="replace" recreates the file; mode="append" creates missing tables and
+# appends rows to existing ones.
+def write_hyper_tables(tables, hyper_file_path, mode="replace", staging="auto"):
+    if mode not in ("replace", "append"):
+        raise ValueError(f"Unsupported mode '{mode}', expected 'replace' or 'append'")
+
+    database_path = os.path.abspath(hyper_file_path)
+    database_alias = f"export_{uuid.uuid4().hex}"
+    staging_directory = tempfile.mkdtemp(prefix="hyper_staging_")
+    rows_loaded = {}
+
+    try:
+        with hyper_engine.connection() as connection:
+            if mode == "replace":
+                connection.catalog.drop_database_if_exists(database_path)
+            if mode == "replace" or not os.path.exists(database_path):
+                connection.catalog.create_database(database_path)
+            connection.catalog.attach_database(database_path, alias=database_alias)
+
+            try:
+                for table_name, data in tables.items():
+                    chunks = [data] if isinstance(data, pd.DataFrame) else data
+                    table_definition = None
+                    rows_loaded[table_name] = 0
+                    for chunk in chunks:
+                        if table_definition is None:
+                            hyper_table_name = TableName(database_alias, "public", table_name)
+                            if connection.catalog.has_table(hyper_table_name):
+                                table_definition = connection.catalog.get_table_definition(hyper_table_name)
+                            else:
+                                table_definition = hyper_table_definition(chunk, hyper_table_name)
+                                connection.catalog.create_table(table_definition)
+                        rows_loaded[table_name] += bulk_load_frame(connection, table_definition, chunk, staging_directory, staging)
+            finally:
+                connection.catalog.detach_database(database_alias)
+    finally:
+        shutil.rmtree(staging_directory, ignore_errors=True)
+
+    return rows_loaded
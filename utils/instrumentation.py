@@ -0,0 +1,186 @@
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+import contextvars
+import threading
+import tracemalloc
+import json
+import time
+import sys
+import os
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows
+
+# Stage records are appended to this JSON-lines file; set it to an empty string to disable them
+METRICS_LOG_PATH = os.environ.get("STREAMLINER_METRICS_LOG", os.path.join(".cache", "streamliner_metrics.log"))
+# The log is rotated to "<path>.1" once it grows past this size
+METRICS_LOG_MAX_MB = int(os.environ.get("STREAMLINER_METRICS_LOG_MAX_MB", "50"))
+# Per-stage peak memory needs tracemalloc, which slows allocations down; off by default.
+# tracemalloc counts the whole process, so a stage's peak includes whatever other
+# jobs allocate at the same time: use it to profile one job at a time.
+METRICS_TRACE_MEMORY = os.environ.get("STREAMLINER_METRICS_TRACE_MEMORY", "0") == "1"
+
+# Session and request (job) the current stage belongs to; copied into asyncio tasks automatically
+_session = contextvars.ContextVar("metrics_session", default="-")
+_request = contextvars.ContextVar("metrics_request", default="-")
+_write_lock = threading.Lock()
+# Open traced stages with the highest traced memory seen while they ran. The
+# tracemalloc peak is process-global, so every reset first hands the peak so
+# far to every open stage, and nested or concurrent stages never lose it.
+_traced_stages = []
+_trace_lock = threading.Lock()
+
+if METRICS_TRACE_MEMORY:
+    tracemalloc.start()
+
+
+def set_context(session=None, request=None):
+    if session is not None:
+        _session.set(session)
+    if request is not None:
+        _request.set(request)
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _collect_peak():
+    # Called with _trace_lock held
+    peak = tracemalloc.get_traced_memory()[1]
+    for traced in _traced_stages:
+        traced["peak"] = max(traced["peak"], peak)
+
+
+def _write(line):
+    if not METRICS_LOG_PATH:
+        return
+    with _write_lock:
+        directory = os.path.dirname(METRICS_LOG_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            if os.path.getsize(METRICS_LOG_PATH) > METRICS_LOG_MAX_MB * 1024 * 1024:
+                os.replace(METRICS_LOG_PATH, f"{METRICS_LOG_PATH}.1")
+        except OSError:
+            pass
+        with open(METRICS_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# Function to write one stage record (rows, bytes, token counts, ... go in
+# `fields`). The layout follows hyperd.log: one JSON object per line with the
+# event key in "k" and its values in "v".
+def record_stage(stage, elapsed, cpu=None, severity="info", **fields):
+    values = {"stage": stage, "elapsed": round(elapsed, 6)}
+    if cpu is not None:
+        values["cpu"] = round(cpu, 6)
+    values.update({key.replace("_", "-"): value for key, value in fields.items() if value is not None})
+    entry = {
+        "ts": datetime.now().isoformat(),
+        "pid": os.getpid(),
+        "tid": format(threading.get_ident() & 0xFFFF, "x"),
+        "sev": severity,
+        "req": _request.get(),
+        "sess": _session.get(),
+        "k": "stage-end",
+        "v": values,
+    }
+    try:
+        _write(json.dumps(entry, default=str))
+    except OSError:
+        pass  # Instrumentation must never break the pipeline
+
+
+# Context manager timing one pipeline stage. Fill in rows, bytes or any other
+# field on the yielded dict; wall time, CPU time of the calling thread and
+# memory are added automatically. With tracing on, memory is the traced peak
+# during the stage above its starting point. Otherwise it is how far the stage
+# raised the process's peak RSS (zero when it stayed below an earlier peak),
+# plus that process peak itself. Pass measure_cpu=False for stages that await other coroutines, whose CPU
+# time would be counted against them.
+@contextmanager
+def stage(name, measure_cpu=True, **fields):
+    record = dict(fields)
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    if METRICS_TRACE_MEMORY:
+        traced = {"peak": 0}
+        with _trace_lock:
+            _collect_peak()
+            tracemalloc.reset_peak()
+            traced["start"] = traced["peak"] = tracemalloc.get_traced_memory()[0]
+            _traced_stages.append(traced)
+    else:
+        rss_started = _max_rss_bytes()
+    severity = "info"
+    try:
+        yield record
+    except BaseException as e:
+        severity = "error"
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        if METRICS_TRACE_MEMORY:
+            with _trace_lock:
+                _collect_peak()
+                _traced_stages[:] = [other for other in _traced_stages if other is not traced]
+            record["peak_memory"] = traced["peak"] - traced["start"]
+        else:
+            record["process_max_rss"] = _max_rss_bytes()
+            if rss_started is not None:
+                record["rss_growth"] = record["process_max_rss"] - rss_started
+        cpu = time.thread_time() - cpu_started if measure_cpu else None
+        record_stage(name, time.perf_counter() - started, cpu, severity=severity, **record)
+
+
+# Function to read the most recent stage records into a DataFrame
+def load_stage_records(path=METRICS_LOG_PATH, max_records=100_000):
+    records = []
+    for file_path in [f"{path}.1", path]:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("k") == "stage-end":
+                        records.append({"ts": entry["ts"], "sess": entry.get("sess"), "sev": entry.get("sev"), **entry["v"]})
+        except OSError:
+            continue
+    return pd.DataFrame(records[-max_records:])
+
+
+# Function to summarize stage records: count and p50/p95 of the timings per stage
+def summarize_stages(records):
+    if records.empty:
+        return pd.DataFrame()
+    grouped = records.groupby("stage")
+    summary = pd.DataFrame({"Runs": grouped.size()})
+    for column, label in [("elapsed", "Wall (s)"), ("cpu", "CPU (s)")]:
+        if column in records:
+            summary[f"{label} p50"] = grouped[column].quantile(0.5)
+            summary[f"{label} p95"] = grouped[column].quantile(0.95)
+    for column, label in [("peak-memory", "Peak memory p95 (MB)"), ("rss-growth", "RSS growth p95 (MB)")]:
+        if column in records:
+            summary[label] = grouped[column].quantile(0.95) / 1024 ** 2
+    if "process-max-rss" in records:
+        summary["Process peak RSS (MB)"] = grouped["process-max-rss"].max() / 1024 ** 2
+    if "rows" in records:
+        summary["Rows p50"] = grouped["rows"].median()
+        throughput = records["rows"] / records["elapsed"].where(records["elapsed"] > 0)
+        summary["Rows/s p50"] = throughput.groupby(records["stage"]).median()
+    for column in ["prompt-tokens", "completion-tokens"]:
+        if column in records:
+            summary[f"{column.replace('-', ' ').capitalize()} total"] = grouped[column].sum()
+    if "sev" in records:
+        summary["Errors"] = (records["sev"] == "error").groupby(records["stage"]).sum()
+    return summary.round(3)
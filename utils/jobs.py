@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+from utils.instrumentation import set_context
+import contextvars
+import threading
+import time
+import uuid
+import os
+
+# Size of the shared worker pool and the number of unfinished jobs allowed per user
+JOB_WORKERS = int(os.environ.get("STREAMLINER_JOB_WORKERS", "8"))
+JOB_USER_LIMIT = int(os.environ.get("STREAMLINER_JOB_USER_LIMIT", "2"))
+# Finished jobs (and the results they hold) are forgotten after this long
+JOB_RETENTION_MINUTES = int(os.environ.get("STREAMLINER_JOB_RETENTION_MINUTES", "120"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobLimitExceeded(Exception):
+    pass
+
+
+class Job:
+    # One background operation. The function it runs receives the job as its
+    # first argument, reports through `set_progress`, publishes intermediate
+    # output in `preview`, and stops early once `cancel_event` is set.
+
+    def __init__(self, user, kind, description=""):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.kind = kind
+        self.description = description
+        self.status = QUEUED
+        self.progress = None
+        self.message = ""
+        self.preview = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED_STATES
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def set_progress(self, progress=None, message=None):
+        # `progress` is a fraction between 0 and 1, or None when unknown
+        if progress is not None:
+            self.progress = min(max(progress, 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+
+class JobManager:
+    # Runs long operations (LLM transformations, exports, SQL pushes) on a
+    # bounded worker pool shared by every session, so they neither block the
+    # Streamlit script thread nor get lost when the script reruns. Jobs are
+    # kept in a registry by ID until `retention_seconds` after they finish.
+
+    def __init__(self, max_workers=JOB_WORKERS, per_user_limit=JOB_USER_LIMIT, retention_seconds=JOB_RETENTION_MINUTES * 60):
+        self.per_user_limit = per_user_limit
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="streamliner-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_event.is_set():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        set_context(request=job.id)  # Stage records of this job carry its ID
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = CANCELLED if job.cancel_event.is_set() else SUCCEEDED
+        except Exception as e:
+            job.error = e
+            job.status = CANCELLED if job.cancel_event.is_set() else FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def submit(self, user, kind, fn, *args, description="", **kwargs):
+        self.prune()
+        with self._lock:
+            active = [job for job in self._jobs.values() if job.user == user and not job.done]
+            if len(active) >= self.per_user_limit:
+                raise JobLimitExceeded(f"You already have {len(active)} job(s) running; wait for one to finish or cancel it")
+            job = Job(user, kind, description)
+            self._jobs[job.id] = job
+        # Run in a copy of the caller's context so the job keeps its session for instrumentation
+        context = contextvars.copy_context()
+        job.future = self._executor.submit(context.run, self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, user):
+        with self._lock:
+            return sorted((job for job in self._jobs.values() if job.user == user), key=lambda job: job.created_at)
+
+    def cancel(self, job_id):
+        # Queued jobs never start; running jobs stop at their next cancellation check
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        return True
+
+    def prune(self):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.done and now - job.finished_at > self.retention_seconds]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {status: sum(job.status == status for job in jobs) for status in (QUEUED, RUNNING) + FINISHED_STATES}
+
+
+# Process-wide job manager shared by every Streamlit session on this server
+job_manager = JobManager()
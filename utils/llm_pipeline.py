@@ -0,0 +1,258 @@
+import pandas as pd
+import asyncio
+import random
+import openai
+import io
+from utils.stream_parser import IncrementalCSVParser
+from utils.dtypes import apply_schema, dtype_schema
+from utils.instrumentation import record_stage, stage
+
+# System message used for every data cleaning request
+DATA_CLEANING_SYSTEM_MESSAGE = "You are an expert data analyst specialized in cleaning, transforming, and preparing datasets for analysis. Your task is to understand user prompts and directly apply the necessary operations to clean and format datasets, ensuring data quality, consistency, and readiness for further analysis. You should return the cleaned or processed data strictly in CSV format, without any additional text, descriptions, or formatting."
+
+DEFAULT_MODEL = "gpt-4"
+DEFAULT_BATCH_TOKENS = 2000  # Input budget per batch; the response needs roughly as many tokens again
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+
+# Errors worth retrying with backoff; anything else fails the batch immediately
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Function to estimate the number of tokens a piece of text will use
+def estimate_tokens(text, model=DEFAULT_MODEL):
+    if tiktoken is not None:
+        try:
+            return len(tiktoken.encoding_for_model(model).encode(text))
+        except KeyError:
+            pass
+    return max(1, len(text) // 4)  # Roughly four characters per token for English/CSV text
+
+
+# Function to build the chat messages for one CSV payload
+def build_messages(csv_string, prompt, system_message=DATA_CLEANING_SYSTEM_MESSAGE):
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": f"Here is the dataset in CSV format:\n{csv_string}\n\n{prompt}\n\nPlease return the cleaned dataset in CSV format only, without any text or explanations."}
+    ]
+
+
+# Function to strip markdown code fences the model sometimes wraps around CSV output
+def strip_code_fences(text):
+    lines = text.strip().splitlines()
+    if lines and lines[0].startswith("```"):
+        lines = lines[1:]
+    if lines and lines[-1].strip().startswith("```"):
+        lines = lines[:-1]
+    return "\n".join(lines)
+
+
+# Function to parse the CSV returned by the model into a DataFrame
+def parse_csv_response(text):
+    return pd.read_csv(io.StringIO(strip_code_fences(text)))
+
+
+class MalformedResponse(ValueError):
+    pass
+
+
+# Function to reject a parsed batch that carries no usable rows: every line was
+# malformed, or the header shares no column with what was sent (e.g. the reply
+# started with prose, which then became the header). Added or renamed columns
+# are fine as long as some of the sent columns come back.
+def check_response(batch_df, bad_lines, sent_columns):
+    if len(batch_df) == 0 and bad_lines:
+        raise MalformedResponse(f"None of the {len(bad_lines)} returned line(s) could be parsed")
+    if not set(map(str, batch_df.columns)) & set(map(str, sent_columns)):
+        raise MalformedResponse(f"The returned header {list(map(str, batch_df.columns))} does not match the dataset columns")
+
+
+# Function to split a DataFrame into row ranges that fit a token budget. The
+# per-row cost is estimated from a sample so the full frame is never serialized here.
+def split_into_batches(df, max_batch_tokens=DEFAULT_BATCH_TOKENS, model=DEFAULT_MODEL, sample_size=500, encoder=None):
+    if len(df) == 0:
+        return [(0, 0)]
+    sample = df.sample(n=min(sample_size, len(df)), random_state=0) if len(df) > sample_size else df
+    if encoder is not None:
+        # Measure the compact form that is actually sent; the legend repeats in every batch
+        header_tokens = estimate_tokens(encoder.legend() + "\n" + ",".join(map(str, encoder.sent_columns)), model)
+        sample = encoder.encode_frame(sample)
+    else:
+        header_tokens = estimate_tokens(",".join(map(str, df.columns)), model)
+    row_tokens = estimate_tokens(sample.to_csv(index=False, header=False), model) / len(sample)
+    rows_per_batch = max(1, int((max_batch_tokens - header_tokens) * 0.9 / max(row_tokens, 1e-9)))
+    return [(start, min(start + rows_per_batch, len(df))) for start in range(0, len(df), rows_per_batch)]
+
+
+class BatchResult:
+    # Outcome of one batch: the parsed rows, or the error that made it fail
+
+    def __init__(self, index, start, stop):
+        self.index = index
+        self.start = start
+        self.stop = stop
+        self.df = None
+        self.error = None
+        self.attempts = 0
+        self.usage = None
+        self.parser = None
+        self.bad_lines = []
+
+    @property
+    def ok(self):
+        return self.error is None and self.df is not None
+
+
+class PipelineResult:
+    # Reassembled output of a chunked transformation. With a schema (see
+    # utils.dtypes.dtype_schema) the input column types are restored on the
+    # text the model returned.
+
+    def __init__(self, batches, schema=None, cancelled=False):
+        self.batches = sorted(batches, key=lambda batch: batch.index)
+        self.schema = schema
+        self.cancelled = cancelled
+
+    @property
+    def failures(self):
+        return [batch for batch in self.batches if not batch.ok]
+
+    @property
+    def processed_df(self):
+        frames = [batch.df for batch in self.batches if batch.ok]
+        if not frames:
+            return None
+        processed_df = pd.concat(frames, ignore_index=True)
+        return apply_schema(processed_df, self.schema) if self.schema else processed_df
+
+
+async def _transform_batch(client, semaphore, batch, df, prompt, model, system_message, max_retries, encoder, stream,
+                           on_batch_progress, on_batch_complete):
+    async with semaphore:
+        # Serialize lazily so only the in-flight batches are held as text
+        rows = df.iloc[batch.start:batch.stop]
+        with stage("prompt_build", batch=batch.index, rows=len(rows), encoded=encoder is not None) as record:
+            if encoder is not None:
+                csv_string = encoder.encode(rows, offset=batch.start)
+                prompt = f"{prompt}\n\n{encoder.instructions}"
+            else:
+                csv_string = rows.to_csv(index=False)  # Every batch carries the header row
+            messages = build_messages(csv_string, prompt, system_message)
+            record["bytes"] = len(csv_string)
+        delay = 1.0
+        while True:
+            batch.attempts += 1
+            try:
+                with stage("llm_call", measure_cpu=False, batch=batch.index, attempt=batch.attempts, rows=len(rows),
+                           model=model, stream=stream) as record:
+                    if stream:
+                        # Parse rows as the completion streams in instead of waiting for the full text
+                        batch.parser = IncrementalCSVParser()
+                        response = await client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            stream=True,
+                            stream_options={"include_usage": True}
+                        )
+                        async for chunk in response:
+                            if getattr(chunk, "usage", None) is not None:
+                                batch.usage = chunk.usage  # Sent in a final chunk without choices
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                batch.parser.feed(chunk.choices[0].delta.content)
+                                if on_batch_progress is not None:
+                                    on_batch_progress(batch)
+                        batch.parser.close()
+                    else:
+                        response = await client.chat.completions.create(
+                            model=model,
+                            messages=messages
+                        )
+                        batch.usage = getattr(response, "usage", None)
+                    if batch.usage is not None:
+                        record["prompt_tokens"] = batch.usage.prompt_tokens
+                        record["completion_tokens"] = batch.usage.completion_tokens
+
+                if stream:
+                    batch.bad_lines = batch.parser.bad_lines
+                    batch.df = batch.parser.to_frame()
+                    # Parsing ran interleaved with the stream; record the time it took on its own
+                    record_stage("response_parse", batch.parser.parse_seconds, batch=batch.index, rows=len(batch.df),
+                                 bad_lines=len(batch.bad_lines))
+                else:
+                    content = response.choices[0].message.content
+                    with stage("response_parse", batch=batch.index, bytes=len(content)) as record:
+                        batch.df = parse_csv_response(content)
+                        record["rows"] = len(batch.df)
+                sent_columns = encoder.encode_frame(rows.head(0)).columns if encoder is not None else rows.columns
+                check_response(batch.df, batch.bad_lines, sent_columns)
+                if encoder is not None:
+                    batch.df = encoder.decode(batch.df, rows, offset=batch.start)
+                break
+            except RETRYABLE_ERRORS as e:
+                if batch.attempts > max_retries:
+                    batch.error = e
+                    break
+                # Exponential backoff with jitter so concurrent batches don't retry in lockstep
+                await asyncio.sleep(delay * (1 + random.random()))
+                delay = min(delay * 2, 60.0)
+            except Exception as e:
+                batch.error = e
+                batch.df = None  # A rejected response contributes no rows
+                break
+    if on_batch_complete is not None:
+        on_batch_complete(batch)
+    return batch
+
+
+async def transform_dataframe_async(df, prompt, api_key=None, model=DEFAULT_MODEL, system_message=DATA_CLEANING_SYSTEM_MESSAGE,
+                                    max_batch_tokens=DEFAULT_BATCH_TOKENS, concurrency=DEFAULT_CONCURRENCY,
+                                    max_retries=DEFAULT_MAX_RETRIES, base_url=None, client=None, encoder=None, stream=False,
+                                    on_batch_progress=None, on_batch_complete=None, schema=None, cancel_event=None):
+    # A custom base_url or client lets the pipeline run against a local stub of the OpenAI endpoint.
+    # An encoder (see utils.prompt_encoding.CompactEncoder) sends each batch in compact form.
+    # With stream=True rows are parsed as they arrive and on_batch_progress is called per delta.
+    # The column types of `df` (or an explicit `schema`) are reapplied to the parsed output.
+    # Setting `cancel_event` (a threading.Event) abandons the batches still in flight.
+    if client is None:
+        client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    semaphore = asyncio.Semaphore(concurrency)
+    if schema is None:
+        schema = dtype_schema(df)
+
+    batches = []
+    tasks = []
+    for index, (start, stop) in enumerate(split_into_batches(df, max_batch_tokens, model, encoder=encoder)):
+        batch = BatchResult(index, start, stop)
+        batches.append(batch)
+        tasks.append(_transform_batch(client, semaphore, batch, df, prompt, model, system_message, max_retries, encoder, stream,
+                                      on_batch_progress, on_batch_complete))
+
+    gathered = asyncio.gather(*tasks)
+    if cancel_event is None:
+        await gathered
+        return PipelineResult(batches, schema)
+
+    while not gathered.done():
+        await asyncio.wait([gathered], timeout=0.2)
+        if cancel_event.is_set() and not gathered.done():
+            gathered.cancel()
+            try:
+                await gathered
+            except asyncio.CancelledError:
+                pass
+            # Batches that did not finish are reported as failed
+            for batch in batches:
+                if batch.df is None and batch.error is None:
+                    batch.error = RuntimeError("Cancelled")
+            return PipelineResult(batches, schema, cancelled=True)
+    gathered.result()
+    return PipelineResult(batches, schema)
+
+
+def transform_dataframe(df, prompt, **kwargs):
+    return asyncio.run(transform_dataframe_async(df, prompt, **kwargs))
@@ -1,19 +1,98 @@
 import pandas as pd
-import numpy as np
 import streamlit as st
+from utils.preview import render_preview
+from utils.instrumentation import stage
 import io
 
-def generate_metadata(file_like):
-    # Check if the input is a StringIO object (from SQL query) or an UploadedFile
-    if isinstance(file_like, io.StringIO):
-        df = pd.read_csv(file_like)
-        file_name = "<Sourced from SQL Server>"
-        file_size = len(file_like.getvalue()) / 1024  # Estimate size in KB
+# Function to compute the operational statistics of an already-loaded DataFrame.
+# Every statistic is computed once per dtype group (all columns, numeric block,
+# text block) instead of re-scanning each column for every metric.
+def profile_dataframe(df):
+    columns = list(df.columns)
+    n_rows = len(df)
+
+    # Statistics shared by every column
+    null_count = df.isnull().sum()
+    unique_count = df.nunique()
+
+    # Text columns: count cells that are blank after stripping whitespace
+    text_columns = [col for col in columns if df[col].dtype == "object"
+                    or isinstance(df[col].dtype, (pd.StringDtype, pd.CategoricalDtype))]
+    empty_count = pd.Series(0, index=df.columns)
+    if text_columns:
+        empty_count[text_columns] = df[text_columns].apply(lambda x: x.astype(str).str.strip().eq('').sum())
+
+    # Numeric columns: aggregate the whole block at once
+    numeric_columns = [col for col in columns if pd.api.types.is_numeric_dtype(df[col])]
+    numeric_stats = {}
+    if numeric_columns:
+        numeric_df = df[numeric_columns]
+        numeric_stats = {
+            "Mean": numeric_df.mean(),
+            "Median": numeric_df.median(),
+            "Standard Deviation": numeric_df.std(),
+            "Minimum Value": {},
+            "Maximum Value": {},
+            "Number of Zeros": numeric_df.eq(0).sum(),
+        }
+        numeric_stats["Percentage of Zeros"] = numeric_stats["Number of Zeros"] / n_rows * 100
+
+        # Minimum and maximum keep the column dtype, so they are computed per
+        # dtype group: a mixed block would upcast integers to float64
+        dtype_groups = {}
+        for col in numeric_columns:
+            dtype_groups.setdefault(str(df[col].dtype), []).append(col)
+        for group in dtype_groups.values():
+            numeric_stats["Minimum Value"].update(df[group].min().to_dict())
+            numeric_stats["Maximum Value"].update(df[group].max().to_dict())
+
+    numeric_set = set(numeric_columns)
+
+    def per_column(name):
+        values = numeric_stats.get(name)
+        return {col: values[col] if col in numeric_set else "NA" for col in columns}
+
+    return {
+        "Column Data Types": df.dtypes.to_dict(),
+        "Null Count": null_count.to_dict(),
+        "Percentage Null Values": (null_count / n_rows * 100).to_dict(),
+        "Unique Values Count": unique_count.to_dict(),
+        "Percentage Unique Values": (unique_count / n_rows * 100).to_dict(),
+        "Empty Cells Count": empty_count.to_dict(),
+        "Percentage Empty Cells": (empty_count / n_rows * 100).to_dict(),
+        "Mean": per_column("Mean"),
+        "Median": per_column("Median"),
+        "Standard Deviation": per_column("Standard Deviation"),
+        "Minimum Value": per_column("Minimum Value"),
+        "Maximum Value": per_column("Maximum Value"),
+        "Number of Zeros": per_column("Number of Zeros"),
+        "Percentage of Zeros": per_column("Percentage of Zeros"),
+    }
+
+
+def generate_metadata(data, file_name=None, file_size=None):
+    # Accept an already-loaded DataFrame so callers only parse the source once.
+    # File-like inputs (StringIO from SQL, or an UploadedFile) are still supported.
+    if isinstance(data, pd.DataFrame):
+        df = data
+        if file_name is None:
+            file_name = "<In-memory DataFrame>"
+        if file_size is None:
+            file_size = df.memory_usage(deep=True).sum() / 1024  # Estimate size in KB
+    elif isinstance(data, io.StringIO):
+        df = pd.read_csv(data)
+        file_name = file_name or "<Sourced from SQL Server>"
+        file_size = len(data.getvalue()) / 1024  # Estimate size in KB
     else:
-        df = pd.read_csv(file_like)
-        file_name = file_like.name
-        file_size = file_like.size / 1024  # Convert bytes to KB
+        df = pd.read_csv(data)
+        file_name = file_name or data.name
+        file_size = data.size / 1024  # Convert bytes to KB
+
+    with stage("generate_metadata", rows=df.shape[0], columns=df.shape[1], bytes=int(file_size * 1024)):
+        return _build_metadata(df, file_name, file_size)
 
+
+def _build_metadata(df, file_name, file_size):
     # Descriptive Metadata
     descriptive_metadata = {
         "File Name": file_name,
@@ -22,32 +101,16 @@ def generate_metadata(file_like):
         "Number of Columns": df.shape[1],
         "Column Names": list(df.columns)
     }
-    
+
     # Operational Metadata
-    operational_metadata = {
-        "Column Data Types": df.dtypes.to_dict(),
-        "Null Count": df.isnull().sum().to_dict(),
-        "Percentage Null Values": (df.isnull().sum() / len(df) * 100).to_dict(),
-        "Unique Values Count": df.nunique().to_dict(),
-        "Percentage Unique Values": (df.nunique() / len(df) * 100).to_dict(),
-        "Empty Cells Count": df.apply(lambda x: np.sum(x.astype(str).str.strip() == '') if x.dtype == "object" else 0).to_dict(),
-        "Percentage Empty Cells": df.apply(lambda x: np.sum(x.astype(str).str.strip() == '') / len(x) * 100 if x.dtype == "object" else 0).to_dict(),
-        "Mean": {col: df[col].mean() if pd.api.types.is_numeric_dtype(df[col]) else "NA" for col in df.columns},
-        "Median": {col: df[col].median() if pd.api.types.is_numeric_dtype(df[col]) else "NA" for col in df.columns},
-        "Standard Deviation": {col: df[col].std() if pd.api.types.is_numeric_dtype(df[col]) else "NA" for col in df.columns},
-        "Minimum Value": {col: df[col].min() if pd.api.types.is_numeric_dtype(df[col]) else "NA" for col in df.columns},
-        "Maximum Value": {col: df[col].max() if pd.api.types.is_numeric_dtype(df[col]) else "NA" for col in df.columns},
-        "Number of Zeros": {col: (df[col] == 0).sum() if pd.api.types.is_numeric_dtype(df[col]) else "NA" for col in df.columns},
-        "Percentage of Zeros": {col: ((df[col] == 0).sum() / len(df) * 100) if pd.api.types.is_numeric_dtype(df[col]) else "NA" for col in df.columns}
-    }
+    operational_metadata = profile_dataframe(df)
 
-    
     # Combine the metadata
     metadata = {
         "Descriptive Metadata": descriptive_metadata,
         "Operational Metadata": operational_metadata
     }
-    
+
     return metadata
 
 
@@ -66,8 +129,14 @@ def display_metadata(metadata):
     # Operational Metadata
     st.markdown("#### Operational Metadata")
 
+    # Display one page at a time with vectorized striping
+    render_preview(operational_metadata_table(metadata), key="metadata_preview", page_size=25, sortable=True)
+
+
+# Function to build the per-column table of the operational metadata
+def operational_metadata_table(metadata):
     # Combine the extended pieces of metadata into a single DataFrame
-    data_types_df = pd.DataFrame(list(metadata['Operational Metadata']['Column Data Types'].items()), columns=["Column Name", "Data Type"])
+    data_types_df = pd.DataFrame([(name, str(dtype)) for name, dtype in metadata['Operational Metadata']['Column Data Types'].items()], columns=["Column Name", "Data Type"])
     null_values_df = pd.DataFrame(list(metadata['Operational Metadata']['Null Count'].items()), columns=["Column Name", "Nulls"])
     percentage_null_values_df = pd.DataFrame(list(metadata['Operational Metadata']['Percentage Null Values'].items()), columns=["Column Name", "% Nulls"])
     unique_values_df = pd.DataFrame(list(metadata['Operational Metadata']['Unique Values Count'].items()), columns=["Column Name", "Uniques"])
@@ -96,12 +165,4 @@ def display_metadata(metadata):
     combined_df = pd.merge(combined_df, max_value_df, on="Column Name")
     combined_df = pd.merge(combined_df, number_of_zeros_df, on="Column Name")
     combined_df = pd.merge(combined_df, percentage_of_zeros_df, on="Column Name")
-
-
-    def highlight_rows(row):
-        return ['background-color: #efefef' if i % 2 == 0 else 'background-color: #ffffff' for i in range(len(row))]
-
-    combined_df = combined_df.style.apply(highlight_rows, axis=0)
-
-    # Display the styled DataFrame as a Streamlit dataframe
-    st.dataframe(combined_df)
\ No newline at end of file
+    return combined_df
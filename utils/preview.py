@@ -0,0 +1,114 @@
+from utils.cache import LRUCache, content_hash
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+
+PAGE_SIZE_OPTIONS = [25, 50, 100, 250]
+DEFAULT_PAGE_SIZE = 50
+STRIPE_COLORS = ("background-color: #efefef", "background-color: #ffffff")
+NO_COLUMN = "(none)"
+
+# Sorted/filtered row orders are cached per dataset and view settings
+PREVIEW_INDEX_CACHE_MB = int(os.environ.get("STREAMLINER_PREVIEW_INDEX_CACHE_MB", "256"))
+preview_index_cache = LRUCache(PREVIEW_INDEX_CACHE_MB * 1024 * 1024)
+
+
+def _column(source, column):
+    # DatasetHandles read only the requested column from disk
+    if isinstance(source, pd.DataFrame):
+        return source[column].reset_index(drop=True)
+    return source.to_pandas(columns=[column])[column].reset_index(drop=True)
+
+
+def _rows(source, positions=None, start=0, stop=None):
+    if isinstance(source, pd.DataFrame):
+        page = source.iloc[start:stop] if positions is None else source.iloc[positions]
+        return page.set_axis(pd.RangeIndex(start, start + len(page)) if positions is None else pd.Index(positions), axis=0)
+    if positions is None:
+        return source.read_rows(start, stop)
+    return source.take(positions)
+
+
+# Function to compute the row positions of a sorted and/or filtered view.
+# Only the sort and filter columns are read, and the result is cached, so
+# paging through the view afterwards costs one page read per rerun.
+def view_positions(source, dataset_key, sort_column=None, ascending=True, filter_column=None, filter_text=""):
+    if not sort_column and not (filter_column and filter_text):
+        return None
+    cache_key = f"{dataset_key}-{sort_column}-{ascending}-{filter_column}-{filter_text}"
+    positions = preview_index_cache.get(cache_key)
+    if positions is not None:
+        return positions
+
+    positions = np.arange(len(source))
+    if filter_column and filter_text:
+        values = _column(source, filter_column)
+        matches = values.astype(str).str.contains(filter_text, case=False, regex=False) & values.notna()
+        positions = positions[matches.to_numpy(dtype=bool)]
+    if sort_column:
+        values = _column(source, sort_column).iloc[positions]
+        try:
+            order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index
+        except TypeError:
+            # Mixed types cannot be compared; sort by their text instead
+            order = values.astype(str).where(values.notna()).sort_values(ascending=ascending, kind="stable", na_position="last").index
+        positions = order.to_numpy()
+
+    preview_index_cache.set(cache_key, positions)
+    return positions
+
+
+# Function to build the zebra striping of a page as one vectorized style frame
+def stripe_page(page):
+    even = np.arange(len(page)) % 2 == 0
+    styles = np.where(even[:, None], STRIPE_COLORS[0], STRIPE_COLORS[1])
+    styles = np.broadcast_to(styles, (len(page), len(page.columns)))
+    return page.style.apply(lambda _: pd.DataFrame(styles, index=page.index, columns=page.columns), axis=None)
+
+
+# Function to render a paginated preview of a DataFrame or DatasetHandle.
+# Only the visible page is read and sent to the browser, so the cost of a
+# rerun does not depend on the size of the dataset.
+def render_preview(source, key, dataset_key=None, page_size=DEFAULT_PAGE_SIZE, sortable=True):
+    columns = list(source.columns)
+    total_rows = len(source)
+
+    sort_column = filter_column = None
+    ascending = True
+    filter_text = ""
+    if sortable and total_rows:
+        sort_col, order_col, filter_col, text_col = st.columns([3, 2, 3, 3])
+        sort_column = sort_col.selectbox("Sort by", [NO_COLUMN] + columns, key=f"{key}_sort")
+        ascending = order_col.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order") == "Ascending"
+        filter_column = filter_col.selectbox("Filter column", [NO_COLUMN] + columns, key=f"{key}_filter_column")
+        filter_text = text_col.text_input("Contains", key=f"{key}_filter_text")
+        sort_column = None if sort_column == NO_COLUMN else sort_column
+        filter_column = None if filter_column == NO_COLUMN else filter_column
+
+    positions = None
+    if sort_column or (filter_column and filter_text):
+        if dataset_key is None:
+            dataset_key = source.key if hasattr(source, "key") else content_hash(source)
+        positions = view_positions(source, dataset_key, sort_column, ascending, filter_column, filter_text)
+    view_rows = total_rows if positions is None else len(positions)
+
+    page_col, size_col, info_col = st.columns([2, 2, 5])
+    page_size = size_col.selectbox(
+        "Rows per page", PAGE_SIZE_OPTIONS, key=f"{key}_page_size",
+        index=PAGE_SIZE_OPTIONS.index(page_size) if page_size in PAGE_SIZE_OPTIONS else 0
+    )
+    page_count = max(1, -(-view_rows // page_size))
+    if st.session_state.get(f"{key}_page", 1) > page_count:
+        st.session_state[f"{key}_page"] = page_count  # The view shrank after a filter or page size change
+    page = page_col.number_input("Page", min_value=1, max_value=page_count, step=1, key=f"{key}_page")
+    start = min((page - 1) * page_size, max(view_rows - 1, 0))
+    stop = min(start + page_size, view_rows)
+    info_col.caption(f"Rows {start + 1 if view_rows else 0:,}–{stop:,} of {view_rows:,}"
+                     + (f" (filtered from {total_rows:,})" if view_rows != total_rows else ""))
+
+    if positions is None:
+        page_df = _rows(source, start=start, stop=stop)
+    else:
+        page_df = _rows(source, positions=positions[start:stop])
+    st.dataframe(stripe_page(page_df))
@@ -0,0 +1,58 @@
+import hashlib
+import os
+from utils.cache import DiskCache, deserialize_value, serialize_value
+
+# Limits for the persistent prompt/response cache (override via environment variables)
+PROMPT_CACHE_DIR = os.environ.get("STREAMLINER_PROMPT_CACHE_DIR", os.path.join(".cache", "prompts"))
+PROMPT_CACHE_DISK_MB = int(os.environ.get("STREAMLINER_PROMPT_CACHE_MB", "2048"))
+PROMPT_CACHE_TTL_HOURS = float(os.environ.get("STREAMLINER_PROMPT_CACHE_TTL_HOURS", "168"))
+
+# Function to normalize a prompt so whitespace-only edits hit the same cache entry
+def normalize_prompt(prompt):
+    return " ".join(prompt.split())
+
+
+class PromptCache:
+    # Persistent cache of transformation results keyed by the dataset content,
+    # the normalized prompt, the system message, the model name and any
+    # options that change what is sent (e.g. compact encoding, column selection)
+
+    def __init__(self, directory, max_bytes, ttl_seconds=None):
+        self.store = DiskCache(directory, max_bytes, suffix=".result", ttl_seconds=ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(dataset_key, prompt, system_message, model, **options):
+        digest = hashlib.blake2b(digest_size=20)
+        parts = [dataset_key, normalize_prompt(prompt), system_message, model]
+        parts += [f"{name}={value!r}" for name, value in sorted(options.items())]
+        for part in parts:
+            digest.update(str(part).encode())
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key):
+        data = self.store.get_bytes(key)
+        if data is not None:
+            try:
+                df = deserialize_value(data)
+                self.hits += 1
+                return df
+            except Exception:
+                self.store.delete(key)
+        self.misses += 1
+        return None
+
+    def set(self, key, df):
+        # Frames parquet cannot represent (e.g. mixed-type columns) are not cached
+        data = serialize_value(df)
+        if data is not None:
+            self.store.set_bytes(key, data)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Process-wide prompt cache shared by every Streamlit session on this server
+prompt_cache = PromptCache(PROMPT_CACHE_DIR, PROMPT_CACHE_DISK_MB * 1024 * 1024, PROMPT_CACHE_TTL_HOURS * 3600)
@@ -0,0 +1,144 @@
+import pandas as pd
+import numpy as np
+import re
+from utils.llm_pipeline import DEFAULT_MODEL, estimate_tokens
+
+# Column carrying the original row position when only some columns are sent
+ROW_ID_COLUMN = "_row_id"
+# Dictionary codes are written as "#<n>" so they cannot be confused with numbers the model writes
+CODE_PATTERN = re.compile(r"#(\d+)")
+
+# Instructions appended to the prompt when the dataset is sent in compact form
+COMPACT_ENCODING_INSTRUCTIONS = "The dataset is compactly encoded. Columns listed under DICTIONARIES contain codes written as #<number>: keep codes unchanged unless the requested change affects those values, and write any new or changed value in full. Columns listed under CONSTANTS are omitted because every row has the same value. If a `_row_id` column is present, keep it unchanged on every returned row."
+
+
+def _mentioned_in(prompt, column):
+    # A column counts as mentioned if its name appears in the prompt, with or without underscores
+    text = prompt.lower()
+    name = str(column).lower()
+    return name in text or name.replace("_", " ") in text
+
+
+class CompactEncoder:
+    # Builds a token-efficient text representation of a DataFrame for LLM
+    # prompts and expands the model's output back into a full DataFrame.
+    # Encoding choices are learned once on the full frame so that every
+    # batch shares the same dictionaries.
+
+    instructions = COMPACT_ENCODING_INSTRUCTIONS
+
+    def __init__(self, df, prompt="", select_columns=False, max_categories=1000, min_repeat_ratio=2.0, float_precision=None):
+        self.columns = list(df.columns)
+        self.float_precision = float_precision
+        self.dictionaries = {}
+        self.constants = {}
+
+        mentioned = {col for col in self.columns if prompt and _mentioned_in(prompt, col)}
+        if select_columns and mentioned:
+            self.sent_columns = [col for col in self.columns if col in mentioned]
+        else:
+            self.sent_columns = list(self.columns)
+        self.add_row_id = len(self.sent_columns) < len(self.columns)
+
+        n_rows = len(df)
+        for col in list(self.sent_columns):
+            values = df[col]
+            unique_values = values.dropna().unique()
+            # Constant columns are omitted unless the prompt refers to them
+            if n_rows > 1 and len(unique_values) == 1 and not values.isna().any() and col not in mentioned \
+                    and len(self.sent_columns) > 1:
+                self.constants[col] = unique_values[0]
+                self.sent_columns.remove(col)
+                continue
+            # Repeated text values are replaced by short codes, unless a value could be read as a code
+            if values.dtype == "object" or isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values):
+                if 0 < len(unique_values) <= max_categories and values.count() >= min_repeat_ratio * len(unique_values):
+                    texts = pd.Series(unique_values).astype(str)
+                    if texts.str.len().mean() > len(str(len(unique_values))) + 1 \
+                            and not texts.str.fullmatch(CODE_PATTERN.pattern).any():
+                        self.dictionaries[col] = list(unique_values)
+
+        self._codes = {col: {value: code for code, value in enumerate(values)} for col, values in self.dictionaries.items()}
+
+    def encode_frame(self, df, offset=0):
+        # Return the frame that is actually serialized into the prompt. `offset`
+        # is the position of the first row of `df` within the full dataset.
+        encoded = df[self.sent_columns].copy()
+        for col in self.sent_columns:
+            values = encoded[col]
+            if col in self._codes:
+                codes = values.map(self._codes[col])
+                encoded[col] = codes.map(lambda code: f"#{code}", na_action="ignore")
+            elif pd.api.types.is_float_dtype(values):
+                # Integral floats (e.g. integer columns with nulls) lose their trailing ".0"
+                if np.all(np.mod(values.dropna().to_numpy(), 1) == 0):
+                    encoded[col] = values.astype("Int64")
+                elif self.float_precision is not None:
+                    encoded[col] = values.round(self.float_precision)
+        if self.add_row_id:
+            encoded.insert(0, ROW_ID_COLUMN, np.arange(offset, offset + len(df)))
+        return encoded
+
+    def legend(self):
+        lines = []
+        if self.dictionaries:
+            lines.append("DICTIONARIES:")
+            for col, values in self.dictionaries.items():
+                lines.append(f"{col}: " + "|".join(f"#{code}={value}" for code, value in enumerate(values)))
+        if self.constants:
+            lines.append("CONSTANTS:")
+            for col, value in self.constants.items():
+                lines.append(f"{col}={value}")
+        return "\n".join(lines)
+
+    def encode(self, df, offset=0):
+        legend = self.legend()
+        csv_string = self.encode_frame(df, offset).to_csv(index=False)
+        return f"{legend}\nCSV:\n{csv_string}" if legend else csv_string
+
+    def decode(self, processed_df, original_df=None, offset=0):
+        # Expand codes, restore omitted constant columns and, when only some
+        # columns were sent, re-attach the rest from the original rows by row id
+        decoded = processed_df.copy()
+        for col, values in self.dictionaries.items():
+            if col not in decoded.columns:
+                continue
+            # Only "#<n>" values are codes; anything else is a value the model wrote in full
+            returned = decoded[col]
+            codes = pd.to_numeric(returned.astype(str).str.extract(f"^{CODE_PATTERN.pattern}$", expand=False), errors="coerce")
+            expanded = codes.map(dict(enumerate(values)))
+            decoded[col] = expanded.where(expanded.notna(), returned)
+
+        if ROW_ID_COLUMN in decoded.columns:
+            row_ids = pd.to_numeric(decoded.pop(ROW_ID_COLUMN), errors="coerce") - offset
+            if original_df is not None:
+                unsent = [col for col in self.columns if col not in self.sent_columns and col not in self.constants
+                          and col not in decoded.columns]
+                if unsent:
+                    lookup = original_df[unsent].reset_index(drop=True)
+                    valid = row_ids.notna() & row_ids.between(0, len(lookup) - 1)
+                    attached = lookup.reindex(row_ids.where(valid).to_numpy())
+                    attached.index = decoded.index
+                    decoded = pd.concat([decoded, attached], axis=1)
+
+        for col, value in self.constants.items():
+            if col not in decoded.columns:
+                decoded[col] = value
+
+        ordered = [col for col in self.columns if col in decoded.columns]
+        return decoded[ordered + [col for col in decoded.columns if col not in ordered]]
+
+
+# Function to estimate prompt tokens for the dataset before and after compact
+# encoding. Both are measured on a sample and scaled to the full row count.
+def estimate_token_savings(df, encoder, model=DEFAULT_MODEL, sample_size=2000):
+    if len(df) == 0:
+        return 0, 0
+    sample = df.sample(n=sample_size, random_state=0).sort_index() if len(df) > sample_size else df
+    scale = len(df) / len(sample)
+    header = ",".join(map(str, df.columns))
+    rows_before = estimate_tokens(sample.to_csv(index=False, header=False), model)
+    rows_after = estimate_tokens(encoder.encode_frame(sample).to_csv(index=False, header=False), model)
+    before = estimate_tokens(header, model) + rows_before * scale
+    after = estimate_tokens(encoder.legend() + "\n" + ",".join(map(str, encoder.sent_columns)), model) + rows_after * scale
+    return int(before), int(after)
@@ -0,0 +1,163 @@
+import platform
+import ctypes
+import struct
+import sys
+import os
+
+# Run generated code without OS-level isolation where it cannot be set up
+# (non-Linux systems, unsupported architectures). Off by default: code mode
+# then refuses to run instead of executing untrusted code unconfined.
+SANDBOX_ALLOW_UNISOLATED = os.environ.get("STREAMLINER_SANDBOX_ALLOW_UNISOLATED", "0") == "1"
+# Unprivileged account the sandbox switches to when the server runs as root
+# (e.g. "nobody"). It must be able to read the Python installation.
+SANDBOX_USER = os.environ.get("STREAMLINER_SANDBOX_USER", "")
+
+PR_SET_NO_NEW_PRIVS = 38
+PR_SET_SECCOMP = 22
+SECCOMP_MODE_FILTER = 2
+SECCOMP_RET_KILL_PROCESS = 0x80000000
+SECCOMP_RET_ERRNO = 0x00050000
+SECCOMP_RET_ALLOW = 0x7FFF0000
+EPERM = 1
+ENOSYS = 38
+
+BPF_LD_W_ABS = 0x20
+BPF_JEQ_K = 0x15
+BPF_JGE_K = 0x35
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+
+# Offsets into struct seccomp_data (little-endian; args are 64-bit, the low word is enough)
+SECCOMP_DATA_NR = 0
+SECCOMP_DATA_ARCH = 4
+SECCOMP_DATA_ARGS = 16
+
+CLONE_THREAD = 0x00010000
+# O_WRONLY | O_RDWR | O_CREAT | O_TRUNC (the same values on x86_64 and aarch64)
+OPEN_WRITE_FLAGS = 0o1 | 0o2 | 0o100 | 0o1000
+
+# Syscalls refused with EPERM: process creation and execution, networking,
+# debugging other processes, signals to other processes, and every call that
+# creates, removes or changes files. Threads are still allowed (clone with
+# CLONE_THREAD) and files can still be opened for reading (imports need it).
+SYSCALLS = {
+    "x86_64": {
+        "arch": 0xC000003E,
+        "denied": {
+            "execve": 59, "execveat": 322, "fork": 57, "vfork": 58, "socket": 41, "socketpair": 53,
+            "ptrace": 101, "process_vm_readv": 310, "process_vm_writev": 311, "kill": 62,
+            "creat": 85, "unlink": 87, "unlinkat": 263, "rename": 82, "renameat": 264, "renameat2": 316,
+            "mkdir": 83, "mkdirat": 258, "rmdir": 84, "link": 86, "linkat": 265, "symlink": 88, "symlinkat": 266,
+            "chmod": 90, "fchmod": 91, "fchmodat": 268, "fchmodat2": 452, "chown": 92, "fchown": 93, "lchown": 94,
+            "fchownat": 260, "truncate": 76, "ftruncate": 77, "mknod": 133, "mknodat": 259, "mount": 165,
+            "umount2": 166, "bpf": 321, "userfaultfd": 323, "io_uring_setup": 425,
+        },
+        # Refused with ENOSYS so the C library falls back to the calls checked below
+        "unsupported": {"clone3": 435, "openat2": 437},
+        "clone": 56,
+        "open": {2: 1, 257: 2},  # syscall -> index of its flags argument
+        "x32_bit": 0x40000000,
+    },
+    "aarch64": {
+        "arch": 0xC00000B7,
+        "denied": {
+            "execve": 221, "execveat": 281, "socket": 198, "socketpair": 199, "ptrace": 117,
+            "process_vm_readv": 270, "process_vm_writev": 271, "kill": 129, "unlinkat": 35, "renameat": 38,
+            "renameat2": 276, "mkdirat": 34, "linkat": 37, "symlinkat": 36, "fchmod": 52, "fchmodat": 53,
+            "fchmodat2": 452, "fchown": 55, "fchownat": 54, "truncate": 45, "ftruncate": 46, "mknodat": 33,
+            "mount": 40, "umount2": 39, "bpf": 280, "userfaultfd": 282, "io_uring_setup": 425,
+        },
+        "unsupported": {"clone3": 435, "openat2": 437},
+        "clone": 220,
+        "open": {56: 2},
+        "x32_bit": None,
+    },
+}
+
+
+class SandboxUnavailable(Exception):
+    pass
+
+
+def _instruction(code, k, jt=0, jf=0):
+    return struct.pack("HBBI", code, jt, jf, k)
+
+
+# Function to build the seccomp BPF program for one architecture
+def build_filter(table):
+    program = [
+        _instruction(BPF_LD_W_ABS, SECCOMP_DATA_ARCH),
+        _instruction(BPF_JEQ_K, table["arch"], jt=1),
+        _instruction(BPF_RET_K, SECCOMP_RET_KILL_PROCESS),
+        _instruction(BPF_LD_W_ABS, SECCOMP_DATA_NR),
+    ]
+    if table["x32_bit"]:
+        program += [_instruction(BPF_JGE_K, table["x32_bit"], jf=1), _instruction(BPF_RET_K, SECCOMP_RET_ERRNO | EPERM)]
+    for number in table["denied"].values():
+        program += [_instruction(BPF_JEQ_K, number, jf=1), _instruction(BPF_RET_K, SECCOMP_RET_ERRNO | EPERM)]
+    for number in table["unsupported"].values():
+        program += [_instruction(BPF_JEQ_K, number, jf=1), _instruction(BPF_RET_K, SECCOMP_RET_ERRNO | ENOSYS)]
+
+    # New threads are fine, new processes are not
+    program += [
+        _instruction(BPF_JEQ_K, table["clone"], jf=4),
+        _instruction(BPF_LD_W_ABS, SECCOMP_DATA_ARGS),
+        _instruction(BPF_JSET_K, CLONE_THREAD, jt=1),
+        _instruction(BPF_RET_K, SECCOMP_RET_ERRNO | EPERM),
+        _instruction(BPF_RET_K, SECCOMP_RET_ALLOW),
+    ]
+    # Files may be opened for reading only
+    for number, flags_arg in table["open"].items():
+        program += [
+            _instruction(BPF_JEQ_K, number, jf=4),
+            _instruction(BPF_LD_W_ABS, SECCOMP_DATA_ARGS + 8 * flags_arg),
+            _instruction(BPF_JSET_K, OPEN_WRITE_FLAGS, jf=1),
+            _instruction(BPF_RET_K, SECCOMP_RET_ERRNO | EPERM),
+            _instruction(BPF_RET_K, SECCOMP_RET_ALLOW),
+        ]
+    program.append(_instruction(BPF_RET_K, SECCOMP_RET_ALLOW))
+    return program
+
+
+def _drop_privileges(user):
+    import pwd
+    entry = pwd.getpwnam(user)
+    os.setgroups([])
+    os.setgid(entry.pw_gid)
+    os.setuid(entry.pw_uid)
+
+
+# Function to confine the current process before it runs untrusted code. It
+# installs a seccomp filter (see SYSCALLS) so the process cannot start
+# programs, open network connections or write to the filesystem, and, when
+# running as root with SANDBOX_USER set, switches to that user first. Call
+# it in a dedicated child process: the restrictions cannot be lifted again.
+def enter_sandbox():
+    table = SYSCALLS.get(platform.machine().lower()) if sys.platform.startswith("linux") else None
+    if table is None:
+        if SANDBOX_ALLOW_UNISOLATED:
+            return False
+        raise SandboxUnavailable(
+            f"Generated code needs a Linux x86_64/aarch64 sandbox (this is {sys.platform}/{platform.machine()}); "
+            "set STREAMLINER_SANDBOX_ALLOW_UNISOLATED=1 to run it without isolation"
+        )
+
+    if SANDBOX_USER and os.geteuid() == 0:
+        _drop_privileges(SANDBOX_USER)
+
+    program = b"".join(build_filter(table))
+    count = len(program) // 8
+    instructions = ctypes.create_string_buffer(program)
+
+    class SockFprog(ctypes.Structure):
+        _fields_ = [("len", ctypes.c_ushort), ("filter", ctypes.c_void_p)]
+
+    fprog = SockFprog(count, ctypes.addressof(instructions))
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.prctl.argtypes = [ctypes.c_int, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]
+    if (libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0
+            or libc.prctl(PR_SET_SECCOMP, SECCOMP_MODE_FILTER, ctypes.addressof(fprog), 0, 0) != 0):
+        if SANDBOX_ALLOW_UNISOLATED:
+            return False
+        raise SandboxUnavailable(f"Installing the seccomp filter failed: {os.strerror(ctypes.get_errno())}")
+    return True
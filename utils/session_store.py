@@ -0,0 +1,264 @@
+from utils.cache import LRUCache, content_hash
+import pandas as pd
+import numpy as np
+import threading
+import shutil
+import time
+import uuid
+import os
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# Limits for the session dataset store (override via environment variables)
+SESSION_STORE_DIR = os.environ.get("STREAMLINER_SESSION_DIR", os.path.join(".cache", "sessions"))
+SESSION_USER_QUOTA_MB = int(os.environ.get("STREAMLINER_SESSION_USER_QUOTA_MB", "4096"))
+SESSION_GLOBAL_QUOTA_MB = int(os.environ.get("STREAMLINER_SESSION_GLOBAL_QUOTA_MB", "40960"))
+SESSION_MEMORY_MB = int(os.environ.get("STREAMLINER_SESSION_MEMORY_MB", "2048"))
+SESSION_IDLE_MINUTES = int(os.environ.get("STREAMLINER_SESSION_IDLE_MINUTES", "120"))
+
+# Marker file whose mtime records the last activity of a session
+LAST_USED_FILE = ".last_used"
+# Idle sessions are looked for at most this often
+SWEEP_INTERVAL_SECONDS = 60
+
+
+class SessionQuotaExceeded(Exception):
+    pass
+
+
+class DatasetHandle:
+    # Lightweight reference to a dataset kept by the session store. This is
+    # what goes into st.session_state instead of the DataFrame; the data is
+    # read from disk only when (and as far as) a view needs it.
+
+    def __init__(self, store, path, key, num_rows, columns, nbytes):
+        self.store = store
+        self.path = path
+        self.key = key
+        self.num_rows = num_rows
+        self.columns = columns
+        self.nbytes = nbytes
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def __len__(self):
+        return self.num_rows
+
+    def to_pandas(self, columns=None):
+        return self.store.read(self, columns=columns)
+
+    def read_rows(self, start, stop, columns=None):
+        return self.store.read(self, columns=columns, start=start, stop=stop)
+
+    def head(self, n=5):
+        return self.read_rows(0, min(n, self.num_rows))
+
+    def take(self, positions, columns=None):
+        return self.store.take(self, positions, columns=columns)
+
+
+class SessionDatasetStore:
+    # Keeps the datasets of every session in uncompressed Arrow IPC files that
+    # are memory-mapped on access, so selecting columns or slicing rows does
+    # not read the rest of the file. Files live under <user>/<session>/, the
+    # stored bytes are limited per user and in total, sessions idle for longer
+    # than `idle_seconds` are removed, and whole frames that were materialized
+    # recently are kept in a shared in-memory LRU of `memory_bytes`.
+
+    def __init__(self, directory, user_quota_bytes, global_quota_bytes, memory_bytes, idle_seconds):
+        self.directory = directory
+        self.user_quota_bytes = user_quota_bytes
+        self.global_quota_bytes = global_quota_bytes
+        self.idle_seconds = idle_seconds
+        self.frames = LRUCache(memory_bytes)
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def session_path(self, user, session_id):
+        # User names are hashed so they are always valid directory names
+        return os.path.join(self.directory, content_hash(user or "anonymous")[:16], session_id)
+
+    def touch(self, user, session_id):
+        path = self.session_path(user, session_id)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, LAST_USED_FILE), "a"):
+            pass
+        os.utime(os.path.join(path, LAST_USED_FILE))
+        if time.time() - self._last_sweep > SWEEP_INTERVAL_SECONDS:
+            self.evict_idle()
+
+    def _write(self, df, path):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        if pyarrow is not None:
+            try:
+                table = pyarrow.Table.from_pandas(df, preserve_index=False)
+                with pyarrow.OSFile(temp_path, "wb") as sink:
+                    with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                os.replace(temp_path, path)
+                return path
+            except (pyarrow.ArrowException, TypeError, ValueError):
+                self._remove(temp_path)
+        # Columns Arrow cannot represent (e.g. mixed Python objects) are pickled instead
+        path = f"{os.path.splitext(path)[0]}.pkl"
+        df.to_pickle(temp_path)
+        os.replace(temp_path, path)
+        return path
+
+    def put(self, user, session_id, name, df, key=None):
+        # Store `df` as dataset `name` of the session, replacing an earlier version
+        session_path = self.session_path(user, session_id)
+        self.touch(user, session_id)
+        previous = [os.path.join(session_path, existing) for existing in os.listdir(session_path)
+                    if os.path.splitext(existing)[0] == name]
+
+        # Write next to the previous version, which is only replaced once the
+        # new one fits the quota, so a rejected dataset leaves the old one intact
+        incoming = self._write(df, os.path.join(session_path, f"{name}.incoming.arrow"))
+        nbytes = os.path.getsize(incoming)
+        user_bytes = sum(size for _, size in self._session_sizes(os.path.dirname(session_path)).values())
+        user_bytes -= sum(os.path.getsize(path) for path in previous if os.path.exists(path))
+        if user_bytes > self.user_quota_bytes:
+            self._remove(incoming)
+            raise SessionQuotaExceeded(
+                f"Storing this dataset would use {user_bytes / 1024 ** 2:,.0f} MB, "
+                f"over the per-user limit of {self.user_quota_bytes / 1024 ** 2:,.0f} MB"
+            )
+        for path in previous:
+            self._remove(path)
+        path = os.path.join(session_path, name + os.path.splitext(incoming)[1])
+        os.replace(incoming, path)
+        self._enforce_global_quota(keep=session_path)
+        return DatasetHandle(self, path, key or content_hash(df), len(df), [str(col) for col in df.columns], nbytes)
+
+    def read(self, handle, columns=None, start=None, stop=None):
+        whole = columns is None and start is None and stop is None
+        if whole:
+            df = self.frames.get(handle.path)
+            if df is not None:
+                return df
+        if not handle.exists:
+            raise FileNotFoundError(f"The dataset at {handle.path} has expired")
+        os.utime(os.path.join(os.path.dirname(handle.path), LAST_USED_FILE))
+
+        start = start or 0
+        stop = handle.num_rows if stop is None else min(stop, handle.num_rows)
+        if handle.path.endswith(".pkl"):
+            df = pd.read_pickle(handle.path)
+            df = df[list(columns)] if columns is not None else df
+            df = df.iloc[start:stop]
+        else:
+            # Memory-mapped reads only touch the pages of the selected columns and rows
+            with pyarrow.memory_map(handle.path, "r") as source:
+                table = pyarrow.ipc.open_file(source).read_all()
+                if columns is not None:
+                    table = table.select(list(columns))
+                if not whole:
+                    table = table.slice(start, max(stop - start, 0))
+                df = table.to_pandas()
+        df.index = pd.RangeIndex(start, start + len(df))
+
+        if whole:
+            self.frames.set(handle.path, df)
+        return df
+
+    def take(self, handle, positions, columns=None):
+        # Rows at arbitrary positions (e.g. one page of a sorted view), indexed by position
+        positions = np.asarray(positions, dtype=np.int64)
+        df = self.frames.get(handle.path)
+        if df is not None:
+            df = df[list(columns)] if columns is not None else df
+            df = df.iloc[positions]
+        elif not handle.exists:
+            raise FileNotFoundError(f"The dataset at {handle.path} has expired")
+        elif handle.path.endswith(".pkl"):
+            df = pd.read_pickle(handle.path)
+            df = df[list(columns)] if columns is not None else df
+            df = df.iloc[positions]
+        else:
+            with pyarrow.memory_map(handle.path, "r") as source:
+                table = pyarrow.ipc.open_file(source).read_all()
+                if columns is not None:
+                    table = table.select(list(columns))
+                df = table.take(pyarrow.array(positions)).to_pandas()
+        df.index = pd.Index(positions)
+        return df
+
+    def _remove(self, path):
+        self.frames.delete(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _session_sizes(self, user_path):
+        # Bytes stored and last activity of every session of one user
+        sessions = {}
+        try:
+            names = os.listdir(user_path)
+        except OSError:
+            return sessions
+        for name in names:
+            path = os.path.join(user_path, name)
+            try:
+                last_used = os.stat(os.path.join(path, LAST_USED_FILE)).st_mtime
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path) if f != LAST_USED_FILE)
+            except OSError:
+                continue
+            sessions[path] = (last_used, size)
+        return sessions
+
+    def _all_sessions(self):
+        sessions = {}
+        for name in os.listdir(self.directory):
+            sessions.update(self._session_sizes(os.path.join(self.directory, name)))
+        return sessions
+
+    def drop_session(self, session_path):
+        for name in os.listdir(session_path) if os.path.isdir(session_path) else []:
+            self.frames.delete(os.path.join(session_path, name))
+        shutil.rmtree(session_path, ignore_errors=True)
+
+    def _enforce_global_quota(self, keep=None):
+        # Remove the least recently active sessions until the store fits its quota
+        with self._lock:
+            sessions = sorted((last_used, size, path) for path, (last_used, size) in self._all_sessions().items())
+            total = sum(size for _, size, _ in sessions)
+            for _, size, path in sessions:
+                if total <= self.global_quota_bytes:
+                    break
+                if path != keep:
+                    self.drop_session(path)
+                    total -= size
+
+    def evict_idle(self):
+        with self._lock:
+            self._last_sweep = time.time()
+            for path, (last_used, _) in self._all_sessions().items():
+                if self._last_sweep - last_used > self.idle_seconds:
+                    self.drop_session(path)
+
+    def stats(self):
+        sessions = self._all_sessions()
+        return {
+            "sessions": len(sessions),
+            "stored_bytes": sum(size for _, size in sessions.values()),
+            "memory_bytes": self.frames.current_bytes,
+        }
+
+
+# Process-wide store shared by every Streamlit session on this server
+session_store = SessionDatasetStore(
+    SESSION_STORE_DIR,
+    SESSION_USER_QUOTA_MB * 1024 * 1024,
+    SESSION_GLOBAL_QUOTA_MB * 1024 * 1024,
+    SESSION_MEMORY_MB * 1024 * 1024,
+    SESSION_IDLE_MINUTES * 60,
+)
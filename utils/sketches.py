@@ -0,0 +1,163 @@
+import math
+import numpy as np
+import pandas as pd
+
+# Mergeable, bounded-memory sketches used by the streaming profiler.
+# Both sketches can be updated chunk by chunk, pickled, and merged with a
+# sketch built on another chunk or in another process.
+
+
+def hash_values(values):
+    # Hash a Series of non-null values to uint64. Numbers are hashed as float64
+    # so that 1 and 1.0 read from different chunks count as the same value.
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        values = values.astype("float64")
+    else:
+        values = values.astype(str)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+def _bit_length(values):
+    # Exact vectorized bit length of uint64 values
+    values = values.copy()
+    length = np.zeros(values.shape, dtype=np.uint64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= (np.uint64(1) << np.uint64(shift))
+        values[mask] >>= np.uint64(shift)
+        length[mask] += np.uint64(shift)
+    return length + (values > 0).astype(np.uint64)
+
+
+class HyperLogLog:
+    # Distinct-count sketch. Counts are exact until `exact_limit` distinct hashes
+    # have been seen, then the sketch switches to HyperLogLog registers whose
+    # relative standard error is roughly `error`.
+
+    def __init__(self, error=0.01, exact_limit=4096):
+        self.error = error
+        self.precision = min(18, max(4, math.ceil(math.log2((1.04 / error) ** 2))))
+        self.exact_limit = exact_limit
+        self.exact = np.empty(0, dtype=np.uint64)
+        self.registers = None
+
+    def _to_registers(self):
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        self._add_to_registers(self.exact)
+        self.exact = None
+
+    def _add_to_registers(self, hashes):
+        if len(hashes) == 0:
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        remainder = hashes & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        rank = (np.uint64(64) - p) - _bit_length(remainder) + np.uint64(1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def update_hashes(self, hashes):
+        if self.registers is None:
+            self.exact = np.union1d(self.exact, hashes)
+            if len(self.exact) > self.exact_limit:
+                self._to_registers()
+        else:
+            self._add_to_registers(hashes)
+
+    def update(self, values):
+        self.update_hashes(hash_values(values.dropna()))
+
+    def merge(self, other):
+        if self.precision != other.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        if other.registers is None:
+            self.update_hashes(other.exact)
+        else:
+            if self.registers is None:
+                self._to_registers()
+            np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        if self.registers is None:
+            return int(len(self.exact))
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class QuantileSketch:
+    # KLL quantile sketch. Ranks returned by `quantile` are within roughly
+    # `error` of the true rank. Values are kept exactly until the first
+    # compaction, so small inputs produce exact quantiles.
+
+    def __init__(self, error=0.01, seed=None):
+        self.error = error
+        self.k = max(8, math.ceil(1.7 / error))
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self.compacted = False
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                items = np.sort(items)
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[:len(items) - len(keep)]
+                promoted = pairs[self._rng.integers(2)::2]
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.compacted = True
+                # Capacities depend on the number of levels, so start over
+                level = 0
+                continue
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.compacted = self.compacted or other.compacted
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        if not self.compacted:
+            items = self.levels[0]
+            return float(np.quantile(items, q)) if len(items) else float("nan")
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** i, dtype=np.float64) for i, level in enumerate(self.levels)])
+        if len(items) == 0:
+            return float("nan")
+        order = np.argsort(items, kind="mergesort")
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(items[order][min(position, len(items) - 1)])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_rng"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rng = np.random.default_rng()
@@ -0,0 +1,255 @@
+from concurrent.futures import ThreadPoolExecutor
+from utils.dtypes import decimal_precision_scale
+from decimal import Decimal
+import pandas as pd
+import threading
+import json
+import os
+
+# Default memory budget for the parameter arrays of the batches in flight
+DEFAULT_MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+# Python objects and driver parameter buffers take several times the pandas footprint
+PARAMETER_OVERHEAD_FACTOR = 4
+MIN_BATCH_ROWS = 1_000
+MAX_BATCH_ROWS = 500_000
+# Longest text that fits an NVARCHAR(n) column; longer values need NVARCHAR(MAX)
+NVARCHAR_MAX_LENGTH = 4000
+
+# Value ranges of the SQL Server integer types, for checking loads into existing tables
+INTEGER_RANGES = {
+    "tinyint": (0, 255),
+    "smallint": (-2 ** 15, 2 ** 15 - 1),
+    "int": (-2 ** 31, 2 ** 31 - 1),
+    "bigint": (-2 ** 63, 2 ** 63 - 1),
+}
+TEXT_TYPES = ("nvarchar", "varchar", "nchar", "char")
+
+
+def _decimal_type(values):
+    # Full precision, so later loads with more integer digits still fit
+    _, scale = decimal_precision_scale(values)
+    return f"DECIMAL(38, {scale})"
+
+
+def _nvarchar_type(series):
+    longest = int(series.dropna().astype(str).str.len().max()) if series.notna().any() else 1
+    return "NVARCHAR(MAX)" if longest > NVARCHAR_MAX_LENGTH else f"NVARCHAR({NVARCHAR_MAX_LENGTH})"
+
+
+# Function to map a pandas column to a SQL Server column type. Every dtype
+# family maps to one fixed width (not the width of the current values), so
+# later loads into the same table do not overflow.
+def sql_server_column_type(series):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return sql_server_column_type(series.astype(dtype.categories.dtype))
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BIT"
+    if pd.api.types.is_integer_dtype(dtype):
+        if dtype.itemsize == 8 and pd.api.types.is_unsigned_integer_dtype(dtype):
+            return "DECIMAL(20, 0)"
+        return "BIGINT"
+    if pd.api.types.is_float_dtype(dtype):
+        return "FLOAT"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "DATETIMEOFFSET" if getattr(dtype, "tz", None) is not None else "DATETIME2"
+
+    # Object columns: look at the Python values they actually hold
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred == "boolean":
+        return "BIT"
+    if inferred == "integer":
+        return "BIGINT"
+    if inferred in ("floating", "mixed-integer-float"):
+        return "FLOAT"
+    if inferred == "date":
+        return "DATE"
+    if inferred == "datetime":
+        return "DATETIME2"
+    if inferred == "decimal":
+        return _decimal_type(value for value in series.dropna() if isinstance(value, Decimal))
+    return _nvarchar_type(series)
+
+
+# Function to build the CREATE TABLE statement for a DataFrame (created only if missing)
+def create_table_statement(df, schema_name, table_name):
+    columns = ', '.join([f'[{col}] {sql_server_column_type(df[col])} NULL' for col in df.columns])
+    return f"""
+        IF OBJECT_ID('{schema_name}.{table_name}', 'U') IS NULL
+        BEGIN
+            CREATE TABLE [{schema_name}].[{table_name}] ({columns})
+        END
+    """
+
+
+# Function to read the columns of an existing table (empty when the table does not exist)
+def existing_table_columns(cursor, schema_name, table_name):
+    cursor.execute(
+        "SELECT COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE "
+        "FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?",
+        (schema_name, table_name)
+    )
+    return {str(row[0]).lower(): (str(row[1]).lower(), row[2], row[3], row[4]) for row in cursor.fetchall()}
+
+
+def _column_problem(series, data_type, max_length, precision, scale):
+    values = series.dropna()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(values.dtype.categories.dtype)
+    if values.empty:
+        return None
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+
+    if data_type in INTEGER_RANGES:
+        if inferred in ("floating", "mixed-integer-float") and (values.astype(float) % 1 != 0).any():
+            return f"holds fractional values but is {data_type.upper()}"
+        if inferred in ("integer", "floating", "mixed-integer-float"):
+            low, high = INTEGER_RANGES[data_type]
+            if values.min() < low or values.max() > high:
+                return f"holds values from {values.min()} to {values.max()}, outside the range of {data_type.upper()}"
+    elif data_type in TEXT_TYPES and max_length not in (None, -1):
+        longest = int(values.astype(str).str.len().max())
+        if longest > max_length:
+            return f"holds text of up to {longest} characters but is {data_type.upper()}({max_length})"
+    elif data_type in ("decimal", "numeric") and precision is not None:
+        if inferred == "decimal":
+            value_precision, value_scale = decimal_precision_scale(value for value in values if isinstance(value, Decimal))
+            if value_scale > scale or value_precision - value_scale > precision - scale:
+                return f"needs DECIMAL({value_precision}, {value_scale}) but is DECIMAL({precision}, {scale})"
+        elif inferred == "integer" and len(str(max(abs(int(values.min())), abs(int(values.max()))))) > precision - scale:
+            return f"holds integers too large for DECIMAL({precision}, {scale})"
+    return None
+
+
+# Function to check that a DataFrame fits the columns of an existing table,
+# raising a ValueError that lists every column that would overflow or truncate
+def check_table_fits(df, columns, full_table_name):
+    problems = []
+    for col in df.columns:
+        column = columns.get(str(col).lower())
+        if column is None:
+            problems.append(f"column [{col}] does not exist in the table")
+            continue
+        problem = _column_problem(df[col], *column)
+        if problem:
+            problems.append(f"column [{col}] {problem}")
+    if problems:
+        raise ValueError(f"The data does not fit the existing table {full_table_name}: " + "; ".join(problems))
+
+
+# Function to choose a batch size that keeps the batches in flight within a memory budget
+def batch_rows_for_budget(df, memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES, parallel_connections=1):
+    if len(df) == 0:
+        return MIN_BATCH_ROWS
+    bytes_per_row = df.memory_usage(deep=True, index=False).sum() / len(df) * PARAMETER_OVERHEAD_FACTOR
+    rows = int(memory_budget_bytes / max(parallel_connections, 1) / max(bytes_per_row, 1))
+    return max(MIN_BATCH_ROWS, min(MAX_BATCH_ROWS, rows))
+
+
+# Function to convert one slice of the frame into driver parameters (native Python values, NULL as None)
+def batch_parameters(batch):
+    values = batch.astype(object)
+    values = values.where(batch.notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+class LoadCheckpoint:
+    # Records which batches have been committed so an interrupted load can resume
+
+    def __init__(self, path, batch_size):
+        self.path = path
+        self.batch_size = batch_size
+        self.completed = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+            self.batch_size = state["batch_size"]  # Resume with the batch boundaries already committed
+            self.completed = set(state["completed"])
+
+    def mark_completed(self, batch_index):
+        with self._lock:
+            self.completed.add(batch_index)
+            if self.path:
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, "w") as f:
+                    json.dump({"batch_size": self.batch_size, "completed": sorted(self.completed)}, f)
+                os.replace(temp_path, self.path)
+
+    def finish(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# Function to bulk-load a DataFrame into a SQL table. Rows are sent in batches
+# with fast parameter arrays and committed per batch; with a checkpoint file an
+# interrupted load skips the batches already committed when run again.
+# `connection_factory` returns a DB-API connection, so a local stand-in
+# database can replace SQL Server. Setting `cancel_event` stops the load
+# after the batches in flight; the checkpoint is kept so it can resume.
+def bulk_load_dataframe(df, schema_name, table_name, connection_factory, batch_size=None,
+                        memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES, parallel_connections=1,
+                        create_table=True, checkpoint_path=None, on_progress=None, cancel_event=None):
+    if batch_size is None:
+        batch_size = batch_rows_for_budget(df, memory_budget_bytes, parallel_connections)
+    checkpoint = LoadCheckpoint(checkpoint_path, batch_size)
+    batch_size = checkpoint.batch_size
+
+    columns = ', '.join([f"[{col}]" for col in df.columns])
+    placeholders = ', '.join(['?'] * len(df.columns))
+    sql = f"INSERT INTO [{schema_name}].[{table_name}] ({columns}) VALUES ({placeholders})"
+
+    if create_table:
+        # Create the table, or make sure the data fits the one that is already there
+        conn = connection_factory()
+        try:
+            cursor = conn.cursor()
+            existing_columns = existing_table_columns(cursor, schema_name, table_name)
+            if existing_columns:
+                check_table_fits(df, existing_columns, f"{schema_name}.{table_name}")
+            else:
+                cursor.execute(create_table_statement(df, schema_name, table_name))
+                conn.commit()
+        finally:
+            conn.close()
+
+    batch_count = (len(df) + batch_size - 1) // batch_size
+    pending = [index for index in range(batch_count) if index not in checkpoint.completed]
+    progress = {"rows": sum(min(batch_size, len(df) - index * batch_size) for index in checkpoint.completed)}
+    progress_lock = threading.Lock()
+
+    def load_batches(batch_indexes):
+        conn = connection_factory()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.fast_executemany = True  # pyodbc: send each batch as one parameter array
+            except AttributeError:
+                pass
+            for index in batch_indexes:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                batch = df.iloc[index * batch_size:(index + 1) * batch_size]
+                cursor.executemany(sql, batch_parameters(batch))
+                conn.commit()
+                checkpoint.mark_completed(index)
+                with progress_lock:
+                    progress["rows"] += len(batch)
+                    if on_progress is not None:
+                        on_progress(progress["rows"], len(df))
+        finally:
+            conn.close()
+
+    workers = max(1, min(parallel_connections, len(pending)))
+    if workers == 1:
+        load_batches(pending)
+    else:
+        # Each connection loads an interleaved share of the batches
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(load_batches, pending[worker::workers]) for worker in range(workers)]
+            for future in futures:
+                future.result()
+
+    if len(checkpoint.completed) == batch_count:
+        checkpoint.finish()
+    return progress["rows"]
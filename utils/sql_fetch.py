@@ -0,0 +1,74 @@
+from utils.streaming_metadata import StreamingProfiler
+from utils.metadata import generate_metadata
+import pandas as pd
+
+DEFAULT_FETCH_CHUNK_ROWS = 50_000
+
+
+class FetchResult:
+    # Outcome of a chunked fetch: the data, how it ended and its metadata
+
+    def __init__(self, profile=False):
+        self.chunks = []
+        self.rows = 0
+        self.truncated = False
+        self.cancelled = False
+        self.profiler = StreamingProfiler() if profile else None
+        self._df = None
+
+    @property
+    def df(self):
+        # Join the fetched chunks once
+        if self._df is None:
+            self._df = pd.concat(self.chunks, ignore_index=True) if self.chunks else pd.DataFrame()
+            self.chunks = []
+        return self._df
+
+    def metadata(self, file_name="<Sourced from SQL Server>"):
+        # Exact statistics of the fetched frame, unless the chunks were profiled as they arrived
+        if self.profiler is not None:
+            return self.profiler.to_metadata(file_name)
+        return generate_metadata(self.df, file_name=file_name)
+
+
+def _rows_to_chunk(rows, columns):
+    # Build the chunk's frame straight from the driver rows, in one conversion
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+# Function to run a query and pull its result in chunks from the server-side
+# cursor. With `profile`, each chunk is profiled as it arrives (for callers
+# that drop the chunks); otherwise metadata is computed from the final frame.
+# `on_chunk(chunk_df, rows_so_far)` is called per chunk, which lets the caller
+# show the first rows while the rest keep loading. The fetch stops early once
+# `max_rows` rows have arrived or `cancel_event` is set.
+def fetch_query_in_chunks(connection, query, chunk_rows=DEFAULT_FETCH_CHUNK_ROWS, max_rows=None, cancel_event=None,
+                          on_chunk=None, profile=False):
+    result = FetchResult(profile=profile)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query)
+        columns = [column[0] for column in cursor.description]
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                result.cancelled = True
+                break
+            size = chunk_rows if max_rows is None else min(chunk_rows, max_rows - result.rows)
+            if size <= 0:
+                result.truncated = cursor.fetchone() is not None
+                break
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            chunk_df = _rows_to_chunk(rows, columns)
+            result.chunks.append(chunk_df)
+            result.rows += len(rows)
+            if result.profiler is not None:
+                result.profiler.update(chunk_df)
+            if on_chunk is not None:
+                on_chunk(chunk_df, result.rows)
+        if (result.truncated or result.cancelled) and hasattr(cursor, "cancel"):
+            cursor.cancel()  # Stop the server from producing the rest of the result
+    finally:
+        cursor.close()
+    return result
@@ -0,0 +1,139 @@
+import pandas as pd
+import time
+import csv
+import io
+
+DEFAULT_BLOCK_ROWS = 500
+
+
+class IncrementalCSVParser:
+    # Parses CSV text as it arrives in arbitrary fragments (e.g. streamed
+    # completion deltas). Complete records are validated against the header
+    # and parsed in small blocks, so rows become available while the response
+    # is still streaming and the full text is never assembled. Quoted fields
+    # spanning several lines are supported; malformed records (including a
+    # truncated final line) are set aside in `bad_lines` without discarding
+    # the rows already parsed.
+
+    def __init__(self, block_rows=DEFAULT_BLOCK_ROWS):
+        self.block_rows = block_rows
+        self.header = None
+        self.frames = []
+        self.bad_lines = []
+        self.rows_parsed = 0
+        self.started_at = time.perf_counter()
+        self.first_row_at = None
+        self.parse_seconds = 0.0  # Time spent parsing, excluding the wait for more text
+        self._partial = ""
+        self._record = []
+        self._quotes = 0
+        self._pending = []
+        self._pending_fields = []
+
+    @property
+    def time_to_first_row(self):
+        return None if self.first_row_at is None else self.first_row_at - self.started_at
+
+    @property
+    def rows_available(self):
+        return self.rows_parsed + len(self._pending)
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started_at
+        return self.rows_available / elapsed if elapsed > 0 else 0.0
+
+    def feed(self, text):
+        if not text:
+            return
+        started = time.perf_counter()
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()  # The last piece has no newline yet
+        for line in lines:
+            self._add_line(line)
+        if len(self._pending) >= self.block_rows:
+            self.flush()
+        self.parse_seconds += time.perf_counter() - started
+
+    def _add_line(self, line):
+        line = line.rstrip("\r")
+        self._record.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return  # Inside a quoted field that continues on the next line
+        record = "\n".join(self._record)
+        self._record = []
+        self._quotes = 0
+        self._add_record(record)
+
+    def _add_record(self, record):
+        stripped = record.strip()
+        if not stripped or stripped.startswith("```"):
+            return  # Blank lines and markdown code fences
+        try:
+            fields = next(csv.reader([record]))
+        except (csv.Error, StopIteration):
+            self.bad_lines.append(record)
+            return
+        if self.header is None:
+            self.header = fields
+            return
+        if len(fields) != len(self.header):
+            self.bad_lines.append(record)
+            return
+        self._pending.append(record)
+        self._pending_fields.append(fields)
+        if self.first_row_at is None:
+            self.first_row_at = time.perf_counter()
+
+    def flush(self):
+        # Parse the pending records into a typed block
+        if not self._pending:
+            return
+        block = pd.read_csv(io.StringIO("\n".join(self._pending)), header=None, names=self.header)
+        self.frames.append(block)
+        self.rows_parsed += len(block)
+        self._pending = []
+        self._pending_fields = []
+
+    def close(self):
+        # Finish the last line; an unterminated quote or wrong field count marks it as malformed
+        started = time.perf_counter()
+        if self._partial:
+            self._add_line(self._partial)
+            self._partial = ""
+        if self._record:
+            self.bad_lines.append("\n".join(self._record))
+            self._record = []
+            self._quotes = 0
+        self.flush()
+        self.parse_seconds += time.perf_counter() - started
+
+    def preview(self, n_rows=None):
+        # Rows parsed so far, including records not yet flushed into a block
+        frames = []
+        count = 0
+        for frame in self.frames:
+            frames.append(frame)
+            count += len(frame)
+            if n_rows is not None and count >= n_rows:
+                break
+        else:
+            if self._pending_fields:
+                frames.append(pd.DataFrame(self._pending_fields, columns=self.header))
+        if not frames:
+            return pd.DataFrame(columns=self.header or [])
+        preview_df = pd.concat(frames, ignore_index=True)
+        return preview_df if n_rows is None else preview_df.head(n_rows)
+
+    def to_frame(self):
+        if not self.frames:
+            return pd.DataFrame(columns=self.header or [])
+        df = pd.concat(self.frames, ignore_index=True)
+        # Blocks can infer different types for one column (e.g. int in one, text in
+        # another); mirror a single read_csv, which keeps such columns as text
+        for col in df.columns:
+            dtypes = {str(frame[col].dtype) for frame in self.frames}
+            if len(dtypes) > 1 and df[col].dtype == "object":
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return df
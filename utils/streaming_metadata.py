@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+from utils.sketches import HyperLogLog, QuantileSketch
+
+# Default number of rows read per block when profiling out of core
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+# Combine the dtypes a column had in two chunks the way a single read would
+def _combine_dtypes(left, right):
+    if left is None:
+        return right
+    if right is None or left == right:
+        return left
+    if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right) \
+            and not pd.api.types.is_bool_dtype(left) and not pd.api.types.is_bool_dtype(right):
+        return np.promote_types(left, right)
+    return np.dtype("object")
+
+
+class ColumnProfile:
+    # Bounded-memory running statistics for a single column
+
+    def __init__(self, distinct_error, quantile_error):
+        self.dtype = None
+        self.nulls = 0
+        self.empties = 0
+        self.numeric_invalid = False
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.zeros = 0
+        self.distinct = HyperLogLog(error=distinct_error)
+        self.quantiles = QuantileSketch(error=quantile_error)
+
+    @property
+    def is_numeric(self):
+        return self.dtype is not None and pd.api.types.is_numeric_dtype(self.dtype) and not self.numeric_invalid
+
+    def _merge_moments(self, count, mean, m2):
+        # Chan et al. parallel update of count, mean and sum of squared deviations
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def _merge_extremes(self, minimum, maximum):
+        if minimum is not None and not pd.isna(minimum):
+            self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        if maximum is not None and not pd.isna(maximum):
+            self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def merge(self, other):
+        self.dtype = _combine_dtypes(self.dtype, other.dtype)
+        self.nulls += other.nulls
+        self.empties += other.empties
+        self.numeric_invalid = self.numeric_invalid or other.numeric_invalid or not pd.api.types.is_numeric_dtype(self.dtype)
+        if not self.numeric_invalid:
+            self._merge_moments(other.count, other.mean, other.m2)
+            self._merge_extremes(other.minimum, other.maximum)
+            self.zeros += other.zeros
+            self.quantiles.merge(other.quantiles)
+        self.distinct.merge(other.distinct)
+        return self
+
+
+class StreamingProfiler:
+    # Profiles a dataset one block of rows at a time. Exact counts, sums and
+    # extremes are combined directly; distinct counts use HyperLogLog and the
+    # median uses a KLL quantile sketch, so memory stays flat regardless of the
+    # number of rows. Profilers built on separate chunks or processes can be
+    # combined with `merge`.
+
+    def __init__(self, distinct_error=0.01, quantile_error=0.01):
+        self.distinct_error = distinct_error
+        self.quantile_error = quantile_error
+        self.n_rows = 0
+        self.n_bytes = 0
+        self.columns = {}
+
+    def update(self, chunk):
+        self.n_rows += len(chunk)
+        self.n_bytes += int(chunk.memory_usage(deep=True, index=False).sum())
+
+        # Per-chunk statistics are computed once per dtype group
+        null_count = chunk.isnull().sum()
+        text_columns = [col for col in chunk.columns if chunk[col].dtype == "object"
+                        or isinstance(chunk[col].dtype, (pd.StringDtype, pd.CategoricalDtype))]
+        empty_count = {}
+        if text_columns:
+            empty_count = chunk[text_columns].apply(lambda x: x.astype(str).str.strip().eq('').sum()).to_dict()
+
+        numeric_columns = [col for col in chunk.columns if pd.api.types.is_numeric_dtype(chunk[col])]
+        numeric_set = set(numeric_columns)
+        if numeric_columns:
+            numeric_df = chunk[numeric_columns]
+            as_float = numeric_df.astype("float64")
+            counts = as_float.count()
+            means = as_float.mean()
+            m2 = as_float.var(ddof=0) * counts
+            zeros = numeric_df.eq(0).sum()
+            # Extremes keep the column dtype, so they are computed per dtype
+            # group: a mixed block would upcast integers to float64
+            minimums, maximums = {}, {}
+            dtype_groups = {}
+            for col in numeric_columns:
+                dtype_groups.setdefault(str(chunk[col].dtype), []).append(col)
+            for group in dtype_groups.values():
+                minimums.update(chunk[group].min().to_dict())
+                maximums.update(chunk[group].max().to_dict())
+
+        for col in chunk.columns:
+            partial = ColumnProfile(self.distinct_error, self.quantile_error)
+            partial.dtype = chunk[col].dtype
+            partial.nulls = int(null_count[col])
+            partial.empties = int(empty_count.get(col, 0))
+            partial.distinct.update(chunk[col])
+            if col in numeric_set:
+                partial._merge_moments(int(counts[col]), float(means[col]) if counts[col] else 0.0,
+                                       float(m2[col]) if counts[col] else 0.0)
+                partial._merge_extremes(minimums[col], maximums[col])
+                partial.zeros = int(zeros[col])
+                partial.quantiles.update(as_float[col].to_numpy())
+            else:
+                partial.numeric_invalid = True
+            if col in self.columns:
+                self.columns[col].merge(partial)
+            else:
+                self.columns[col] = partial
+        return self
+
+    def merge(self, other):
+        self.n_rows += other.n_rows
+        self.n_bytes += other.n_bytes
+        for col, profile in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(profile)
+            else:
+                self.columns[col] = profile
+        return self
+
+    def to_metadata(self, file_name, file_size=None):
+        # Produce the same structure as generate_metadata
+        n_rows = self.n_rows
+        if file_size is None:
+            file_size = self.n_bytes / 1024  # Estimate size in KB
+        columns = list(self.columns)
+
+        def percentage(value):
+            return value / n_rows * 100 if n_rows else np.nan
+
+        def numeric(compute):
+            return {col: compute(profile) if profile.is_numeric else "NA" for col, profile in self.columns.items()}
+
+        def std(profile):
+            return (profile.m2 / (profile.count - 1)) ** 0.5 if profile.count > 1 else np.nan
+
+        descriptive_metadata = {
+            "File Name": file_name,
+            "File Size": f"{file_size:.2f} KB",
+            "Number of Rows": n_rows,
+            "Number of Columns": len(columns),
+            "Column Names": columns
+        }
+
+        operational_metadata = {
+            "Column Data Types": {col: profile.dtype for col, profile in self.columns.items()},
+            "Null Count": {col: profile.nulls for col, profile in self.columns.items()},
+            "Percentage Null Values": {col: percentage(profile.nulls) for col, profile in self.columns.items()},
+            "Unique Values Count": {col: profile.distinct.count() for col, profile in self.columns.items()},
+            "Percentage Unique Values": {col: percentage(profile.distinct.count()) for col, profile in self.columns.items()},
+            "Empty Cells Count": {col: profile.empties for col, profile in self.columns.items()},
+            "Percentage Empty Cells": {col: percentage(profile.empties) for col, profile in self.columns.items()},
+            "Mean": numeric(lambda p: p.mean if p.count else np.nan),
+            "Median": numeric(lambda p: p.quantiles.quantile(0.5)),
+            "Standard Deviation": numeric(std),
+            "Minimum Value": numeric(lambda p: p.minimum if p.minimum is not None else np.nan),
+            "Maximum Value": numeric(lambda p: p.maximum if p.maximum is not None else np.nan),
+            "Number of Zeros": numeric(lambda p: p.zeros),
+            "Percentage of Zeros": numeric(lambda p: percentage(p.zeros)),
+        }
+
+        return {
+            "Descriptive Metadata": descriptive_metadata,
+            "Operational Metadata": operational_metadata
+        }
+
+
+# Function to combine profilers built on separate chunks or processes
+def merge_profiles(profilers):
+    profilers = list(profilers)
+    combined = profilers[0]
+    for profiler in profilers[1:]:
+        combined.merge(profiler)
+    return combined
+
+
+# Function to profile a CSV file (path, UploadedFile or buffer) in fixed-size row blocks
+def profile_csv_in_chunks(file_like, chunksize=DEFAULT_CHUNK_SIZE, distinct_error=0.01, quantile_error=0.01, **read_csv_kwargs):
+    profiler = StreamingProfiler(distinct_error=distinct_error, quantile_error=quantile_error)
+    for chunk in pd.read_csv(file_like, chunksize=chunksize, **read_csv_kwargs):
+        profiler.update(chunk)
+    return profiler
+
+
+# Function to profile the result of a SQL query in fixed-size row blocks
+def profile_sql_in_chunks(query, conn, chunksize=DEFAULT_CHUNK_SIZE, distinct_error=0.01, quantile_error=0.01):
+    profiler = StreamingProfiler(distinct_error=distinct_error, quantile_error=quantile_error)
+    for chunk in pd.read_sql(query, conn, chunksize=chunksize):
+        profiler.update(chunk)
+    return profiler
+
+
+def generate_metadata_streaming(file_like, chunksize=DEFAULT_CHUNK_SIZE, file_name=None, file_size=None,
+                                distinct_error=0.01, quantile_error=0.01):
+    profiler = profile_csv_in_chunks(file_like, chunksize=chunksize, distinct_error=distinct_error,
+                                     quantile_error=quantile_error)
+    if file_name is None:
+        file_name = getattr(file_like, "name", str(file_like))
+    if file_size is None and getattr(file_like, "size", None) is not None:
+        file_size = file_like.size / 1024  # Convert bytes to KB
+    return profiler.to_metadata(file_name, file_size)
@@ -0,0 +1,181 @@
+import pandas as pd
+import time
+from utils.llm_pipeline import DATA_CLEANING_SYSTEM_MESSAGE, DEFAULT_MODEL, split_into_batches, transform_dataframe
+from utils.code_transform import CODE_GENERATION_SYSTEM_MESSAGE, transform_with_generated_code
+from utils.helper_functions import fetch_data_from_sql_in_chunks, push_data_to_sql, write_hyper_file
+from utils.cache import content_hash, dataset_cache
+from utils.dtypes import optimize_dtypes
+from utils.metadata import generate_metadata
+from utils.prompt_cache import prompt_cache
+from utils.prompt_encoding import CompactEncoder
+from utils.session_store import session_store
+
+# Rows kept in a job's preview while a response is still streaming
+STREAM_PREVIEW_ROWS = 200
+
+
+# Job: fetch a query result in chunks into the session store. The first rows
+# are published as the job preview while the rest keep loading, and
+# cancelling the job stops the fetch and the query on the server. Metadata is
+# computed from the stored frame, after its dtypes were optimized.
+def sql_fetch_task(job, query, server, database, user_id, password, user, session_id, max_rows=None):
+    outcome = {"dataset": None, "metadata": None, "messages": []}
+
+    def on_chunk(chunk_df, rows_so_far):
+        if job.preview is None:
+            job.preview = chunk_df.head(STREAM_PREVIEW_ROWS)
+        job.set_progress(rows_so_far / max_rows if max_rows else None, f"Fetched {rows_so_far:,} rows")
+
+    result = fetch_data_from_sql_in_chunks(
+        query, server, database, user_id, password,
+        max_rows=max_rows,
+        cancel_event=job.cancel_event,
+        on_chunk=on_chunk
+    )
+    job.preview = None
+    if result.cancelled:
+        return outcome
+
+    job.set_progress(message=f"Optimizing and profiling {result.rows:,} rows")
+    df = optimize_dtypes(result.df)
+    if result.truncated:
+        outcome["messages"].append(("warning", f"The query returned more than {max_rows:,} rows; only the first {max_rows:,} were fetched."))
+    outcome["messages"].append(("success", "Data fetched successfully."))
+
+    dataset_key = content_hash(df)
+    outcome["metadata"] = dataset_cache.get_or_compute(
+        dataset_key, "metadata-sql", lambda: generate_metadata(df, file_name="<Sourced from SQL Server>")
+    )
+    outcome["dataset"] = session_store.put(user, session_id, "dataset", df, key=dataset_key)
+    return outcome
+
+
+# Job: transform the session dataset with the model, either by sending the
+# data in batches or by generating code that runs locally. The dataset is
+# read from the session store only here, not on every rerun. The processed
+# frame is stored in the session store and its handle returned, together
+# with the generated code and any warnings for the UI. When batches failed or
+# had malformed lines, the result lacks rows and is returned with "partial" set.
+def transformation_task(job, dataset, prompt, user, session_id, dataset_key, api_key, generate_code=False, metadata=None,
+                        timeout=None, max_batch_tokens=None, concurrency=None, compact_encoding=False,
+                        select_columns=False):
+    outcome = {"dataset": None, "code": None, "partial": False, "messages": []}
+
+    # Identical requests on identical data are served from the prompt cache
+    system_message = CODE_GENERATION_SYSTEM_MESSAGE if generate_code else DATA_CLEANING_SYSTEM_MESSAGE
+    options = {} if generate_code else {
+        "compact_encoding": bool(compact_encoding),
+        "select_columns": bool(compact_encoding and select_columns),  # Columns are only selected by the encoder
+    }
+    cache_key = prompt_cache.make_key(dataset_key, prompt, system_message, DEFAULT_MODEL, **options)
+    processed_df = prompt_cache.get(cache_key)
+
+    if processed_df is not None:
+        outcome["messages"].append(("info", "Loaded the result of an identical earlier request from the cache."))
+
+    elif generate_code:
+        # Only the schema, statistics and a sample go to the model; the code runs locally
+        df = dataset.to_pandas()
+        job.set_progress(message="Generating and running the transformation...")
+        processed_df, outcome["code"] = transform_with_generated_code(
+            df, metadata, prompt, api_key=api_key, timeout=timeout, cancel_event=job.cancel_event
+        )
+        prompt_cache.set(cache_key, processed_df)
+
+    else:
+        # Split the dataset into token-sized batches and transform them concurrently
+        df = dataset.to_pandas()
+        encoder = CompactEncoder(df, prompt, select_columns=select_columns) if compact_encoding else None
+        batch_count = len(split_into_batches(df, max_batch_tokens, encoder=encoder))
+        completed = []
+        streaming_batches = {}
+        stream_state = {"started": time.perf_counter(), "rendered": 0.0, "first_row": None}
+        job.set_progress(0.0, f"Processed 0 of {batch_count} batches")
+
+        def on_batch_complete(batch):
+            completed.append(batch)
+            job.set_progress(len(completed) / batch_count, f"Processed {len(completed)} of {batch_count} batches")
+
+        # Rows are parsed while the responses stream in; refresh the preview a few times per second
+        def on_batch_progress(batch):
+            streaming_batches[batch.index] = batch
+            now = time.perf_counter()
+            if stream_state["first_row"] is None and batch.parser.first_row_at is not None:
+                stream_state["first_row"] = batch.parser.first_row_at - stream_state["started"]
+            if now - stream_state["rendered"] < 0.5:
+                return
+            stream_state["rendered"] = now
+
+            rows_received = sum(b.parser.rows_available for b in streaming_batches.values())
+            first_row = stream_state["first_row"]
+            job.set_progress(message=(
+                f"Processed {len(completed)} of {batch_count} batches · {rows_received:,} rows received"
+                f" · {rows_received / (now - stream_state['started']):,.0f} rows/sec"
+                + (f" · first row after {first_row:.2f}s" if first_row is not None else "")
+            ))
+
+            preview_frames = []
+            for index in sorted(streaming_batches):
+                streaming_batch = streaming_batches[index]
+                rows = streaming_batch.parser.preview(STREAM_PREVIEW_ROWS)
+                if encoder is not None and len(rows):
+                    rows = encoder.decode(rows, df.iloc[streaming_batch.start:streaming_batch.stop], offset=streaming_batch.start)
+                preview_frames.append(rows)
+                if sum(len(frame) for frame in preview_frames) >= STREAM_PREVIEW_ROWS:
+                    break
+            job.preview = pd.concat(preview_frames, ignore_index=True).head(STREAM_PREVIEW_ROWS)
+
+        result = transform_dataframe(
+            df, prompt,
+            api_key=api_key,
+            max_batch_tokens=max_batch_tokens,
+            concurrency=concurrency,
+            encoder=encoder,
+            stream=True,
+            on_batch_progress=on_batch_progress,
+            on_batch_complete=on_batch_complete,
+            cancel_event=job.cancel_event
+        )
+        job.preview = None
+        if result.cancelled:
+            return outcome
+
+        processed_df = result.processed_df
+        for batch in result.failures:
+            outcome["messages"].append(("error", f"Rows {batch.start}-{batch.stop - 1} could not be processed: {batch.error}"))
+        incomplete = [batch for batch in result.batches if batch.ok and batch.bad_lines]
+        for batch in incomplete:
+            outcome["messages"].append(("warning", f"Skipped {len(batch.bad_lines)} malformed line(s) in the response for rows {batch.start}-{batch.stop - 1}"))
+        if (result.failures or incomplete) and processed_df is not None:
+            # Rows of failed batches and malformed lines are missing
+            outcome["partial"] = True
+            outcome["messages"].append(("warning", (
+                f"The processed dataset is partial: rows are missing from {len(result.failures) + len(incomplete)} of {len(result.batches)} batches. "
+                "It can be previewed but not exported; submit the prompt again to retry them."
+            )))
+
+        # Partial results are not cached so a retry can fill in the missing rows
+        if processed_df is not None and not outcome["partial"]:
+            prompt_cache.set(cache_key, processed_df)
+
+    if processed_df is not None:
+        outcome["dataset"] = session_store.put(user, session_id, "processed", processed_df)
+    return outcome
+
+
+# Job: write the processed dataset to a .hyper file
+def hyper_export_task(job, dataset, hyper_file_path, table_name, mode="replace"):
+    job.set_progress(message=f"Writing {len(dataset):,} rows to {hyper_file_path}")
+    return write_hyper_file(dataset.to_pandas(), hyper_file_path, table_name, mode=mode)
+
+
+# Job: push the processed dataset to SQL Server in checkpointed batches
+def sql_push_task(job, dataset, table_name, server, database, user_id, password, parallel_connections=1, checkpoint_path=None):
+    job.set_progress(0.0, f"Pushing {len(dataset):,} rows to {table_name}")
+    return push_data_to_sql(
+        dataset.to_pandas(), table_name, server, database, user_id, password,
+        parallel_connections=parallel_connections,
+        checkpoint_path=checkpoint_path,
+        on_progress=lambda rows, total: job.set_progress(rows / total, f"Pushed {rows:,} of {total:,} rows"),
+        cancel_event=job.cancel_event
+    )